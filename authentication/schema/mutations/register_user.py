@@ -1,6 +1,7 @@
 import graphene
 from authentication.schema.types import UserType
 from authentication.services.user_service import register_user, RegistrationError
+from core.queries import query_budget
 
 
 class RegisterUser(graphene.Mutation):
@@ -15,6 +16,7 @@ class RegisterUser(graphene.Mutation):
     success = graphene.Boolean()
     errors = graphene.List(graphene.String)
 
+    @query_budget("graphql:registerUser", 4)
     @classmethod
     def mutate(cls, root, info, username, password, email, first_name=None, last_name=None):  # type: ignore[override]
         try:
@@ -1,10 +1,12 @@
 import graphene
 from authentication.schema.types import UserType
+from core.queries import query_budget
 
 
 class MeQuery(graphene.ObjectType):
     me = graphene.Field(UserType)
 
+    @query_budget("graphql:me", 1)
     def resolve_me(self, info):  # type: ignore[override]
         user = info.context.user
         return user if user.is_authenticated else None
@@ -1,10 +1,12 @@
 import graphene
 from authentication.schema.types import UserType
 from authentication.models import User
+from core.queries import query_budget
 
 
 class UserByIdQuery(graphene.ObjectType):
     user = graphene.Field(UserType, id=graphene.Int(required=True))
 
+    @query_budget("graphql:user", 2)
     def resolve_user(self, info, id):  # type: ignore[override]
         return User.objects.get(pk=id)
@@ -1,7 +1,9 @@
 from django.contrib import admin
 
-from chat.models import Message, Conversation
+from chat.models import Message, MessageBody, Conversation, ConversationShare
 
 # Register your models here.
 admin.site.register(Conversation)
-admin.site.register(Message)
\ No newline at end of file
+admin.site.register(Message)
+admin.site.register(ConversationShare)
+admin.site.register(MessageBody)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ChatConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chat'
+
+    def ready(self):
+        from chat import metrics, signals  # noqa: F401
+        import core.queries  # noqa: F401  (installs the query counter on new connections)
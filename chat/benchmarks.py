@@ -0,0 +1,201 @@
+"""Micro-benchmarks of the hot paths, used by ``manage.py bench_suite``.
+
+Each benchmark times one operation the way the application performs it: the
+async services through ``async_to_sync`` (so thread hops are included), the
+GraphQL queries as HTTP requests through the full middleware stack with a JWT.
+Benchmarks that write run inside a transaction that is rolled back, so the
+dataset is the same for every run and every commit being compared.
+
+Results are plain dicts (latency percentiles in milliseconds, operations per
+second and SQL queries per operation) so runs can be saved as JSON and
+compared with ``compare``.
+"""
+from __future__ import annotations
+
+import contextlib
+import io
+import json
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from asgiref.sync import async_to_sync
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from graphql_jwt.shortcuts import get_token
+
+from authentication.models import User
+from chat.loadtest import latency_summary
+from chat.models import Conversation
+from core.settings import AI_BOT_NAME
+
+
+@dataclass(slots=True)
+class Fixture:
+    """The rows every benchmark works on: a user, their busiest conversation and the bot."""
+    user: User
+    bot: User
+    conversation: Conversation
+    token: str
+    client: Client
+
+    def graphql(self, query: str, variables: dict | None = None) -> dict:
+        response = self.client.post("/graphql/", json.dumps({"query": query, "variables": variables or {}}),
+                                    content_type="application/json", HTTP_AUTHORIZATION=f"JWT {self.token}")
+        payload = json.loads(response.content)
+        if response.status_code != 200 or payload.get("errors"):
+            raise RuntimeError(f"GraphQL request failed ({response.status_code}): {payload.get('errors')}")
+        return payload["data"]
+
+
+@dataclass(slots=True)
+class Benchmark:
+    name: str
+    description: str
+    setup: Callable[[Fixture], Callable[[int], None]]  # returns the operation, called with the iteration number
+    iterations: int
+    writes: bool = False
+
+
+def _save_chat_message(fixture: Fixture) -> Callable[[int], None]:
+    from chat.service import save_chat_message
+    save = async_to_sync(save_chat_message)
+
+    def run(i: int) -> None:
+        # save_chat_message logs every message it stores
+        with contextlib.redirect_stdout(io.StringIO()):
+            save(fixture.user, fixture.bot, f"Benchmark question {i}", f"Benchmark answer {i}",
+                 conversation=fixture.conversation)
+    return run
+
+
+def _recent_messages(fixture: Fixture) -> Callable[[int], None]:
+    from chat.consumers import ChatConsumer
+    load = async_to_sync(ChatConsumer()._get_recent_messages)
+    return lambda i: load(fixture.user, fixture.conversation.id)
+
+
+def _resolve_jwt(fixture: Fixture) -> Callable[[int], None]:
+    from chat.consumers import ChatConsumer
+    resolve = async_to_sync(ChatConsumer()._resolve_user)
+
+    def run(i: int) -> None:
+        user, error = resolve(fixture.token)
+        if user is None:
+            raise RuntimeError(f"Token did not resolve: {error}")
+    return run
+
+
+def _graphql_conversations(fixture: Fixture) -> Callable[[int], None]:
+    return lambda i: fixture.graphql("{ conversations { id title createdAt } }")
+
+
+def _graphql_messages(fixture: Fixture) -> Callable[[int], None]:
+    query = "query($id: ID!) { messages(conversationId: $id) { id content reactions { reaction count } } }"
+    variables = {"id": str(fixture.conversation.id)}
+    return lambda i: fixture.graphql(query, variables)
+
+
+def _register(fixture: Fixture) -> Callable[[int], None]:
+    query = ("mutation($u: String!, $e: String!) { registerUser(username: $u, password: \"bench-password-1\", "
+             "email: $e) { success errors } }")
+
+    def run(i: int) -> None:
+        name = f"bench-register-{time.time_ns()}-{i}"
+        data = fixture.graphql(query, {"u": name, "e": f"{name}@example.com"})
+        if not data["registerUser"]["success"]:
+            raise RuntimeError(f"Registration failed: {data['registerUser']['errors']}")
+    return run
+
+
+BENCHMARKS = [
+    Benchmark("save_chat_message", "Store a user message and its reply (service.save_chat_message)",
+              _save_chat_message, iterations=500, writes=True),
+    Benchmark("recent_messages", "Load the socket history of the busiest conversation (ChatConsumer)",
+              _recent_messages, iterations=500),
+    Benchmark("resolve_jwt", "Decode a JWT and load its user (ChatConsumer._resolve_user)",
+              _resolve_jwt, iterations=2000),
+    Benchmark("graphql_conversations", "POST /graphql/ conversations { id title createdAt }",
+              _graphql_conversations, iterations=300),
+    Benchmark("graphql_messages", "POST /graphql/ messages(conversationId) of the busiest conversation",
+              _graphql_messages, iterations=100),
+    # Dominated by password hashing, on purpose: that is what registration costs
+    Benchmark("register", "POST /graphql/ registerUser", _register, iterations=10, writes=True),
+]
+
+
+def build_fixture(username: str) -> Fixture:
+    """Fixture for ``username``; raises ``User.DoesNotExist`` or ``Conversation.DoesNotExist``."""
+    user = User.objects.get(username=username)
+    conversation = Conversation.objects.filter(user=user).annotate(n=Count("messages")).order_by("-n").first()
+    if conversation is None:
+        raise Conversation.DoesNotExist(f"{username} has no conversations")
+    bot, _ = User.objects.get_or_create(username=AI_BOT_NAME, defaults={"role": User.Role.BOT, "is_active": True})
+    return Fixture(user=user, bot=bot, conversation=conversation, token=get_token(user), client=Client())
+
+
+def count_queries(operation: Callable[[], object]) -> int:
+    """SQL statements ``operation`` runs on this thread's connection.
+
+    An execute wrapper rather than ``CaptureQueriesContext``: requests made with
+    the test client reset ``connection.queries_log`` when they start.
+    """
+    executed = 0
+
+    def wrapper(execute, sql, params, many, context):
+        nonlocal executed
+        executed += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(wrapper):
+        operation()
+    return executed
+
+
+def measure(operation: Callable[[int], None], iterations: int, warmup: int = 3) -> dict:
+    """Time ``iterations`` calls of ``operation``; the first warm-up call also counts SQL queries."""
+    queries = count_queries(lambda: operation(-1))
+    for i in range(1, warmup):
+        operation(-1 - i)
+    timings = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        begin = time.perf_counter()
+        operation(i)
+        timings.append((time.perf_counter() - begin) * 1000)
+    elapsed = time.perf_counter() - started
+    return {
+        "iterations": iterations,
+        "ops_per_second": round(iterations / elapsed, 1) if elapsed else 0.0,
+        "queries": queries,
+        "latency_ms": latency_summary(timings),
+    }
+
+
+def run_benchmark(benchmark: Benchmark, fixture: Fixture, iterations: int | None = None) -> dict:
+    operation = benchmark.setup(fixture)
+    count = iterations or benchmark.iterations
+    if not benchmark.writes:
+        return measure(operation, count)
+    with transaction.atomic():
+        result = measure(operation, count)
+        transaction.set_rollback(True)
+    return result
+
+
+def compare(current: dict, baseline: dict) -> dict:
+    """Per benchmark in both runs: p50 latency and throughput of ``current`` relative to ``baseline``."""
+    changes = {}
+    for name, result in current["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if not before:
+            continue
+        p50, p50_before = result["latency_ms"]["p50"], before["latency_ms"]["p50"]
+        changes[name] = {
+            "p50_ratio": round(p50 / p50_before, 3) if p50_before else None,
+            "ops_ratio": round(result["ops_per_second"] / before["ops_per_second"], 3)
+            if before["ops_per_second"] else None,
+            "queries_delta": result["queries"] - before["queries"],
+        }
+    return changes
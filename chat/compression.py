@@ -0,0 +1,36 @@
+"""Content-addressed compression helpers for large message bodies."""
+from __future__ import annotations
+
+import hashlib
+import zlib
+from collections import OrderedDict
+from threading import Lock
+
+COMPRESSION_LEVEL = 6
+_CACHE_SIZE = 512
+
+_inflated: "OrderedDict[str, str]" = OrderedDict()
+_lock = Lock()
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def compress_text(text: str, level: int = COMPRESSION_LEVEL) -> bytes:
+    return zlib.compress(text.encode("utf-8"), level)
+
+
+def inflate(digest: str, data: bytes) -> str:
+    """Decompress a body, keeping recently used bodies (e.g. repeated bot replies) in a small LRU."""
+    with _lock:
+        text = _inflated.get(digest)
+        if text is not None:
+            _inflated.move_to_end(digest)
+            return text
+    text = zlib.decompress(bytes(data)).decode("utf-8")
+    with _lock:
+        _inflated[digest] = text
+        if len(_inflated) > _CACHE_SIZE:
+            _inflated.popitem(last=False)
+    return text
@@ -0,0 +1,191 @@
+"""Liveness tracking for WebSocket connections: heartbeats, idle timeouts and a reaper.
+
+Every consumer registers a small ``Connection`` record here. One reaper task
+per event loop wakes every ``CHAT_WS_REAP_INTERVAL_SECONDS`` and, for each
+connection:
+
+- closes it if it never authenticated within ``CHAT_WS_AUTH_TIMEOUT_SECONDS``;
+- for clients that speak heartbeats (they sent a ``ping``/``pong`` frame, or
+  connected with ``?heartbeat=1``), sends ``{"type": "ping"}`` once nothing was
+  received for ``CHAT_WS_PING_INTERVAL_SECONDS`` and closes the socket when
+  ``CHAT_WS_PONG_TIMEOUT_SECONDS`` more pass in silence (half-open sockets);
+- closes it after ``CHAT_WS_IDLE_TIMEOUT_SECONDS`` without user activity
+  (forgotten tabs), unless a reply is still being generated.
+
+A socket closed by the reaper whose disconnect never arrives (the peer is
+gone) is cleaned up directly after ``CLOSE_GRACE_SECONDS``, so its groups,
+queue and tasks are released either way. The same pass counts active and idle
+connections for ``gauges()``.
+
+``drain()`` is the graceful-shutdown path used by ``manage.py serve``.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import asdict, dataclass
+
+from django.conf import settings
+
+from .metrics import WS_REAPED
+
+AUTH_TIMEOUT_CLOSE_CODE = 4001
+HEARTBEAT_TIMEOUT_CLOSE_CODE = 4009
+IDLE_CLOSE_CODE = 4010
+# Standard "service restart": the client should reconnect, reaching another worker
+SERVICE_RESTART_CLOSE_CODE = 1012
+CLOSE_GRACE_SECONDS = 10.0
+
+
+def _setting(name: str, default: float) -> float:
+    return float(getattr(settings, name, default))
+
+
+@dataclass(slots=True)
+class ConnectionGauges:
+    connections: int = 0
+    authenticated: int = 0
+    active: int = 0  # user activity within CHAT_WS_ACTIVE_WINDOW_SECONDS
+    idle: int = 0
+    awaiting_pong: int = 0
+    reaped_dead: int = 0  # counters since process start
+    reaped_idle: int = 0
+    reaped_unauthenticated: int = 0
+    forced_cleanups: int = 0
+
+
+class Connection:
+    __slots__ = ('consumer', 'loop', 'opened_at', 'last_received', 'last_activity', 'last_ping', 'heartbeat',
+                 'closing_since', 'close_code')
+
+    def __init__(self, consumer, heartbeat: bool = False):
+        now = time.monotonic()
+        self.consumer = consumer
+        self.loop = asyncio.get_running_loop()
+        self.opened_at = now
+        self.last_received = now
+        self.last_activity = now
+        self.last_ping = 0.0
+        self.heartbeat = heartbeat
+        self.closing_since: float | None = None
+        self.close_code: int | None = None
+
+    def touch(self, activity: bool = True) -> None:
+        """Record an inbound frame; ``activity`` is False for heartbeats and other housekeeping."""
+        self.last_received = time.monotonic()
+        if activity:
+            self.last_activity = self.last_received
+
+
+class ConnectionRegistry:
+    def __init__(self):
+        self._connections: dict[str, Connection] = {}
+        self._reapers: dict[asyncio.AbstractEventLoop, asyncio.Task] = {}
+        self.stats = ConnectionGauges()
+        self.draining = False
+
+    def __len__(self) -> int:
+        return len(self._connections)
+
+    def register(self, consumer, heartbeat: bool = False) -> Connection:
+        connection = self._connections[consumer.channel_name] = Connection(consumer, heartbeat)
+        loop = connection.loop
+        reaper = self._reapers.get(loop)
+        if reaper is None or reaper.done():
+            self._reapers[loop] = loop.create_task(self._run(loop))
+        return connection
+
+    def unregister(self, consumer) -> None:
+        self._connections.pop(getattr(consumer, 'channel_name', None), None)
+
+    async def _run(self, loop) -> None:
+        try:
+            while any(c.loop is loop for c in self._connections.values()):
+                await asyncio.sleep(_setting('CHAT_WS_REAP_INTERVAL_SECONDS', 5.0))
+                self.reap(loop)
+        finally:
+            self._reapers.pop(loop, None)
+
+    def reap(self, loop=None, now: float | None = None) -> None:
+        """One reaper pass over the connections on ``loop`` (all of them if ``None``)."""
+        now = time.monotonic() if now is None else now
+        ping_interval = _setting('CHAT_WS_PING_INTERVAL_SECONDS', 25.0)
+        pong_timeout = _setting('CHAT_WS_PONG_TIMEOUT_SECONDS', 20.0)
+        idle_timeout = _setting('CHAT_WS_IDLE_TIMEOUT_SECONDS', 1800.0)
+        auth_timeout = _setting('CHAT_WS_AUTH_TIMEOUT_SECONDS', 30.0)
+        active_window = _setting('CHAT_WS_ACTIVE_WINDOW_SECONDS', 60.0)
+        gauges = ConnectionGauges()
+        for connection in list(self._connections.values()):
+            consumer = connection.consumer
+            if loop is not None and connection.loop is not loop:
+                continue
+            if connection.closing_since is not None:
+                if now - connection.closing_since > CLOSE_GRACE_SECONDS:
+                    self.stats.forced_cleanups += 1
+                    self.unregister(consumer)
+                    connection.loop.create_task(consumer.disconnect(connection.close_code))
+                continue
+            authenticated = hasattr(consumer, 'group_name')
+            silent = now - connection.last_received
+            if not authenticated and auth_timeout and now - connection.opened_at > auth_timeout:
+                self.stats.reaped_unauthenticated += 1
+                WS_REAPED.inc(reason='unauthenticated')
+                self._close(connection, AUTH_TIMEOUT_CLOSE_CODE, 'authentication timeout', now)
+                continue
+            if connection.heartbeat and silent > ping_interval + pong_timeout:
+                self.stats.reaped_dead += 1
+                WS_REAPED.inc(reason='dead')
+                self._close(connection, HEARTBEAT_TIMEOUT_CLOSE_CODE, 'heartbeat timeout', now)
+                continue
+            if (idle_timeout and now - connection.last_activity > idle_timeout
+                    and not getattr(consumer, 'generations', None)):
+                self.stats.reaped_idle += 1
+                WS_REAPED.inc(reason='idle')
+                self._close(connection, IDLE_CLOSE_CODE, 'idle timeout', now)
+                continue
+            if connection.heartbeat and silent >= ping_interval:
+                if now - connection.last_ping >= ping_interval:
+                    connection.last_ping = now
+                    consumer.push({'type': 'ping', 't': int(time.time() * 1000)})
+                gauges.awaiting_pong += 1
+            gauges.connections += 1
+            gauges.authenticated += authenticated
+            if now - connection.last_activity <= active_window:
+                gauges.active += 1
+            else:
+                gauges.idle += 1
+        for name in ('connections', 'authenticated', 'active', 'idle', 'awaiting_pong'):
+            setattr(self.stats, name, getattr(gauges, name))
+
+    def _close(self, connection: Connection, code: int, reason: str, now: float) -> None:
+        connection.closing_since = now
+        connection.close_code = code
+        connection.consumer.reap(code, reason)
+
+    async def drain(self, timeout: float) -> int:
+        """Close the connections on this loop once their replies and queued frames are out.
+
+        Sockets still busy after ``timeout`` seconds are closed anyway, which
+        cancels their replies; returns how many were cut off. New messages are
+        refused from the moment draining starts.
+        """
+        self.draining = True
+        loop = asyncio.get_running_loop()
+        consumers = [c.consumer for c in self._connections.values() if c.loop is loop and c.closing_since is None]
+        drains = {asyncio.ensure_future(consumer.drain(SERVICE_RESTART_CLOSE_CODE)): consumer for consumer in consumers}
+        if not drains:
+            return 0
+        _, pending = await asyncio.wait(drains, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        await asyncio.gather(*(drains[task].close(code=SERVICE_RESTART_CLOSE_CODE) for task in pending),
+                             return_exceptions=True)
+        return len(pending)
+
+    def gauges(self) -> dict[str, int]:
+        """Connection counts as of the last reaper pass, plus reap counters."""
+        return asdict(self.stats)
+
+
+registry = ConnectionRegistry()
@@ -1,21 +1,78 @@
-import json
+import asyncio
+import time
 import urllib.parse
+import uuid
 import jwt
 from channels.db import database_sync_to_async
 from channels.layers import get_channel_layer
 from channels.generic.websocket import AsyncWebsocketConsumer
 from asgiref.sync import sync_to_async
 from authentication.models import User
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.contrib.auth.models import AnonymousUser
 from graphql_jwt.settings import jwt_settings
 from graphql_jwt.shortcuts import get_user_by_payload
 
-from .service import get_ai_response
+from .models import ChatSettings, Conversation
+from .connections import registry
+from .history_cache import MISSING, history_cache, serialize_message
+from .metrics import cache_lookup, timed_group_send, timed_send
+from .outbound import OutboundQueue
+from .presence import PRESENCE_STATES, Throttle, get_presence, set_presence
+from .replay import replay_buffer
+from .service import claim_reply_id, get_ai_response, get_or_create_conversation
+from .services.rate_limit_service import RateLimited, client_ip_from_scope, get_rate_limiter
+from .services.reaction_service import ReactionError, reaction_counts, remove_reaction, set_reaction
+from .wire import Deflater, FrameDecodeError, decode_frame, negotiate
+from core.queries import name_operation, query_totals, register_budgets, track_queries
+from core.tracing import trace_span
+
+# Reaction updates arriving within this window are broadcast as one event
+REACTION_COALESCE_SECONDS = 0.15
+# Close code used when a client cannot keep up with its outbound queue
+SLOW_CLIENT_CLOSE_CODE = 4008
+HISTORY_LIMIT = 20
+MAX_HISTORY_LIMIT = 100
+
+# Most SQL queries one WebSocket event may run (core.queries); ws:reply is a whole reply, saved messages included
+WS_QUERY_BUDGETS = {
+    'ws:connect': 1,
+    'ws:auth': 5,
+    'ws:message': 3,
+    'ws:reply': 8,
+    'ws:reaction': 7,
+    'ws:reaction.remove': 7,
+    'ws:cancel': 0,
+    'ws:typing': 1,
+    'ws:presence': 0,
+    'ws:stats': 0,
+    'ws:subscribe': 4,
+    'ws:unsubscribe': 0,
+    'ws:history': 3,
+    'ws:conversation.create': 2,
+    'ws:ping': 0,
+    'ws:pong': 0,
+    'ws:invalid': 0,
+}
+# Frame types handled on their own; anything else is a chat message
+WS_EVENT_KINDS = {'ping', 'pong', 'reaction', 'reaction.remove', 'cancel', 'typing', 'presence', 'stats',
+                  'subscribe', 'unsubscribe', 'history', 'conversation.create'}
+register_budgets(WS_QUERY_BUDGETS)
+
+
+def conversation_group(conversation_id) -> str:
+    """Channel-layer group of the sockets that have a conversation open."""
+    return f"conv_{conversation_id}"
 
 
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         """Accept WebSocket connection"""
+        with track_queries('ws:connect'), trace_span('ws.connect'):
+            await self._connect()
+
+    async def _connect(self):
         # Debug auth info (properly indented inside method)
         user: User = self.scope.get('user')
         if not getattr(user, 'is_authenticated', False):
@@ -29,29 +86,147 @@ class ChatConsumer(AsyncWebsocketConsumer):
         print(
             f"[WS CONNECT] user={getattr(user, 'id', None)} is_authenticated={getattr(user, 'is_authenticated', False)}"
         )
-        await self.accept()
+        # Wire format from Sec-WebSocket-Protocol; clients that ask for none get JSON text as before
+        self.subprotocol, self.wire, deflate = negotiate(self.scope.get('subprotocols') or [])
+        self._deflate = Deflater() if deflate else None
+        await self.accept(subprotocol=self.subprotocol)
+        self._start_outbound()
+        self._start_throttles()
+        self.connection = registry.register(self, heartbeat=self._query_param('heartbeat') in ('1', 'true'))
         # Add to user-specific channel group for multi-tab sync
         if getattr(user, 'is_authenticated', False):
             self.group_name = f"user_{user.id}"
             await self.channel_layer.group_add(self.group_name, self.channel_name)
-            # Send last N messages history
-            await self._send_history(user)
-        await self.send(json.dumps({"info": "Connected"}))
+            # Resume from ?last_seen=<cursor>, or open the active conversation and send its last N messages
+            await self._open_session(user, self._query_param('last_seen'))
+        self.push({"info": "Connected"})
 
     async def disconnect(self, close_code):
         """Handle WebSocket disconnection"""
+        if getattr(self, '_disconnected', False):
+            return  # already cleaned up by the reaper
+        self._disconnected = True
+        registry.unregister(self)
+        drained = getattr(self, '_drained', None)
+        if drained is not None and not drained.done():
+            drained.set_result(None)
         print(f"WebSocket disconnected with code: {close_code}")
         user: User = self.scope.get('user')
         if getattr(user, 'is_authenticated', False) and hasattr(self, 'group_name'):
             await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        for throttle in (getattr(self, 'typing', None), getattr(self, 'presence', None)):
+            if throttle is not None:
+                await throttle.close()
+        if hasattr(self, 'group_name') and hasattr(self, 'presence'):
+            # Going offline is never throttled away, and lands after any update still in flight
+            await self._send_presence('state', None)
+        for conversation_id in list(self.subscriptions):
+            await self.channel_layer.group_discard(conversation_group(conversation_id), self.channel_name)
+        # Stop in-flight generations so abandoned replies are not paid for
+        tasks = list(getattr(self, 'generations', {}).values())
+        flusher = getattr(self, '_reaction_flusher', None)
+        if flusher is not None and not flusher.done():
+            tasks.append(flusher)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        if getattr(self, 'outbound', None) is not None:
+            stats = self.outbound.stats
+            print(f"[WS] user={getattr(user, 'id', None)} protocol={self.subprotocol or 'json'} "
+                  f"sent {stats.frames_sent} frames, {stats.bytes_sent} bytes")
+            await self.outbound.stop()
+
+    def _start_outbound(self):
+        self.outbound = OutboundQueue(
+            self._send_frame,
+            encode=self.wire.encode,
+            max_bytes=getattr(settings, 'CHAT_WS_QUEUE_MAX_BYTES', 1 << 20),
+            high_water=getattr(settings, 'CHAT_WS_QUEUE_HIGH_WATER', 256 << 10),
+            stall_seconds=getattr(settings, 'CHAT_WS_QUEUE_STALL_SECONDS', 10.0),
+            on_overflow=self._on_outbound_overflow,
+        )
+        self.outbound.start()
+
+    def _start_throttles(self):
+        self.socket_id = uuid.uuid4().hex[:12]
+        self.typing = Throttle(getattr(settings, 'CHAT_TYPING_INTERVAL_SECONDS', 3.0), self._send_typing)
+        self.presence = Throttle(getattr(settings, 'CHAT_PRESENCE_INTERVAL_SECONDS', 5.0), self._send_presence)
+        self._presence_touched = 0.0
+
+    async def _send_frame(self, payload: str | bytes) -> int:
+        """Write one encoded frame and return its size on the wire."""
+        if isinstance(payload, str):
+            await self.send(text_data=payload)
+            return len(payload) if payload.isascii() else len(payload.encode('utf-8'))
+        if self._deflate is not None:
+            payload = self._deflate(payload)
+        await self.send(bytes_data=payload)
+        return len(payload)
 
-    async def receive(self, text_data):
+    def push(self, frame: dict | str | bytes):
+        """Queue a frame (or a payload already encoded for this connection's wire format); never waits on the client."""
+        replayed_upto = getattr(self, '_replayed_upto', None)
+        if replayed_upto is not None and isinstance(frame, dict) and 'cursor' in frame:
+            # Live copy of an event this socket already got from the replay buffer
+            seq = replay_buffer.parse_cursor(frame['cursor'])
+            if seq is not None and seq <= replayed_upto:
+                return
+        self.outbound.put(frame)
+
+    async def drain(self, code: int):
+        """Let in-flight replies finish and queued frames go out, then close with ``code``."""
+        while self.generations:
+            await asyncio.gather(*list(self.generations.values()), return_exceptions=True)
+        # Final reply frames reach this socket through the channel layer; queue the close behind them
+        self._drained = asyncio.get_running_loop().create_future()
+        await timed_send(self.channel_layer, self.channel_name, {'type': 'chat.drain', 'code': code})
+        await self._drained
+
+    async def chat_drain(self, event):
+        await self.outbound.flush()
+        await self.close(code=event['code'])
+        if not self._drained.done():
+            self._drained.set_result(None)
+
+    def reap(self, code: int, reason: str):
+        """Close this socket on behalf of the connection reaper."""
+        user = self.scope.get('user')
+        print(f"[WS] Reaping connection user={getattr(user, 'id', None)}: {reason}")
+        asyncio.create_task(self.close(code=code))
+
+    def _on_outbound_overflow(self, reason: str):
+        user = self.scope.get('user')
+        print(f"[WS] Dropping slow client user={getattr(user, 'id', None)}: {reason}")
+        asyncio.create_task(self.close(code=SLOW_CLIENT_CLOSE_CODE))
+
+    async def receive(self, text_data=None, bytes_data=None):
         """Receive message from WebSocket"""
+        # Named after the frame type once it is decoded
+        with track_queries('ws:invalid'), trace_span('ws.receive'):
+            await self._receive(text_data, bytes_data)
+
+    async def _receive(self, text_data=None, bytes_data=None):
         user = self.scope.get('user')
         try:
-            text_data_json = json.loads(text_data)
+            text_data_json = decode_frame(text_data, bytes_data)
+            kind = text_data_json.get('type')
+            name_operation(f"ws:{kind if kind in WS_EVENT_KINDS else 'message'}")
+            if kind in ('ping', 'pong'):
+                # Heartbeats work before authentication and never count as user activity
+                self.connection.heartbeat = True
+                self.connection.touch(activity=False)
+                # A quiet tab still holds its socket: keep its presence entry alive
+                self._touch_presence()
+                if kind == 'ping':
+                    self.push({'type': 'pong', 't': text_data_json.get('t')})
+                return
+            self.connection.touch(activity=kind != 'stats' and not (kind == 'presence'
+                                                                   and text_data_json.get('state') == 'idle'))
+            self._touch_presence()
             # If not authenticated yet, allow first auth message with token
             if not getattr(user, 'is_authenticated', False):
+                name_operation('ws:auth')
                 # 1. Try token inside message payload
                 token = text_data_json.get('token')
                 # 2. Fallback to query param token
@@ -62,22 +237,48 @@ class ChatConsumer(AsyncWebsocketConsumer):
                     if resolved:
                         self.scope['user'] = resolved
                         user = resolved
-                        await self.send(json.dumps({'info': 'Authenticated', 'code': 'AUTH_OK'}))
+                        self.push({'info': 'Authenticated', 'code': 'AUTH_OK'})
                         # On late auth, join group & send history once
                         if not hasattr(self, 'group_name'):
                             self.group_name = f"user_{user.id}"
                             await self.channel_layer.group_add(self.group_name, self.channel_name)
                         if not getattr(self, 'history_sent', False):
-                            await self._send_history(user)
+                            await self._open_session(
+                                user, text_data_json.get('last_seen') or self._query_param('last_seen'))
                         if 'message' not in text_data_json:
                             return  # stop if only auth payload
                     else:
                         code = 'TOKEN_EXPIRED' if status == 'Token expired' else 'TOKEN_ERROR'
-                        await self.send(json.dumps({'error': status or 'Invalid token', 'code': code}))
+                        self.push({'error': status or 'Invalid token', 'code': code})
                         return
                 else:
-                    await self.send(json.dumps({'error': 'Not authenticated', 'hint': 'Send {"token": "<JWT>"} or append ?token=... to URL'}))
+                    self.push({'error': 'Not authenticated', 'hint': 'Send {"token": "<JWT>"} or append ?token=... to URL'})
                     return
+            if text_data_json.get('type') in ('reaction', 'reaction.remove'):
+                await self._handle_reaction(user, text_data_json)
+                return
+            if text_data_json.get('type') == 'cancel':
+                await self._handle_cancel(text_data_json)
+                return
+            if text_data_json.get('type') == 'typing':
+                await self._handle_typing(user, text_data_json)
+                return
+            if text_data_json.get('type') == 'presence':
+                await self._handle_presence(user, text_data_json)
+                return
+            if text_data_json.get('type') == 'stats':
+                stats = self.outbound.stats
+                frame = {'type': 'stats', 'protocol': self.subprotocol or 'json',
+                         'frames_sent': stats.frames_sent, 'bytes_sent': stats.bytes_sent,
+                         'connections': registry.gauges()}
+                if getattr(settings, 'QUERY_PROFILING', settings.DEBUG):
+                    frame['queries'] = query_totals()
+                self.push(frame)
+                return
+            if text_data_json.get('type') in ('subscribe', 'unsubscribe', 'history', 'conversation.create'):
+                await self._handle_conversation_command(user, text_data_json)
+                return
+
             message = text_data_json.get('message', '')
             
             print(f"Received message: {message}")
@@ -86,40 +287,330 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
             sender: User = user  # already validated
 
-            # Get AI response (persisted)
-            response = await get_ai_response(user=sender, user_message=message)
-
-            # Broadcast user message then AI response to group (re-fetch persisted messages not necessary here)
-            if hasattr(self, 'group_name'):
-                await self.channel_layer.group_send(self.group_name, {
-                    'type': 'chat.message',
-                    'payload': {
-                        'kind': 'user',
-                        'content': message,
-                    }
+            if registry.draining:
+                self.push({'error': 'Server is restarting; reconnect to continue', 'code': 'SERVER_DRAINING',
+                           'id': text_data_json.get('id')})
+                return
+            if len(self.generations) >= getattr(settings, 'CHAT_WS_MAX_GENERATIONS', 3):
+                self.push({'error': 'Too many replies in progress', 'code': 'TOO_MANY_GENERATIONS'})
+                return
+            try:
+                await get_rate_limiter().acheck('message', user=sender, ip=client_ip_from_scope(self.scope))
+            except RateLimited as e:
+                self.push({'error': str(e), 'code': e.code, 'retry_after': e.retry_after,
+                           'id': text_data_json.get('id')})
+                return
+
+            if not hasattr(self, 'group_name'):
+                # Fallback directly to sender
+                response = await get_ai_response(user=sender, user_message=message)
+                self.push({'response': response})
+                return
+
+            conversation_id = text_data_json.get('conversation_id')
+            try:
+                conversation, created = await database_sync_to_async(get_or_create_conversation)(sender, conversation_id)
+            except (Conversation.DoesNotExist, ValidationError):
+                self.push({'error': 'Conversation not found', 'code': 'NOT_FOUND', 'conversation_id': conversation_id})
+                return
+            if created:
+                # Every socket of the user follows a newly started active conversation
+                cursor = replay_buffer.record(sender.id, {
+                    'type': 'conversation', 'conversation_id': str(conversation.id), 'created': True,
                 })
-                await self.channel_layer.group_send(self.group_name, {
-                    'type': 'chat.message',
-                    'payload': {
-                        'kind': 'bot',
-                        'content': response,
-                    }
+                await timed_group_send(self.channel_layer, self.group_name, {
+                    'type': 'chat.conversation', 'conversation_id': str(conversation.id), 'created': True,
+                    'cursor': cursor,
                 })
-            else:
-                # Fallback directly to sender
-                await self.send(text_data=json.dumps({'response': response}))
-            
-        except json.JSONDecodeError:
-            # Handle invalid JSON
-            await self.send(text_data=json.dumps({
-                'error': 'Invalid JSON format'
-            }))
+            if not await self._subscribe(conversation.id):
+                return  # the reply's frames could not reach this socket; TOO_MANY_SUBSCRIPTIONS was sent instead
+            reply_id = await self._new_reply_id(text_data_json.get('id'))
+            if reply_id is None:
+                # A retried message: its reply was already started or saved, so do not store it twice
+                self.push({'error': 'Reply id already used', 'code': 'DUPLICATE_ID', 'id': text_data_json.get('id')})
+                return
+            # Run the reply as its own task so this socket keeps handling cancel/reactions meanwhile
+            self.generations[str(reply_id)] = asyncio.create_task(self._generate(sender, message, reply_id, conversation))
+
+        except FrameDecodeError:
+            # Handle invalid JSON (or MessagePack)
+            self.push({
+                'error': 'Invalid JSON format' if bytes_data is None else 'Invalid MessagePack frame'
+            })
         except Exception as e:
             # Handle other errors
             print(f"Error in ChatConsumer: {e}")
-            await self.send(text_data=json.dumps({
+            self.push({
                 'error': 'Internal server error'
-            }))
+            })
+
+    @property
+    def generations(self) -> dict[str, asyncio.Task]:
+        """In-flight reply tasks of this connection, keyed by reply id."""
+        if not hasattr(self, '_generations'):
+            self._generations = {}
+        return self._generations
+
+    async def _new_reply_id(self, requested) -> uuid.UUID | None:
+        """A client-chosen reply id if it is a UUID not used before, a new one if none (or no UUID) is given,
+        and None if the id belongs to a reply already started or saved."""
+        try:
+            reply_id = uuid.UUID(str(requested)) if requested else None
+        except ValueError:
+            reply_id = None
+        if reply_id is None:
+            return uuid.uuid4()
+        if str(reply_id) in self.generations or not await database_sync_to_async(claim_reply_id)(reply_id):
+            return None
+        return reply_id
+
+    async def _fanout(self, group: str, user_id: int, handler: str, frame: dict):
+        """Record ``frame`` for session resume, then deliver it to ``group`` through ``handler``."""
+        replay_buffer.record(user_id, frame)
+        await timed_group_send(self.channel_layer, group, {
+            'type': handler,
+            'payload': {k: v for k, v in frame.items() if k != 'type'},
+        })
+
+    async def _generate(self, user: User, message: str, reply_id: uuid.UUID, conversation: Conversation):
+        """Broadcast the user message, stream the reply as deltas, then send the full persisted reply."""
+        with track_queries('ws:reply'), trace_span('ws.reply', reply_id=str(reply_id)):
+            await self._generate_reply(user, message, reply_id, conversation)
+
+    async def _generate_reply(self, user: User, message: str, reply_id: uuid.UUID, conversation: Conversation):
+        parts: list[str] = []
+        group = conversation_group(conversation.id)
+        conversation_id = str(conversation.id)
+        try:
+            await self._fanout(group, user.id, 'chat.message', {
+                'type': 'message',
+                'kind': 'user',
+                'content': message,
+                'reply_id': str(reply_id),
+                'conversation_id': conversation_id,
+            })
+
+            on_delta = None
+            if getattr(settings, 'CHAT_STREAM_RESPONSES', True):
+                offset = 0
+
+                async def on_delta(delta: str):
+                    nonlocal offset
+                    parts.append(delta)
+                    # offset lets clients drop text they already have when deltas are merged on replay
+                    frame = {'type': 'delta', 'id': str(reply_id), 'conversation_id': conversation_id,
+                             'offset': offset, 'delta': delta}
+                    offset += len(delta)
+                    await self._fanout(group, user.id, 'chat.delta', frame)
+
+            response = await get_ai_response(user=user, user_message=message, on_delta=on_delta, reply_id=reply_id,
+                                             conversation=conversation)
+            await self._fanout(group, user.id, 'chat.message', {
+                'type': 'message',
+                'id': str(reply_id),
+                'kind': 'bot',
+                'content': response,
+                'conversation_id': conversation_id,
+            })
+        except asyncio.CancelledError:
+            print(f"[WS] Generation {reply_id} cancelled")
+            await self._fanout(group, user.id, 'chat.message', {
+                'type': 'message',
+                'id': str(reply_id),
+                'kind': 'bot',
+                'content': ''.join(parts),
+                'conversation_id': conversation_id,
+                'cancelled': True,
+            })
+            raise
+        except Exception as e:
+            print(f"Error in ChatConsumer generation: {e}")
+            self.push({'error': 'Internal server error', 'id': str(reply_id)})
+        finally:
+            self.generations.pop(str(reply_id), None)
+
+    async def _handle_cancel(self, data: dict):
+        """Cancel {"type": "cancel", "id": "<reply id>"} here or on whichever of the user's sockets runs it."""
+        reply_id = str(data.get('id') or '')
+        if reply_id in self.generations:
+            self.generations[reply_id].cancel()
+        elif hasattr(self, 'group_name'):
+            await timed_group_send(self.channel_layer, self.group_name, {'type': 'chat.cancel', 'id': reply_id})
+        else:
+            self.push({'error': 'Unknown reply id', 'code': 'NOT_FOUND', 'id': reply_id})
+
+    @property
+    def subscriptions(self) -> set[str]:
+        """Ids of the conversations this socket has open."""
+        if not hasattr(self, '_subscriptions'):
+            self._subscriptions = set()
+        return self._subscriptions
+
+    async def _subscribe(self, conversation_id) -> bool:
+        conversation_id = str(conversation_id)
+        if conversation_id in self.subscriptions:
+            return True
+        if len(self.subscriptions) >= getattr(settings, 'CHAT_WS_MAX_SUBSCRIPTIONS', 20):
+            self.push({'error': 'Too many open conversations', 'code': 'TOO_MANY_SUBSCRIPTIONS',
+                       'conversation_id': conversation_id})
+            return False
+        await self.channel_layer.group_add(conversation_group(conversation_id), self.channel_name)
+        self.subscriptions.add(conversation_id)
+        return True
+
+    async def _unsubscribe(self, conversation_id):
+        conversation_id = str(conversation_id)
+        if conversation_id in self.subscriptions:
+            self.subscriptions.discard(conversation_id)
+            await self.channel_layer.group_discard(conversation_group(conversation_id), self.channel_name)
+
+    @database_sync_to_async
+    def _owned_conversation_id(self, user: User, conversation_id) -> str | None:
+        try:
+            if Conversation.objects.filter(pk=conversation_id, user=user).exists():
+                return str(Conversation._meta.pk.to_python(conversation_id))
+        except ValidationError:
+            pass
+        return None
+
+    async def _handle_conversation_command(self, user: User, data: dict):
+        """Handle subscribe / unsubscribe / history / conversation.create frames."""
+        kind = data.get('type')
+        if kind == 'conversation.create':
+            conversation = await database_sync_to_async(Conversation.objects.create)(
+                user=user, title=str(data.get('title') or '')[:255])
+            if await self._subscribe(conversation.id):
+                self.push({'type': 'conversation', 'conversation_id': str(conversation.id), 'created': True})
+            return
+        if kind == 'unsubscribe':
+            await self._unsubscribe(data.get('conversation_id'))
+            return
+        conversation_id = await self._owned_conversation_id(user, data.get('conversation_id'))
+        if conversation_id is None:
+            self.push({'error': 'Conversation not found', 'code': 'NOT_FOUND',
+                       'conversation_id': data.get('conversation_id')})
+            return
+        if kind == 'subscribe' and not await self._subscribe(conversation_id):
+            return
+        if kind == 'subscribe' and data.get('history') is False:
+            return  # e.g. after a resume, the client already has it
+        try:
+            limit = max(1, min(int(data.get('limit') or HISTORY_LIMIT), MAX_HISTORY_LIMIT))
+        except (TypeError, ValueError):
+            limit = HISTORY_LIMIT
+        await self._send_history(user, conversation_id, limit=limit)
+
+    async def _open_session(self, user: User, last_seen=None):
+        """Open the active conversation, then replay events after ``last_seen`` or fall back to full history."""
+        self.presence.submit('state', 'active', refresh=False)
+        conversation_id = history_cache.get_active(user.id)
+        if conversation_id is MISSING:
+            conversation_id = await database_sync_to_async(
+                lambda: Conversation.objects.filter(user=user, is_active=True).order_by('-updated_at')
+                .values_list('id', flat=True).first()
+            )()
+            history_cache.set_active(user.id, conversation_id)
+        if conversation_id is not None:
+            await self._subscribe(conversation_id)
+        frames = replay_buffer.since(user.id, last_seen) if last_seen else None
+        if last_seen:
+            cache_lookup('replay', frames is not None)
+        if frames is None:
+            await self._send_history(user, conversation_id)
+            return
+        for frame in frames:
+            if frame.get('conversation_id') and frame.get('type') in ('message', 'delta', 'conversation'):
+                await self._subscribe(frame['conversation_id'])
+        cursor = frames[-1]['cursor'] if frames else last_seen
+        self.push({'type': 'resumed', 'replayed': len(frames), 'cursor': cursor,
+                   'conversation_id': str(conversation_id) if conversation_id else None})
+        for frame in frames:
+            self.push(frame)
+        self._replayed_upto = replay_buffer.parse_cursor(cursor)
+        self.history_sent = True
+
+    def _query_param(self, name: str) -> str | None:
+        params = urllib.parse.parse_qs(self.scope.get('query_string', b'').decode())
+        return params[name][0] if name in params else None
+
+    async def chat_conversation(self, event):  # type: ignore
+        if await self._subscribe(event['conversation_id']):
+            frame = {'type': 'conversation', 'conversation_id': event['conversation_id'],
+                     'created': event.get('created', False)}
+            if 'cursor' in event:
+                frame['cursor'] = event['cursor']
+            self.push(frame)
+
+    async def _typing_enabled(self, user: User) -> bool:
+        if not hasattr(self, '_show_typing'):
+            enabled = await database_sync_to_async(
+                lambda: ChatSettings.objects.filter(user=user).values_list('show_typing_indicator', flat=True).first()
+            )()
+            self._show_typing = enabled is not False
+        return self._show_typing
+
+    async def _handle_typing(self, user: User, data: dict):
+        """Apply {"type": "typing", "conversation_id", "typing": bool}; safe to send on every keystroke."""
+        conversation_id = str(data.get('conversation_id') or '')
+        if conversation_id not in self.subscriptions:
+            self.push({'error': 'Conversation not open on this socket', 'code': 'NOT_SUBSCRIBED',
+                       'conversation_id': conversation_id or None})
+            return
+        if await self._typing_enabled(user):
+            self.typing.submit(conversation_id, bool(data.get('typing', True)))
+
+    async def _send_typing(self, conversation_id: str, typing: bool):
+        await timed_group_send(self.channel_layer, conversation_group(conversation_id), {
+            'type': 'chat.typing',
+            'conversation_id': conversation_id,
+            'typing': typing,
+            'socket': self.socket_id,
+            'expires_in': getattr(settings, 'CHAT_TYPING_TTL_SECONDS', 6.0),
+        })
+
+    async def chat_typing(self, event):  # type: ignore
+        if event.get('socket') != self.socket_id:
+            self.push({'type': 'typing', 'kind': 'user', 'conversation_id': event['conversation_id'],
+                       'typing': event['typing'], 'expires_in': event['expires_in']})
+
+    async def _handle_presence(self, user: User, data: dict):
+        """{"type": "presence", "state": "active"|"idle"} reports this socket's state; any presence frame
+        also starts presence updates for this socket and answers with a snapshot of the user's sockets."""
+        state = data.get('state')
+        if state in PRESENCE_STATES:
+            self.presence.submit('state', state, refresh=False)
+        if not getattr(self, 'watch_presence', False):
+            self.watch_presence = True
+            sockets = await sync_to_async(get_presence)(user.id)
+            sockets.pop(self.socket_id, None)
+            self.push({'type': 'presence', 'sockets': sockets})
+
+    async def _send_presence(self, key, state: str | None):
+        user = self.scope.get('user')
+        changed = await sync_to_async(set_presence)(
+            user.id, self.socket_id, state, getattr(settings, 'CHAT_PRESENCE_TTL_SECONDS', 90.0))
+        self._presence_touched = time.monotonic()
+        if changed:
+            await timed_group_send(self.channel_layer, self.group_name, {
+                'type': 'chat.presence', 'socket': self.socket_id, 'state': state or 'offline',
+            })
+
+    def _touch_presence(self):
+        """Keep this socket's presence entry from expiring while the client is talking to us."""
+        ttl = getattr(settings, 'CHAT_PRESENCE_TTL_SECONDS', 90.0)
+        if hasattr(self, 'group_name') and time.monotonic() - self._presence_touched > ttl / 3:
+            self._presence_touched = time.monotonic()
+            asyncio.create_task(sync_to_async(set_presence)(
+                self.scope['user'].id, self.socket_id, self.presence.last('state', 'active'), ttl))
+
+    async def chat_presence(self, event):  # type: ignore
+        if getattr(self, 'watch_presence', False) and event.get('socket') != self.socket_id:
+            self.push({'type': 'presence', 'socket': event['socket'], 'state': event['state']})
+
+    async def chat_cancel(self, event):  # type: ignore
+        task = self.generations.get(event.get('id'))
+        if task is not None:
+            task.cancel()
 
     def _extract_token_from_query(self) -> str | None:
         raw_qs = self.scope.get('query_string', b'').decode()
@@ -161,29 +652,83 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
     async def chat_message(self, event):  # type: ignore
         payload = event.get('payload', {})
-        await self.send(json.dumps({'type': 'message', **payload}))
+        self.push({'type': 'message', **payload})
+
+    async def chat_delta(self, event):  # type: ignore
+        # Adjacent deltas of one reply are merged by the outbound queue
+        self.push({'type': 'delta', **event.get('payload', {})})
+
+    async def chat_reactions(self, event):  # type: ignore
+        frame = {'type': 'reactions', 'updates': event.get('updates', [])}
+        if 'cursor' in event:
+            frame['cursor'] = event['cursor']
+        self.push(frame)
+
+    async def _handle_reaction(self, user: User, data: dict):
+        """Apply {"type": "reaction", "message_id", "reaction"} / {"type": "reaction.remove", "message_id"}."""
+        message_id = data.get('message_id')
+        try:
+            if data.get('type') == 'reaction':
+                change = await database_sync_to_async(set_reaction)(user, message_id, data.get('reaction', ''))
+            else:
+                change = await database_sync_to_async(remove_reaction)(user, message_id)
+        except ReactionError as e:
+            self.push({'error': str(e), 'code': e.code, 'message_id': message_id})
+            return
+        if not change.changed:
+            return
+        if not hasattr(self, 'group_name'):
+            await self.chat_reactions({'updates': [self._reaction_update(change)]})
+            return
+        # Coalesce bursts: keep only the latest counts per message and flush once per window
+        pending = getattr(self, '_pending_reactions', None)
+        if pending is None:
+            pending = self._pending_reactions = {}
+        pending[change.message_id] = self._reaction_update(change)
+        flusher = getattr(self, '_reaction_flusher', None)
+        if flusher is None or flusher.done():
+            self._reaction_flusher = asyncio.create_task(self._flush_reactions())
+
+    @staticmethod
+    def _reaction_update(change) -> dict:
+        return {
+            'message_id': str(change.message_id),
+            'conversation_id': str(change.conversation_id),
+            'counts': change.counts,
+        }
+
+    async def _flush_reactions(self):
+        await asyncio.sleep(REACTION_COALESCE_SECONDS)
+        updates = list(self._pending_reactions.values())
+        self._pending_reactions = {}
+        if updates and hasattr(self, 'group_name'):
+            cursor = replay_buffer.record(self.scope['user'].id, {'type': 'reactions', 'updates': updates})
+            await timed_group_send(self.channel_layer, self.group_name,
+                                   {'type': 'chat.reactions', 'updates': updates, 'cursor': cursor})
 
     @database_sync_to_async
-    def _get_recent_messages(self, user: User, limit: int = 20):
-        from chat.models import Message, Conversation
-        # Latest active conversation
-        conv = Conversation.objects.filter(user=user, is_active=True).order_by('-updated_at').first()
-        if not conv:
-            return []
-        return list(Message.objects.filter(conversation=conv).order_by('-timestamp')[:limit][::-1])
-
-    async def _send_history(self, user: User):
-        history = await self._get_recent_messages(user, limit=20)
-        await self.send(json.dumps({
+    def _get_recent_messages(self, user: User, conversation_id, limit: int = HISTORY_LIMIT) -> list[dict]:
+        from chat.models import Message
+        history = list(Message.objects.filter(conversation_id=conversation_id).select_related('sender', 'body').order_by('-timestamp')[:limit][::-1])
+        counts = reaction_counts([m.id for m in history]) if history else {}
+        return [serialize_message(m, user.id, counts.get(m.id)) for m in history]
+
+    async def _send_history(self, user: User, conversation_id, limit: int = HISTORY_LIMIT):
+        # Taken before reading, so anything written meanwhile is replayed rather than missed
+        cursor = replay_buffer.latest()
+        messages = None
+        if conversation_id is not None:
+            messages = history_cache.get_encoded(user.id, conversation_id, limit, self.wire)
+            if messages is None:
+                history_cache.begin_fill(user.id, conversation_id)
+                entries = await self._get_recent_messages(user, conversation_id, max(limit, history_cache.capacity))
+                history_cache.fill(user.id, conversation_id, entries)
+                messages = history_cache.get_encoded(user.id, conversation_id, limit, self.wire) \
+                    or self.wire.encode(entries[-limit:])
+        # The messages array is shared by every socket of the user in this format; only the envelope is encoded here
+        self.push(self.wire.envelope({
             'type': 'history',
-            'messages': [
-                {
-                    'id': str(m.id),
-                    'content': m.content,
-                    'sender': getattr(m.sender, 'username', 'unknown'),
-                    'kind': 'user' if getattr(m.sender, 'id', None) == user.id else 'bot',
-                    'timestamp': m.timestamp.isoformat(),
-                } for m in history
-            ]
-        }))
+            'conversation_id': str(conversation_id) if conversation_id else None,
+            'cursor': cursor,
+        }, 'messages', messages if messages is not None else self.wire.encode([])))
         self.history_sent = True
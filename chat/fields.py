@@ -0,0 +1,91 @@
+"""Custom model fields for the chat app."""
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+
+_preserve_timestamps: ContextVar[bool] = ContextVar("preserve_timestamps", default=False)
+
+
+@contextmanager
+def preserve_timestamps():
+    """Let ``auto_now``/``auto_now_add`` fields keep explicitly assigned values.
+
+    Used by bulk imports to keep original timestamps. Scoped with a ContextVar,
+    so concurrent requests and threads are unaffected.
+    """
+    token = _preserve_timestamps.set(True)
+    try:
+        yield
+    finally:
+        _preserve_timestamps.reset(token)
+
+
+class PreservableDateTimeField(models.DateTimeField):
+    """DateTimeField whose auto_now/auto_now_add can be bypassed inside ``preserve_timestamps()``."""
+
+    def pre_save(self, model_instance, add):
+        if _preserve_timestamps.get():
+            value = getattr(model_instance, self.attname)
+            if value is not None:
+                return value
+        return super().pre_save(model_instance, add)
+
+
+class CompactTextDescriptor(DeferredAttribute):
+    """Return the stored text, or the inflated body when the row was compacted.
+
+    A compacted row keeps ``''`` in the column and points ``<blob_field>`` at a
+    ``MessageBody``. The body is only fetched and decompressed when the
+    attribute is read; the raw column value in ``instance.__dict__`` is left
+    untouched so saving never writes the plaintext back.
+    """
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        raw = super().__get__(instance, cls)
+        if raw:
+            return raw
+        body_id = getattr(instance, self.field.blob_field + "_id", None)
+        if body_id is None:
+            return raw
+        cached = instance.__dict__.get("_compact_cache")
+        if cached is None or cached[0] != body_id:
+            cached = (body_id, getattr(instance, self.field.blob_field).text)
+            instance.__dict__["_compact_cache"] = cached
+        return cached[1]
+
+    def __set__(self, instance, value):
+        # Being a data descriptor keeps __get__ in the loop once the column is loaded
+        instance.__dict__[self.field.attname] = value
+
+
+class CompactTextField(models.TextField):
+    """TextField whose large values can live in a compressed, deduplicated side table.
+
+    ``blob_field`` names the nullable ForeignKey on the same model that points at
+    the compressed body. Reads through the model attribute are transparent;
+    ``values()``/``values_list()`` return the raw column (``''`` for compacted
+    rows), see ``chat.services.body_service.inflate_rows``.
+    """
+
+    descriptor_class = CompactTextDescriptor
+
+    def __init__(self, *args, blob_field: str = "body", **kwargs):
+        self.blob_field = blob_field
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.blob_field != "body":
+            kwargs["blob_field"] = self.blob_field
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        # Persist the raw column value, never the inflated text
+        return model_instance.__dict__.get(self.attname)
@@ -0,0 +1,296 @@
+"""In-process cache of the recent history shown when a socket opens a conversation.
+
+For each user it holds the active conversation id and, per open conversation,
+a ring buffer of the last ``CHAT_HISTORY_CACHE_SIZE`` messages already
+serialized as history entries, plus their JSON encoding once a socket has
+asked for it, so every tab of the user reuses the same encoded payload. Buffers are filled from the database on the
+first miss and then kept current by the ``Message`` signals (and reaction
+updates), so reconnects and extra tabs of a hot user need no queries at all.
+
+Users are evicted least-recently-used first once there are more than
+``CHAT_HISTORY_CACHE_MAX_USERS`` of them or the entries' approximate size
+passes ``CHAT_HISTORY_CACHE_MAX_BYTES``. The cache is per process, so with
+several workers a write made by another process shows up here only after
+``CHAT_HISTORY_CACHE_TTL_SECONDS``.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict, deque
+
+from django.conf import settings
+
+from .metrics import cache_lookup
+from .wire import JSON
+
+_ENTRY_OVERHEAD = 256  # rough size of an entry's dict and fixed fields
+MISSING = object()
+
+
+def serialize_message(message, owner_id: int, reactions: dict | None = None) -> dict:
+    """History entry for ``message`` (``sender`` must be loaded)."""
+    return {
+        'id': str(message.id),
+        'content': message.content,
+        'sender': getattr(message.sender, 'username', 'unknown'),
+        'kind': 'user' if message.sender_id == owner_id else 'bot',
+        'timestamp': message.timestamp.isoformat(),
+        'reactions': reactions or {},
+    }
+
+
+def _entry_size(entry: dict) -> int:
+    return len(entry['content']) + _ENTRY_OVERHEAD
+
+
+class _ConversationBuffer:
+    __slots__ = ('entries', 'complete', 'nbytes', 'loading', 'encoded')
+
+    def __init__(self, entries: list[dict], capacity: int, complete: bool, loading: bool = False):
+        self.entries: deque[dict] = deque(entries, maxlen=capacity)
+        # True when the buffer holds the whole conversation (fewer messages than capacity)
+        self.complete = complete
+        self.nbytes = sum(_entry_size(e) for e in self.entries)
+        # While a database read is in flight, saved messages collect here and are merged by fill()
+        self.loading = loading
+        self.encoded: dict[tuple, str | bytes] = {}  # (wire name, limit) -> encoded array of the last ``limit`` entries
+
+
+class _UserHistory:
+    __slots__ = ('active_id', 'conversations', 'loaded_at')
+
+    def __init__(self):
+        self.active_id = MISSING
+        self.conversations: dict[str, _ConversationBuffer] = {}
+        self.loaded_at = time.monotonic()
+
+    @property
+    def nbytes(self) -> int:
+        return sum(buf.nbytes for buf in self.conversations.values())
+
+
+class HistoryCache:
+    def __init__(self, capacity: int = 50, max_users: int = 5000, max_bytes: int = 64 << 20, ttl: float = 300.0):
+        self.capacity = capacity
+        self.max_users = max_users
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._users: "OrderedDict[int, _UserHistory]" = OrderedDict()
+        self._owners: dict[str, int] = {}  # conversation id -> owning user id, for cached conversations
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def _user(self, user_id: int, create: bool = False) -> _UserHistory | None:
+        state = self._users.get(user_id)
+        if state is not None and self.ttl and time.monotonic() - state.loaded_at > self.ttl:
+            self._drop_user(user_id)
+            state = None
+        if state is None and create:
+            state = self._users[user_id] = _UserHistory()
+        if state is not None:
+            self._users.move_to_end(user_id)
+        return state
+
+    def _drop_user(self, user_id: int) -> None:
+        state = self._users.pop(user_id, None)
+        if state is None:
+            return
+        for conversation_id, buf in state.conversations.items():
+            self._owners.pop(conversation_id, None)
+            self._nbytes -= buf.nbytes
+
+    def _evict(self) -> None:
+        while self._users and (len(self._users) > self.max_users or self._nbytes > self.max_bytes):
+            self._drop_user(next(iter(self._users)))
+
+    def get_active(self, user_id: int):
+        """Cached active conversation id (``None`` if the user has none), or ``MISSING`` on a miss."""
+        with self._lock:
+            state = self._user(user_id)
+            return MISSING if state is None else state.active_id
+
+    def set_active(self, user_id: int, conversation_id) -> None:
+        with self._lock:
+            self._user(user_id, create=True).active_id = str(conversation_id) if conversation_id else None
+            self._evict()
+
+    def _lookup(self, user_id: int, conversation_id: str, limit: int) -> _ConversationBuffer | None:
+        state = self._user(user_id)
+        buf = state.conversations.get(conversation_id) if state is not None else None
+        if buf is None or buf.loading or (limit > len(buf.entries) and not buf.complete):
+            self.misses += 1
+            cache_lookup("history", False)
+            return None
+        self.hits += 1
+        cache_lookup("history", True)
+        return buf
+
+    def get(self, user_id: int, conversation_id, limit: int) -> list[dict] | None:
+        """The last ``limit`` entries of a conversation, or ``None`` if they are not all cached."""
+        with self._lock:
+            buf = self._lookup(user_id, str(conversation_id), limit)
+            if buf is None:
+                return None
+            entries = list(buf.entries)
+        return entries[-limit:] if limit < len(entries) else entries
+
+    def get_encoded(self, user_id: int, conversation_id, limit: int, wire=JSON) -> str | bytes | None:
+        """Like ``get()``, but the entries encoded by ``wire``, once per buffer change, wire format and limit."""
+        with self._lock:
+            buf = self._lookup(user_id, str(conversation_id), limit)
+            if buf is None:
+                return None
+            key = (wire.name, limit)
+            text = buf.encoded.get(key)
+            if text is not None:
+                return text
+            text = wire.encode(list(buf.entries)[-limit:])
+            buf.encoded[key] = text
+            buf.nbytes += len(text)
+            self._nbytes += len(text)
+            self._evict()
+            return text
+
+    def _changed(self, buf: _ConversationBuffer) -> None:
+        if buf.encoded:
+            freed = sum(len(text) for text in buf.encoded.values())
+            buf.nbytes -= freed
+            self._nbytes -= freed
+            buf.encoded.clear()
+
+    def begin_fill(self, user_id: int, conversation_id) -> None:
+        """Call before reading a conversation from the database, so writes racing the read are kept."""
+        conversation_id = str(conversation_id)
+        with self._lock:
+            state = self._user(user_id, create=True)
+            buf = state.conversations.get(conversation_id)
+            if buf is None or not buf.loading:
+                if buf is not None:
+                    self._nbytes -= buf.nbytes
+                state.conversations[conversation_id] = _ConversationBuffer([], self.capacity, False, loading=True)
+                self._owners[conversation_id] = user_id
+
+    def fill(self, user_id: int, conversation_id, entries: list[dict]) -> None:
+        """Store the newest messages of a conversation, oldest first, as read after ``begin_fill``.
+
+        Skipped if the conversation was invalidated while it was being read.
+        """
+        conversation_id = str(conversation_id)
+        with self._lock:
+            state = self._user(user_id)
+            old = state.conversations.get(conversation_id) if state is not None else None
+            if old is None or not old.loading:
+                return
+            self._nbytes -= old.nbytes
+            if old.entries:
+                racing = {e['id']: e for e in old.entries}
+                entries = [racing.pop(e['id'], e) for e in entries] + list(racing.values())
+            complete = len(entries) < self.capacity
+            buf = _ConversationBuffer(entries[-self.capacity:], self.capacity, complete=complete)
+            state.conversations[conversation_id] = buf
+            self._owners[conversation_id] = user_id
+            self._nbytes += buf.nbytes
+            self._evict()
+
+    def owner_of(self, conversation_id) -> int | None:
+        with self._lock:
+            return self._owners.get(str(conversation_id))
+
+    def conversation_changed(self, user_id: int, conversation_id, deleted: bool = False) -> None:
+        """A conversation was saved or deleted: forget the cached active id (and its buffer when deleted)."""
+        with self._lock:
+            state = self._users.get(user_id)
+            if state is not None:
+                state.active_id = MISSING
+        if deleted:
+            self.invalidate_conversation(conversation_id)
+
+    def message_saved(self, message, owner_id: int, created: bool) -> None:
+        """Append a new message, or replace an edited one, in its conversation's buffer if cached."""
+        conversation_id = str(message.conversation_id)
+        with self._lock:
+            state = self._users.get(owner_id)
+            buf = state.conversations.get(conversation_id) if state is not None else None
+            if buf is None:
+                return
+            self._changed(buf)
+            entry_id = str(message.id)
+            for i, existing in enumerate(buf.entries):
+                if existing['id'] == entry_id:
+                    entry = serialize_message(message, owner_id, existing['reactions'])
+                    delta = _entry_size(entry) - _entry_size(existing)
+                    buf.entries[i] = entry
+                    buf.nbytes += delta
+                    self._nbytes += delta
+                    return
+            if not created and not buf.loading:
+                return  # an older message outside the buffer was edited
+            entry = serialize_message(message, owner_id)
+            if len(buf.entries) == buf.entries.maxlen:
+                dropped = _entry_size(buf.entries[0])
+                buf.nbytes -= dropped
+                self._nbytes -= dropped
+                buf.complete = False
+            buf.entries.append(entry)
+            buf.nbytes += _entry_size(entry)
+            self._nbytes += _entry_size(entry)
+            self._evict()
+
+    def set_reactions(self, conversation_id, message_id, counts: dict) -> None:
+        conversation_id, message_id = str(conversation_id), str(message_id)
+        with self._lock:
+            owner_id = self._owners.get(conversation_id)
+            state = self._users.get(owner_id) if owner_id is not None else None
+            buf = state.conversations.get(conversation_id) if state is not None else None
+            if buf is None:
+                return
+            for entry in buf.entries:
+                if entry['id'] == message_id:
+                    self._changed(buf)
+                    entry['reactions'] = dict(counts)
+                    return
+            if buf.loading:
+                # The read in flight may have seen the old counts; let fill() skip this conversation
+                self._owners.pop(conversation_id, None)
+                del state.conversations[conversation_id]
+                self._nbytes -= buf.nbytes
+
+    def invalidate_conversation(self, conversation_id) -> None:
+        conversation_id = str(conversation_id)
+        with self._lock:
+            owner_id = self._owners.pop(conversation_id, None)
+            state = self._users.get(owner_id) if owner_id is not None else None
+            if state is None:
+                return
+            buf = state.conversations.pop(conversation_id, None)
+            if buf is not None:
+                self._nbytes -= buf.nbytes
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            self._drop_user(user_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._users.clear()
+            self._owners.clear()
+            self._nbytes = 0
+            self.hits = self.misses = 0
+
+
+history_cache = HistoryCache(
+    capacity=getattr(settings, 'CHAT_HISTORY_CACHE_SIZE', 50),
+    max_users=getattr(settings, 'CHAT_HISTORY_CACHE_MAX_USERS', 5000),
+    max_bytes=getattr(settings, 'CHAT_HISTORY_CACHE_MAX_BYTES', 64 << 20),
+    ttl=getattr(settings, 'CHAT_HISTORY_CACHE_TTL_SECONDS', 300.0),
+)
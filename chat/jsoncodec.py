@@ -0,0 +1,83 @@
+"""JSON encoding for WebSocket frames and GraphQL responses.
+
+Uses orjson when it is installed and the standard library otherwise;
+``CHAT_JSON_BACKEND`` (``auto``, ``orjson`` or ``json``) picks one explicitly.
+Both backends write compact UTF-8 output and encode datetimes, dates, times,
+UUIDs and dataclasses natively, so callers never pre-convert values and
+clients can't tell which one produced a frame.
+"""
+from __future__ import annotations
+
+import dataclasses
+import datetime
+import json
+import uuid
+
+from django.conf import settings
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+# orjson.JSONDecodeError subclasses this, so one except clause covers both backends
+JSONDecodeError = json.JSONDecodeError
+
+
+def encode_default(obj):
+    """``default`` hook for types JSON (and MessagePack) lack: datetimes, UUIDs, dataclasses."""
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class StdlibCodec:
+    name = "json"
+
+    def __init__(self):
+        self._encoder = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False, default=encode_default)
+
+    def dumps(self, obj) -> str:
+        return self._encoder.encode(obj)
+
+    def dumpb(self, obj) -> bytes:
+        return self._encoder.encode(obj).encode("utf-8")
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class OrjsonCodec:
+    name = "orjson"
+    # Naive datetimes are written as-is, like isoformat(); non-str keys (e.g. ids) become strings
+    _options = orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+    def dumps(self, obj) -> str:
+        return orjson.dumps(obj, default=encode_default, option=self._options).decode("utf-8")
+
+    def dumpb(self, obj) -> bytes:
+        return orjson.dumps(obj, default=encode_default, option=self._options)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+def get_codec(backend: str = "auto"):
+    """Codec for ``backend``; ``auto`` prefers orjson and falls back to the standard library."""
+    if backend == "json" or (backend == "auto" and orjson is None):
+        return StdlibCodec()
+    if backend in ("orjson", "auto"):
+        if orjson is None:
+            raise ImportError("CHAT_JSON_BACKEND is 'orjson' but orjson is not installed")
+        return OrjsonCodec()
+    raise ValueError(f"Unknown JSON backend '{backend}'")
+
+
+codec = get_codec(getattr(settings, "CHAT_JSON_BACKEND", "auto"))
+dumps = codec.dumps
+dumpb = codec.dumpb
+loads = codec.loads
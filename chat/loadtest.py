@@ -0,0 +1,338 @@
+"""WebSocket load generator for ``ws/chat/``, used by ``manage.py loadtest_ws``.
+
+Every simulated client opens a socket, authenticates with a JWT in its first
+frame and then works through one scripted conversation: it sends a message,
+waits for the full reply and moves on. Sends are paced by a shared ticket
+queue so the whole run holds a target rate of messages per second (or, with no
+rate, each client sends again as soon as its reply is complete).
+
+Per reply it records the time to the echo of the user message (``ack``), to
+the first reply chunk (``first_token``) and to the complete reply
+(``reply``), plus the handshake and authentication time per socket. Error
+frames and fallback replies (no bot user, provider failure) count as failed
+replies instead of latency samples. Server
+memory is read from ``/proc`` before and after the sockets are open, so the
+report can state resident memory per idle connection.
+"""
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import struct
+import time
+import uuid
+from dataclasses import dataclass, field
+from urllib.parse import urlparse
+
+from chat.service import FALLBACK_REPLIES
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+DEFAULT_SCRIPT = [
+    ["Hi! Can you help me plan a trip to Lisbon?", "What should I see on the first day?",
+     "Any tips for getting around?"],
+    ["Explain the difference between a list and a tuple in Python.", "When would I prefer a tuple?"],
+    ["Write a two-line poem about the sea."],
+]
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of ``values`` (``0.0`` for no values)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def latency_summary(values_ms: list[float]) -> dict:
+    return {
+        "count": len(values_ms),
+        "mean": round(sum(values_ms) / len(values_ms), 3) if values_ms else 0.0,
+        "p50": round(percentile(values_ms, 0.50), 3),
+        "p95": round(percentile(values_ms, 0.95), 3),
+        "p99": round(percentile(values_ms, 0.99), 3),
+        "max": round(max(values_ms, default=0.0), 3),
+    }
+
+
+def process_rss(pid: int) -> int | None:
+    """Resident memory in bytes of ``pid`` and all its descendants, or ``None`` without ``/proc``."""
+    try:
+        parents: dict[int, int] = {}
+        for entry in os.listdir("/proc"):
+            if entry.isdigit():
+                try:
+                    with open(f"/proc/{entry}/stat") as f:
+                        # The command name may contain spaces; the parent pid follows the closing paren
+                        parents[int(entry)] = int(f.read().rsplit(")", 1)[1].split()[1])
+                except (OSError, IndexError, ValueError):
+                    continue
+    except OSError:
+        return None
+    tree, frontier = {pid}, [pid]
+    while frontier:
+        parent = frontier.pop()
+        for child, ppid in parents.items():
+            if ppid == parent and child not in tree:
+                tree.add(child)
+                frontier.append(child)
+    total = 0
+    for member in tree:
+        try:
+            with open(f"/proc/{member}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+        except OSError:
+            continue
+    return total
+
+
+class Client:
+    """A minimal RFC 6455 client on asyncio streams: text frames in and out, pings answered.
+
+    Autobahn's asyncio client cannot be used here because Daphne has already
+    bound txaio to Twisted in this process, and a dependency-free client keeps
+    per-socket overhead on the load generator's side small and predictable.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, url: str, timeout: float) -> "Client":
+        parsed = urlparse(url)
+        port = parsed.port or (443 if parsed.scheme == "wss" else 80)
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(parsed.hostname, port, ssl=True if parsed.scheme == "wss" else None), timeout)
+        key = base64.b64encode(os.urandom(16)).decode()
+        writer.write((
+            f"GET {parsed.path or '/'}{'?' + parsed.query if parsed.query else ''} HTTP/1.1\r\n"
+            f"Host: {parsed.netloc}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n"
+            f"Origin: http://{parsed.hostname}\r\n\r\n"
+        ).encode())
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout)
+        status = head.split(b"\r\n", 1)[0]
+        expected = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest())
+        if b" 101 " not in status or expected not in head:
+            writer.close()
+            raise ConnectionError(f"handshake refused: {status.decode(errors='replace')}")
+        return cls(reader, writer)
+
+    def _write(self, opcode: int, payload: bytes) -> None:
+        mask = os.urandom(4)
+        length = len(payload)
+        if length < 126:
+            header = struct.pack("!BB", 0x80 | opcode, 0x80 | length)
+        elif length < 1 << 16:
+            header = struct.pack("!BBH", 0x80 | opcode, 0x80 | 126, length)
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 0x80 | 127, length)
+        masked = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        self.writer.write(header + mask + masked)
+
+    def send(self, frame: dict) -> None:
+        self._write(0x1, json.dumps(frame).encode())
+
+    async def _read_frame(self) -> tuple[bool, int, bytes]:
+        first, second = await self.reader.readexactly(2)
+        length = second & 0x7F
+        if length == 126:
+            (length,) = struct.unpack("!H", await self.reader.readexactly(2))
+        elif length == 127:
+            (length,) = struct.unpack("!Q", await self.reader.readexactly(8))
+        return bool(first & 0x80), first & 0x0F, await self.reader.readexactly(length)
+
+    async def _next_message(self) -> dict:
+        parts: list[bytes] = []
+        while True:
+            try:
+                fin, opcode, payload = await self._read_frame()
+            except (asyncio.IncompleteReadError, ConnectionError) as e:
+                raise ConnectionError("socket closed") from e
+            if opcode == 0x8:
+                code = struct.unpack("!H", payload[:2])[0] if len(payload) >= 2 else 1005
+                raise ConnectionError(f"closed by server with {code}")
+            if opcode == 0x9:
+                self._write(0xA, payload)
+                continue
+            if opcode in (0x1, 0x2, 0x0):
+                parts.append(payload)
+                if fin:
+                    return json.loads(b"".join(parts))
+
+    async def receive(self, timeout: float) -> dict:
+        return await asyncio.wait_for(self._next_message(), timeout)
+
+    def close(self) -> None:
+        if not self.writer.is_closing():
+            self._write(0x8, struct.pack("!H", 1000))
+            self.writer.close()
+
+
+@dataclass
+class LoadStats:
+    handshake_ms: list[float] = field(default_factory=list)
+    auth_ms: list[float] = field(default_factory=list)
+    ack_ms: list[float] = field(default_factory=list)
+    first_token_ms: list[float] = field(default_factory=list)
+    reply_ms: list[float] = field(default_factory=list)
+    connect_errors: int = 0
+    reply_errors: int = 0
+    errors: dict[str, int] = field(default_factory=dict)
+
+    def error(self, kind: str) -> None:
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+
+@dataclass
+class LoadOptions:
+    url: str
+    tokens: list[str]
+    script: list[list[str]] = field(default_factory=lambda: DEFAULT_SCRIPT)
+    rate: float = 0.0  # messages per second over all sockets; 0 sends as soon as the previous reply is complete
+    think_time: float = 0.0  # seconds a closed-loop client waits between replies
+    ramp: float = 200.0  # sockets opened per second
+    timeout: float = 60.0
+    server_pid: int | None = None
+
+
+async def _pace(rate: float, tickets: asyncio.Queue, total: int) -> None:
+    started = time.perf_counter()
+    for n in range(total):
+        await asyncio.sleep(max(0.0, started + n / rate - time.perf_counter()))
+        tickets.put_nowait(None)
+
+
+async def _open(index: int, options: LoadOptions, stats: LoadStats) -> Client | None:
+    started = time.perf_counter()
+    try:
+        client = await Client.connect(options.url, options.timeout)
+    except (OSError, ConnectionError, asyncio.TimeoutError) as e:
+        stats.connect_errors += 1
+        stats.error(f"connect: {type(e).__name__}")
+        return None
+    stats.handshake_ms.append((time.perf_counter() - started) * 1000)
+    try:
+        await client.receive(options.timeout)  # Connected
+        authenticating = time.perf_counter()
+        client.send({"token": options.tokens[index]})
+        while (await client.receive(options.timeout)).get("type") != "history":
+            pass
+    except (ConnectionError, asyncio.TimeoutError) as e:
+        stats.connect_errors += 1
+        stats.error(f"auth: {type(e).__name__}")
+        client.close()
+        return None
+    stats.auth_ms.append((time.perf_counter() - authenticating) * 1000)
+    return client
+
+
+async def _session(index: int, options: LoadOptions, stats: LoadStats, opened: asyncio.Event,
+                   ready: list[int], go: asyncio.Event, tickets: asyncio.Queue | None) -> None:
+    await asyncio.sleep(index / options.ramp)
+    client = None
+    try:
+        client = await _open(index, options, stats)
+    finally:
+        ready.append(index)
+        if len(ready) == len(options.tokens):
+            opened.set()
+    if client is None:
+        return
+    # Every socket stays open until all are connected, so memory is measured at full count
+    await go.wait()
+    try:
+        for text in options.script[index % len(options.script)]:
+            if tickets is not None:
+                await tickets.get()
+            await _exchange(client, text, options.timeout, stats)
+            if options.think_time:
+                await asyncio.sleep(options.think_time)
+    except (ConnectionError, asyncio.TimeoutError) as e:
+        stats.error(f"reply: {type(e).__name__}")
+    finally:
+        client.close()
+
+
+async def _exchange(client: Client, text: str, timeout: float, stats: LoadStats) -> None:
+    reply_id = str(uuid.uuid4())
+    sent = time.perf_counter()
+    client.send({"message": text, "id": reply_id})
+    first_token = None
+    while True:
+        frame = await client.receive(timeout)
+        elapsed = (time.perf_counter() - sent) * 1000
+        if (frame.get("code") or frame.get("error")) and frame.get("id") in (reply_id, None):
+            stats.reply_errors += 1
+            stats.error(frame.get("code") or frame["error"])
+            return
+        if frame.get("reply_id") == reply_id:
+            stats.ack_ms.append(elapsed)
+        elif frame.get("id") == reply_id:
+            if frame.get("type") == "message" and frame.get("content") in FALLBACK_REPLIES:
+                stats.reply_errors += 1
+                stats.error(f"fallback reply: {frame['content']}")
+                return
+            if first_token is None:
+                first_token = elapsed
+                stats.first_token_ms.append(elapsed)
+            if frame.get("type") == "message":
+                stats.reply_ms.append(elapsed)
+                return
+
+
+async def run_load(options: LoadOptions) -> dict:
+    """Open one socket per token, play the script on each, and return the report."""
+    stats = LoadStats()
+    sockets = len(options.tokens)
+    baseline_rss = process_rss(options.server_pid) if options.server_pid else None
+    opened, go = asyncio.Event(), asyncio.Event()
+    ready: list[int] = []
+    total = sum(len(options.script[i % len(options.script)]) for i in range(sockets))
+    tickets = asyncio.Queue() if options.rate else None
+    sessions = [asyncio.ensure_future(_session(i, options, stats, opened, ready, go, tickets))
+                for i in range(sockets)]
+    connecting = time.perf_counter()
+    await opened.wait()
+    connect_seconds = time.perf_counter() - connecting
+    connected = len(stats.auth_ms)
+    open_rss = process_rss(options.server_pid) if options.server_pid else None
+
+    started = time.perf_counter()
+    go.set()
+    pacer = asyncio.ensure_future(_pace(options.rate, tickets, total)) if tickets is not None else None
+    await asyncio.gather(*sessions)
+    if pacer is not None:
+        pacer.cancel()
+    elapsed = time.perf_counter() - started
+
+    report = {
+        "sockets": sockets,
+        "connected": connected,
+        "connect_seconds": round(connect_seconds, 3),
+        "messages": total,
+        "replies": len(stats.reply_ms),
+        "errors": stats.errors,
+        "seconds": round(elapsed, 3),
+        "replies_per_second": round(len(stats.reply_ms) / elapsed, 1) if elapsed else 0.0,
+        "target_rate": options.rate,
+        "latency_ms": {
+            "handshake": latency_summary(stats.handshake_ms),
+            "auth": latency_summary(stats.auth_ms),
+            "ack": latency_summary(stats.ack_ms),
+            "first_token": latency_summary(stats.first_token_ms),
+            "reply": latency_summary(stats.reply_ms),
+        },
+    }
+    if baseline_rss is not None and open_rss is not None:
+        report["server_rss"] = {
+            "baseline_bytes": baseline_rss,
+            "connected_bytes": open_rss,
+            "per_connection_bytes": round((open_rss - baseline_rss) / connected) if connected else None,
+        }
+    return report
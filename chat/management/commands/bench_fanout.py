@@ -0,0 +1,219 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import queue
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.loadtest import percentile
+from core.channels.layers import build_channel_layer, channel_layer_config
+
+GROUP = "bench_fanout"
+SERVER_BINARIES = ("redis-server", "valkey-server", "keydb-server")
+
+
+def summarize(latencies_ms: list[float], published: int, expected: int, elapsed: float) -> dict:
+    delivered = len(latencies_ms)
+    return {
+        "published": published,
+        "expected": expected,
+        "delivered": delivered,
+        "lost": expected - delivered,
+        "seconds": round(elapsed, 3),
+        "published_per_second": round(published / elapsed, 1) if elapsed else 0.0,
+        "delivered_per_second": round(delivered / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies_ms, 0.50), 3),
+            "p95": round(percentile(latencies_ms, 0.95), 3),
+            "p99": round(percentile(latencies_ms, 0.99), 3),
+            "max": round(max(latencies_ms, default=0.0), 3),
+        },
+    }
+
+
+async def _receive(layer, channel: str, latencies: list[float], last: list[float]) -> None:
+    while True:
+        message = await layer.receive(channel)
+        if message["type"] == "bench.stop":
+            return
+        now = time.time()
+        latencies.append((now - message["sent"]) * 1000)
+        last[0] = max(last[0], now)
+
+
+async def _worker(config: dict, sockets: int, ready, results, index: int) -> None:
+    layer = build_channel_layer(config)
+    channels = [await layer.new_channel() for _ in range(sockets)]
+    for channel in channels:
+        await layer.group_add(GROUP, channel)
+    latencies: list[float] = []
+    last = [0.0]
+    receivers = [asyncio.create_task(_receive(layer, channel, latencies, last)) for channel in channels]
+    ready.put(index)
+    await asyncio.gather(*receivers)
+    for channel in channels:
+        await layer.group_discard(GROUP, channel)
+    results.put((index, latencies, last[0]))
+    await _close(layer)
+
+
+async def _close(layer) -> None:
+    close_pools = getattr(layer, "close_pools", None)
+    # The pub/sub layer has no pools to close; flushing it just drops its own subscriptions
+    await (close_pools() if close_pools is not None else layer.flush())
+
+
+async def _flush(config: dict) -> None:
+    """Delete everything the run left under its prefix."""
+    layer = build_channel_layer(config)
+    await layer.flush()
+    await _close(layer)
+
+
+def run_worker(config: dict, sockets: int, ready, results, index: int) -> None:
+    """Entry point of one worker process: ``sockets`` group members receiving until ``bench.stop``."""
+    asyncio.run(_worker(config, sockets, ready, results, index))
+
+
+def _free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = ("Measure cross-process group fanout through the channel layer: worker processes join one group "
+            "and report latency and throughput of messages published from this process.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--layer", default=None, help="Layer profile (default: CHAT_CHANNEL_LAYER; "
+                                                          "'memory' cannot cross processes).")
+        parser.add_argument("--redis-url", default=None, help="Default: CHAT_CHANNEL_REDIS_URL.")
+        parser.add_argument("--start-server", action="store_true",
+                            help=f"Start a throwaway {'/'.join(SERVER_BINARIES)} on a free port for the run.")
+        parser.add_argument("--workers", type=int, default=4, help="Worker processes, like ASGI workers.")
+        parser.add_argument("--sockets", type=int, default=25, help="Group members per worker, like open tabs.")
+        parser.add_argument("--messages", type=int, default=1000, help="Group sends to publish.")
+        parser.add_argument("--rate", type=float, default=0, help="Group sends per second (0: as fast as possible).")
+        parser.add_argument("--payload", type=int, default=200, help="Bytes of text per message.")
+        parser.add_argument("--json", action="store_true", help="Print the result as one JSON object.")
+
+    def _start_server(self, port: int):
+        binary = next((shutil.which(name) for name in SERVER_BINARIES if shutil.which(name)), None)
+        if binary is None:
+            raise CommandError(f"--start-server needs one of {', '.join(SERVER_BINARIES)} on PATH")
+        workdir = tempfile.mkdtemp(prefix="bench_fanout_")
+        process = subprocess.Popen(
+            [binary, "--port", str(port), "--bind", "127.0.0.1", "--save", "", "--appendonly", "no", "--dir", workdir],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+                return process
+            except OSError:
+                time.sleep(0.05)
+        process.kill()
+        raise CommandError(f"{binary} did not start listening on port {port}")
+
+    def handle(self, *args, **options):
+        profile = options["layer"] or settings.CHAT_CHANNEL_LAYER
+        if profile == "memory":
+            raise CommandError("The memory layer only reaches its own process; use --layer redis-pubsub or redis")
+        server = None
+        url = options["redis_url"] or settings.CHAT_CHANNEL_REDIS_URL
+        if options["start_server"]:
+            port = _free_port()
+            server = self._start_server(port)
+            url = f"redis://127.0.0.1:{port}/0"
+        # A run-specific prefix keeps stale groups from earlier runs out of the numbers
+        config = channel_layer_config(profile, url=url, prefix=f"bench{os.getpid()}",
+                                      capacity=settings.CHAT_CHANNEL_CAPACITY, expiry=settings.CHAT_CHANNEL_EXPIRY,
+                                      group_expiry=settings.CHAT_CHANNEL_GROUP_EXPIRY)
+        try:
+            result = self._run(config, options)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=10)
+        result.update(layer=profile, workers=options["workers"], sockets_per_worker=options["sockets"],
+                      payload_bytes=options["payload"])
+        if options["json"]:
+            self.stdout.write(json.dumps(result))
+            return
+        latency = result["latency_ms"]
+        self.stdout.write(
+            f"{profile}: {options['workers']} workers x {options['sockets']} sockets, "
+            f"{result['published']} group sends of {options['payload']} B"
+        )
+        self.stdout.write(f"  published  {result['published_per_second']:>12,.0f} msg/s")
+        self.stdout.write(f"  delivered  {result['delivered_per_second']:>12,.0f} msg/s "
+                          f"({result['delivered']:,} of {result['expected']:,})")
+        self.stdout.write(f"  latency    p50 {latency['p50']:.2f} ms  p95 {latency['p95']:.2f} ms  "
+                          f"p99 {latency['p99']:.2f} ms  max {latency['max']:.2f} ms")
+        if result["lost"]:
+            self.stdout.write(self.style.WARNING(
+                f"  {result['lost']:,} deliveries lost (channel capacity {settings.CHAT_CHANNEL_CAPACITY} exceeded, "
+                f"or workers stalled)"))
+
+    def _run(self, config: dict, options) -> dict:
+        context = multiprocessing.get_context("spawn")
+        ready, results = context.Queue(), context.Queue()
+        workers = [
+            context.Process(target=run_worker, args=(config, options["sockets"], ready, results, index), daemon=True)
+            for index in range(options["workers"])
+        ]
+        for process in workers:
+            process.start()
+        try:
+            for _ in workers:
+                ready.get(timeout=30)
+        except queue.Empty:
+            self._stop(workers)
+            raise CommandError("Workers did not join the group within 30s; is the Redis server reachable?")
+        try:
+            started, publish_seconds = asyncio.run(self._publish(config, options))
+            collected = [results.get(timeout=30) for _ in workers]
+        except queue.Empty:
+            raise CommandError("Workers did not report within 30s")
+        finally:
+            asyncio.run(_flush(config))
+            self._stop(workers)
+        latencies = [latency for _, worker_latencies, _ in collected for latency in worker_latencies]
+        finished = max((last for _, _, last in collected), default=0.0)
+        expected = options["messages"] * options["workers"] * options["sockets"]
+        result = summarize(latencies, options["messages"], expected, max(finished - started, publish_seconds))
+        result["published_per_second"] = round(options["messages"] / publish_seconds, 1)
+        return result
+
+    @staticmethod
+    def _stop(workers) -> None:
+        for process in workers:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.kill()
+
+    async def _publish(self, config: dict, options) -> tuple[float, float]:
+        """Publish the messages; returns the start time and how long publishing took."""
+        layer = build_channel_layer(config)
+        text = "x" * options["payload"]
+        interval = 1 / options["rate"] if options["rate"] else 0
+        started = time.time()
+        for seq in range(options["messages"]):
+            await layer.group_send(GROUP, {"type": "bench.fanout", "seq": seq, "sent": time.time(), "text": text})
+            if interval:
+                await asyncio.sleep(max(0.0, started + (seq + 1) * interval - time.time()))
+        publish_seconds = max(time.time() - started, 1e-9)
+        # Let queued deliveries drain before telling the workers to report
+        await asyncio.sleep(1)
+        await layer.group_send(GROUP, {"type": "bench.stop"})
+        await _close(layer)
+        return started, publish_seconds
@@ -0,0 +1,78 @@
+import datetime
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from chat.consumers import HISTORY_LIMIT
+from chat.jsoncodec import StdlibCodec, get_codec, orjson
+
+
+def sample_frames() -> dict[str, dict]:
+    now = timezone.now()
+    entries = [
+        {
+            "id": str(uuid.uuid4()),
+            "content": "Sure, here is a short answer with a little detail. " * (1 + i % 4),
+            "sender": "alice" if i % 2 else "Z-Chatbot",
+            "kind": "user" if i % 2 else "bot",
+            "timestamp": (now - datetime.timedelta(minutes=HISTORY_LIMIT - i)).isoformat(),
+            "reactions": {"LIKE": 1} if i % 5 == 0 else {},
+        }
+        for i in range(HISTORY_LIMIT)
+    ]
+    return {
+        "delta": {"type": "delta", "id": str(uuid.uuid4()), "conversation_id": str(uuid.uuid4()), "offset": 120,
+                  "delta": "token ", "cursor": "1a2b3c4d:1042"},
+        "message": {"type": "message", "id": uuid.uuid4(), "conversation_id": uuid.uuid4(), "kind": "bot",
+                    "sender": "Z-Chatbot", "content": entries[0]["content"], "timestamp": now,
+                    "reactions": {}, "cursor": "1a2b3c4d:1043"},
+        "history": {"type": "history", "conversation_id": str(uuid.uuid4()), "cursor": "1a2b3c4d:1043",
+                    "messages": entries},
+    }
+
+
+class Command(BaseCommand):
+    help = "Measure WebSocket frame encoding throughput for each available JSON backend."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20000, help="Encodes per frame type and backend.")
+
+    def _run(self, label: str, encode, frame, iterations: int):
+        encode(frame)  # warm up
+        start = time.perf_counter()
+        for _ in range(iterations):
+            text = encode(frame)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"  {label:<24} {iterations / elapsed:>12,.0f} frames/s {len(text) * iterations / elapsed / 1e6:>9.1f} MB/s"
+        )
+        return elapsed
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        frames = sample_frames()
+        codecs = [StdlibCodec()] + ([get_codec("orjson")] if orjson is not None else [])
+        timings = {}
+        for codec in codecs:
+            self.stdout.write(f"{codec.name}:")
+            for name, frame in frames.items():
+                timings[codec.name, name] = self._run(name, codec.dumps, frame, iterations)
+
+            # What a second tab costs when the history array comes from the cache: only the envelope is encoded
+            history = frames["history"]
+            envelope = {key: value for key, value in history.items() if key != "messages"}
+            messages = codec.dumps(history["messages"])
+
+            def reuse(frame, envelope=envelope, messages=messages, dumps=codec.dumps):
+                return f'{dumps(envelope)[:-1]},"messages":{messages}}}'
+
+            self._run("history (cached array)", reuse, history, iterations)
+
+        if len(codecs) > 1:
+            for name in frames:
+                speedup = timings["json", name] / timings["orjson", name]
+                self.stdout.write(self.style.SUCCESS(f"orjson is {speedup:.1f}x the standard library on {name} frames"))
+        else:
+            self.stdout.write("orjson is not installed; only the standard library was measured")
@@ -0,0 +1,101 @@
+import json
+import platform
+import subprocess
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from authentication.models import User
+from chat.benchmarks import BENCHMARKS, build_fixture, compare, run_benchmark
+from chat.models import Conversation, Message
+
+
+def _git() -> dict:
+    def git(*args) -> str:
+        return subprocess.run(["git", *args], cwd=settings.BASE_DIR, capture_output=True, text=True,
+                              timeout=10).stdout.strip()
+    try:
+        return {"commit": git("rev-parse", "HEAD") or None, "dirty": bool(git("status", "--porcelain", "-uno"))}
+    except (OSError, subprocess.SubprocessError):
+        return {"commit": None, "dirty": None}
+
+
+class Command(BaseCommand):
+    help = ("Benchmark the hot paths (message saving, socket history, JWT resolution, GraphQL conversations and "
+            "messages, registration) against the current database and report latency percentiles, throughput "
+            "and SQL queries per operation. Generate data first with generate_dataset.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", default="synth-0", help="User whose data the benchmarks read and write.")
+        parser.add_argument("--only", default="", help="Comma-separated benchmark names.")
+        parser.add_argument("--iterations", type=int, default=None, help="Override every benchmark's iterations.")
+        parser.add_argument("--output", default=None, help="Write the JSON report to this file.")
+        parser.add_argument("--compare", default=None, help="JSON report of an earlier run to compare against.")
+        parser.add_argument("--json", action="store_true", help="Print the report as one JSON object.")
+        parser.add_argument("--list", action="store_true", help="List the benchmarks and exit.")
+
+    def handle(self, *args, **options):
+        if options["list"]:
+            for benchmark in BENCHMARKS:
+                self.stdout.write(f"{benchmark.name:<24}{benchmark.description}")
+            return
+        names = [name.strip() for name in options["only"].split(",") if name.strip()]
+        unknown = set(names) - {b.name for b in BENCHMARKS}
+        if unknown:
+            raise CommandError(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+        try:
+            fixture = build_fixture(options["user"])
+        except (User.DoesNotExist, Conversation.DoesNotExist):
+            raise CommandError(f"User '{options['user']}' with at least one conversation not found; "
+                               f"run generate_dataset or pass --user")
+        baseline = None
+        if options["compare"]:
+            with open(options["compare"]) as f:
+                baseline = json.load(f)
+
+        report = {
+            "created_at": timezone.now().isoformat(),
+            "git": _git(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": {
+                "vendor": connection.vendor,
+                "users": User.objects.count(),
+                "conversations": Conversation.objects.count(),
+                "messages": Message.objects.count(),
+            },
+            "fixture": {"user": fixture.user.username,
+                        "conversation_messages": fixture.conversation.messages.count()},
+            "results": {},
+        }
+        for benchmark in BENCHMARKS:
+            if names and benchmark.name not in names:
+                continue
+            result = run_benchmark(benchmark, fixture, options["iterations"])
+            report["results"][benchmark.name] = result
+            if not options["json"]:
+                latency = result["latency_ms"]
+                self.stdout.write(f"  {benchmark.name:<24}{result['ops_per_second']:>10,.1f} ops/s  "
+                                  f"p50 {latency['p50']:>8.2f}  p95 {latency['p95']:>8.2f}  "
+                                  f"p99 {latency['p99']:>8.2f} ms  {result['queries']:>3} queries")
+        if baseline is not None:
+            report["comparison"] = {"baseline": baseline.get("git", {}).get("commit"),
+                                    "changes": compare(report, baseline)}
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+        if options["json"]:
+            self.stdout.write(json.dumps(report))
+            return
+        if baseline is not None:
+            self.stdout.write(f"Compared with {report['comparison']['baseline'] or options['compare']}:")
+            for name, change in report["comparison"]["changes"].items():
+                style = self.style.SUCCESS if (change["p50_ratio"] or 1) <= 1 else self.style.WARNING
+                self.stdout.write(style(f"  {name:<24}p50 x{change['p50_ratio']}  throughput "
+                                        f"x{change['ops_ratio']}  queries {change['queries_delta']:+d}"))
+        if options["output"]:
+            self.stdout.write(f"Report written to {options['output']}")
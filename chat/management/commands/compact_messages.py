@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from chat.services.body_service import CompactionStats, compact_existing, purge_orphan_bodies, storage_summary
+
+
+class Command(BaseCommand):
+    help = "Move large message bodies into compressed, deduplicated MessageBody rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows compacted per transaction.")
+        parser.add_argument("--threshold", type=int, default=None,
+                            help="Minimum content length in characters (default MESSAGE_COMPRESSION_THRESHOLD).")
+
+    def handle(self, *args, **options):
+        before = storage_summary()
+
+        def progress(stats: CompactionStats):
+            self.stdout.write(f"  {stats.compacted}/{stats.scanned} rows compacted ({stats.elapsed:.1f}s)")
+
+        stats = compact_existing(batch_size=options["batch_size"], threshold=options["threshold"], on_progress=progress)
+        orphans = purge_orphan_bodies(options["batch_size"])
+        after = storage_summary()
+        self.stdout.write(self.style.SUCCESS(
+            f"Compacted {stats.compacted} messages ({stats.bytes_before:,} bytes of text) into "
+            f"{after['bodies']} bodies in {stats.elapsed:.2f}s; removed {orphans} orphan bodies"
+        ))
+        if "database_bytes" in after:
+            self.stdout.write(
+                f"Database size: {before['database_bytes']:,} -> {after['database_bytes']:,} bytes "
+                f"(run VACUUM, then rebuild_search_index, to return freed pages to the OS)"
+            )
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from chat.models import Message, MessageEmbedding
+from chat.services.memory_service import get_embedder, remember_messages
+
+
+class Command(BaseCommand):
+    help = "Backfill semantic-memory embeddings for messages that do not have one yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--user-id", type=int, default=None, help="Only embed this user's conversations.")
+
+    def handle(self, *args, **options):
+        embedder = get_embedder()
+        qs = (
+            Message.objects.exclude(pk__in=MessageEmbedding.objects.filter(embedder=embedder.name).values("message_id"))
+            .select_related("conversation__user", "body")
+            .order_by("conversation__user_id", "timestamp")
+        )
+        if options["user_id"]:
+            qs = qs.filter(conversation__user_id=options["user_id"])
+
+        started = time.perf_counter()
+        total = 0
+        batch: list[Message] = []
+        for message in qs.iterator(chunk_size=options["batch_size"]):
+            if batch and batch[-1].conversation.user_id != message.conversation.user_id:
+                total += remember_messages(batch[-1].conversation.user, batch)
+                batch = []
+            batch.append(message)
+            if len(batch) >= options["batch_size"]:
+                total += remember_messages(message.conversation.user, batch)
+                batch = []
+        if batch:
+            total += remember_messages(batch[-1].conversation.user, batch)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Embedded {total} messages with {embedder.name} in {elapsed:.2f}s"))
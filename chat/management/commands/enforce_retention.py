@@ -0,0 +1,61 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.management.commands.serve import PER_PROCESS_CACHES
+from chat.services.retention_service import DEFAULT_CHUNK_SIZE, DEFAULT_PAUSE, RetentionRunner, RetentionStats
+
+
+class Command(BaseCommand):
+    help = "Delete messages/conversations older than each user's ChatSettings.auto_delete_after_days, in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows deleted per transaction.")
+        parser.add_argument("--pause", type=float, default=DEFAULT_PAUSE, help="Seconds to sleep between chunks.")
+        parser.add_argument("--archive-dir", default=None, help="Write deleted rows to gzip NDJSON files here first.")
+        parser.add_argument("--dry-run", action="store_true", help="Only count what would be deleted.")
+        parser.add_argument("--loop", type=float, default=None, metavar="SECONDS",
+                            help="Keep running, starting a new pass every SECONDS.")
+        parser.add_argument("--allow-local-cache", action="store_true",
+                            help="Run even though the cache is per process, so servers keep serving purged "
+                                 "share links from their own cache until it expires.")
+
+    def handle(self, *args, **options):
+        cache = settings.CACHES.get("default", {}).get("BACKEND", "")
+        if cache in PER_PROCESS_CACHES and not options["dry_run"] and not options["allow_local_cache"]:
+            # The share entries dropped here live in the servers' caches, not this process's
+            raise CommandError(
+                f"Refusing to purge with the cache {cache}: shared links of purged conversations stay public "
+                f"on running servers for up to SHARE_CACHE_TIMEOUT={getattr(settings, 'SHARE_CACHE_TIMEOUT', 3600)}s. "
+                "Configure a shared CACHES backend such as Redis, or pass --allow-local-cache."
+            )
+        last_report = [0.0]
+
+        def progress(stats: RetentionStats):
+            if time.monotonic() - last_report[0] < 1.0:
+                return
+            last_report[0] = time.monotonic()
+            self.stdout.write(
+                f"  {stats.messages_deleted} messages, {stats.conversations_deleted} conversations "
+                f"({stats.rows_per_second:,.0f} rows/s)"
+            )
+
+        while True:
+            runner = RetentionRunner(
+                chunk_size=options["chunk_size"],
+                pause=options["pause"],
+                archive_dir=options["archive_dir"],
+                dry_run=options["dry_run"],
+                on_progress=progress,
+            )
+            stats = runner.run()
+            verb = "Would delete" if options["dry_run"] else "Deleted"
+            self.stdout.write(self.style.SUCCESS(
+                f"{verb} {stats.messages_deleted} messages and {stats.conversations_deleted} conversations "
+                f"for {stats.users} users in {stats.elapsed:.2f}s ({stats.rows_per_second:,.0f} rows/s, "
+                f"{stats.archived} archived)"
+            ))
+            if not options["loop"]:
+                break
+            time.sleep(options["loop"])
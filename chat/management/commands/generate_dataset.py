@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from authentication.models import User
+from chat.services.dataset_service import (
+    DATASET_PASSWORD, DEFAULT_BATCH_SIZE, USERNAME, DatasetResult, generate_dataset,
+)
+
+
+class Command(BaseCommand):
+    help = ("Generate a synthetic dataset with bulk inserts: users named <prefix>-<n> (password "
+            f"'{DATASET_PASSWORD}'), their conversations and alternating user/bot messages.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--conversations-per-user", type=int, default=5)
+        parser.add_argument("--messages", type=int, default=100000, help="Messages in total, spread evenly.")
+        parser.add_argument("--prefix", default="synth", help="Username prefix; must not be in use yet.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Rows per bulk_create/transaction.")
+
+    def handle(self, *args, **options):
+        if options["users"] < 1 or options["conversations_per_user"] < 1 or options["messages"] < 0:
+            raise CommandError("--users and --conversations-per-user must be positive and --messages not negative")
+        if User.objects.filter(username=USERNAME.format(prefix=options["prefix"], n=0)).exists():
+            raise CommandError(f"Users with prefix '{options['prefix']}' already exist; pick another --prefix")
+
+        def progress(result: DatasetResult):
+            self.stdout.write(
+                f"  {result.users} users, {result.conversations} conversations, {result.messages} messages "
+                f"({result.rows_per_second:,.0f} rows/s)"
+            )
+
+        result = generate_dataset(
+            options["users"], options["conversations_per_user"], options["messages"], prefix=options["prefix"],
+            seed=options["seed"], batch_size=options["batch_size"], on_progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {result.users} users, {result.conversations} conversations and {result.messages} messages "
+            f"in {result.elapsed:.2f}s ({result.rows_per_second:,.0f} rows/s)"
+        ))
@@ -0,0 +1,47 @@
+import gzip
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.services.import_service import DEFAULT_BATCH_SIZE, ImportResult, import_ndjson
+
+
+class Command(BaseCommand):
+    help = "Bulk import conversations/messages from an NDJSON file (same format as the NDJSON export)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="NDJSON file, optionally .gz; '-' reads stdin.")
+        parser.add_argument("--user", required=True, help="Username that will own the imported conversations.")
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Rows per bulk_create/transaction.")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            user = User.objects.get(username=options["user"])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['user']}' not found")
+
+        path = options["path"]
+        if path == "-":
+            stream = sys.stdin.buffer
+        elif path.endswith(".gz"):
+            stream = gzip.open(path, "rb")
+        else:
+            stream = open(path, "rb")
+
+        def progress(result: ImportResult):
+            self.stdout.write(
+                f"  {result.lines} lines, {result.conversations} conversations, {result.messages} messages "
+                f"({result.rows_per_second:,.0f} rows/s)"
+            )
+
+        with stream:
+            result = import_ndjson(user, stream, batch_size=options["batch_size"], on_progress=progress)
+
+        for error in result.errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.conversations} conversations and {result.messages} messages in {result.elapsed:.2f}s "
+            f"({result.rows_per_second:,.0f} rows/s, {result.skipped} rows skipped)"
+        ))
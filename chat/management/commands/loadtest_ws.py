@@ -0,0 +1,153 @@
+import asyncio
+import json
+import os
+import resource
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from graphql_jwt.shortcuts import get_token
+
+from chat.loadtest import DEFAULT_SCRIPT, LoadOptions, run_load
+from core.settings import AI_BOT_NAME
+
+USERNAME = "loadtest-{n}"
+
+
+def _free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = ("Open many authenticated sockets on ws/chat/, play scripted conversations at a target rate and "
+            "report handshake, first-token and full-reply latency percentiles and server memory per connection. "
+            "Without --url it starts its own server with the offline stub provider.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default=None, help="ws://host:port/ws/chat/ of a running server "
+                                                        "(its users must live in this project's database).")
+        parser.add_argument("--server-pid", type=int, default=None,
+                            help="With --url: pid of the server (its child processes are included) for memory.")
+        parser.add_argument("--connections", type=int, default=100, help="Concurrent sockets, one user each.")
+        parser.add_argument("--rate", type=float, default=0,
+                            help="Messages per second over all sockets (0: send when the previous reply is done).")
+        parser.add_argument("--think-time", type=float, default=0, help="Seconds between replies without --rate.")
+        parser.add_argument("--ramp", type=float, default=200, help="Sockets opened per second.")
+        parser.add_argument("--script", default=None,
+                            help="JSON file: a list of conversations, each a list of messages; socket i plays "
+                                 "conversation i modulo their count.")
+        parser.add_argument("--timeout", type=float, default=60, help="Seconds to wait for any one frame.")
+        parser.add_argument("--workers", type=int, default=1, help="Worker processes of the server started here.")
+        parser.add_argument("--stub-first-token-ms", type=float, default=300)
+        parser.add_argument("--stub-token-ms", type=float, default=20)
+        parser.add_argument("--stub-tokens", type=int, default=40)
+        parser.add_argument("--json", action="store_true", help="Print the report as one JSON object.")
+
+    def _tokens(self, count: int) -> list[str]:
+        """Tokens for ``count`` load-test users, creating the users that are missing (and the bot they talk to)."""
+        User = get_user_model()
+        User.objects.get_or_create(username=AI_BOT_NAME, defaults={"role": User.Role.BOT, "is_active": True})
+        names = [USERNAME.format(n=n) for n in range(count)]
+        existing = set(User.objects.filter(username__in=names).values_list("username", flat=True))
+        password = make_password(None)  # unusable; these users only authenticate with the tokens below
+        User.objects.bulk_create([User(username=name, password=password) for name in names if name not in existing],
+                                 batch_size=1000)
+        users = {user.username: user for user in User.objects.filter(username__in=names)}
+        return [get_token(users[name]) for name in names]
+
+    def _start_server(self, options) -> tuple[subprocess.Popen, str]:
+        port = _free_port()
+        env = dict(
+            os.environ,
+            CHAT_AI_PROVIDER="stub",
+            CHAT_STUB_FIRST_TOKEN_MS=str(options["stub_first_token_ms"]),
+            CHAT_STUB_TOKEN_MS=str(options["stub_token_ms"]),
+            CHAT_STUB_TOKENS=str(options["stub_tokens"]),
+            # The point is to load the server, not the limiter
+            CHAT_RATE_LIMIT_ADMIN="", CHAT_RATE_LIMIT_USER="", CHAT_RATE_LIMIT_IP="",
+        )
+        process = subprocess.Popen(
+            [sys.executable, str(settings.BASE_DIR / "manage.py"), "serve", "--host", "127.0.0.1", "--port", str(port),
+             "--workers", str(options["workers"]), "--drain-timeout", "5",
+             # Each load-test user has one socket, so nothing needs to cross workers
+             "--allow-per-process-state"],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f"The server exited with {process.returncode} while starting")
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        else:
+            process.kill()
+            raise CommandError("The server did not start listening within 30s")
+        time.sleep(1)  # let every worker finish importing the application before the baseline is taken
+        return process, f"ws://127.0.0.1:{port}/ws/chat/"
+
+    def handle(self, *args, **options):
+        # Each socket is a descriptor here and on the server
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        if options["connections"] + 100 > hard:
+            self.stderr.write(f"Open file limit is {hard}; raise it (ulimit -n) for {options['connections']} sockets")
+
+        script = DEFAULT_SCRIPT
+        if options["script"]:
+            with open(options["script"]) as f:
+                script = json.load(f)
+            if not script or not all(isinstance(c, list) and c for c in script):
+                raise CommandError("--script must hold a non-empty list of non-empty message lists")
+
+        tokens = self._tokens(options["connections"])
+        server, url, server_pid = None, options["url"], options["server_pid"]
+        if url is None:
+            server, url = self._start_server(options)
+            server_pid = server.pid
+        try:
+            report = asyncio.run(run_load(LoadOptions(
+                url=url, tokens=tokens, script=script, rate=options["rate"], think_time=options["think_time"],
+                ramp=options["ramp"], timeout=options["timeout"], server_pid=server_pid,
+            )))
+        finally:
+            if server is not None:
+                server.send_signal(signal.SIGTERM)
+                try:
+                    server.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    server.kill()
+        report["url"] = url
+        if options["json"]:
+            self.stdout.write(json.dumps(report))
+            return
+        self._print(report)
+
+    def _print(self, report: dict) -> None:
+        self.stdout.write(
+            f"{report['connected']}/{report['sockets']} sockets connected in {report['connect_seconds']:.1f}s; "
+            f"{report['replies']}/{report['messages']} replies in {report['seconds']:.1f}s "
+            f"({report['replies_per_second']:.1f}/s)"
+        )
+        self.stdout.write(f"  {'ms':<12}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+        for name, summary in report["latency_ms"].items():
+            self.stdout.write(f"  {name:<12}{summary['p50']:>10.1f}{summary['p95']:>10.1f}"
+                              f"{summary['p99']:>10.1f}{summary['max']:>10.1f}")
+        rss = report.get("server_rss")
+        if rss and rss["per_connection_bytes"] is not None:
+            self.stdout.write(f"  server RSS {rss['baseline_bytes'] / 2**20:.1f} MiB idle, "
+                              f"{rss['connected_bytes'] / 2**20:.1f} MiB connected: "
+                              f"{rss['per_connection_bytes'] / 1024:.1f} KiB per connection")
+        if report["errors"]:
+            self.stdout.write(self.style.WARNING(f"  errors: {report['errors']}"))
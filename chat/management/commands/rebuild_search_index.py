@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from chat.services.search_service import fts_available, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the FTS5 message search index from chat_message (run after VACUUM or bulk repairs)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=10_000, help="Rows inserted per transaction.")
+
+    def handle(self, *args, **options):
+        if not fts_available():
+            self.stdout.write(self.style.WARNING("Search index is only maintained on SQLite; nothing to do."))
+            return
+        started = time.perf_counter()
+        indexed = rebuild_index(batch_size=options["batch_size"])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} messages in {elapsed:.2f}s"))
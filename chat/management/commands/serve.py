@@ -0,0 +1,221 @@
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# A worker that dies sooner than this after starting is restarted with backoff
+MIN_HEALTHY_SECONDS = 5.0
+MAX_RESTART_DELAY = 30.0
+# Backends whose state lives in one process: workers using them do not see each other's sockets or entries
+PER_PROCESS_CHANNEL_LAYERS = ("channels.layers.InMemoryChannelLayer",)
+PER_PROCESS_CACHES = ("django.core.cache.backends.locmem.LocMemCache", "django.core.cache.backends.dummy.DummyCache")
+
+
+def listen_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    """A listening TCP socket with ``SO_REUSEPORT``, so a new ``serve`` can bind the port while this one drains."""
+    # IPv4 only: Daphne adopts inherited descriptors as AF_INET
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, "SO_REUSEPORT"):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def per_process_state() -> list[str]:
+    """Settings that break when requests of one user are spread over several workers."""
+    problems = []
+    layer = settings.CHANNEL_LAYERS.get("default", {}).get("BACKEND", "")
+    if layer in PER_PROCESS_CHANNEL_LAYERS:
+        problems.append(f"the channel layer is {layer}: a tab on one worker never receives messages sent on another "
+                        "(set CHAT_CHANNEL_LAYER=redis-pubsub)")
+    cache = settings.CACHES.get("default", {}).get("BACKEND", "")
+    if cache in PER_PROCESS_CACHES:
+        problems.append(f"the cache is {cache}: share snapshots, presence and revoked share links are not seen "
+                        "by the other workers (configure a shared CACHES backend such as Redis)")
+    return problems
+
+
+def run_worker(fd: int, options) -> int:
+    """Run Daphne on the inherited listening socket ``fd`` until SIGTERM, then drain and return."""
+    import asyncio
+
+    from daphne.server import Server
+    from django.utils.module_loading import import_string
+    from twisted.internet import reactor
+
+    from chat.connections import registry
+    from core.metrics import start_exporter
+
+    class DrainingServer(Server):
+        def listen_success(self, port):
+            self.ports.append(port)
+            super().listen_success(port)
+
+    proxy = options["proxy_headers"]
+    server = DrainingServer(
+        import_string(options["application"]),
+        endpoints=[f"fd:fileno={fd}"],  # Daphne adopts (and later closes) the descriptor
+        signal_handlers=False,
+        proxy_forwarded_address_header="X-Forwarded-For" if proxy else None,
+        proxy_forwarded_port_header="X-Forwarded-Port" if proxy else None,
+        proxy_forwarded_proto_header="X-Forwarded-Proto" if proxy else None,
+        # Sockets are closed by the drain; anything left after it is cancelled right away
+        application_close_timeout=5,
+    )
+    server.ports = []
+
+    async def drain():
+        deadline = time.monotonic() + options["drain_timeout"]
+        for port in server.ports:
+            port.stopListening()
+        print(f"[serve] worker {os.getpid()} stopped accepting; draining {len(registry)} sockets")
+        cut = await registry.drain(max(0.0, deadline - time.monotonic()))
+        # HTTP requests in progress, and WebSocket close handshakes just started
+        while (any("disconnected" not in details for details in server.connections.values())
+               and time.monotonic() < deadline + 2):
+            await asyncio.sleep(0.1)
+        print(f"[serve] worker {os.getpid()} drained ({cut} sockets cut off at the deadline)")
+        reactor.stop()
+
+    def start_drain():
+        if not registry.draining:
+            asyncio.ensure_future(drain())
+
+    # Lets whichever worker answers /metrics report the totals of all of them
+    start_exporter()
+    loop = reactor._asyncioEventloop
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, start_drain)
+    server.run()
+    return 0
+
+
+class Worker:
+    __slots__ = ("process", "started_at", "failures")
+
+    def __init__(self, process: subprocess.Popen, failures: int = 0):
+        self.process = process
+        self.started_at = time.monotonic()
+        self.failures = failures
+
+
+class Command(BaseCommand):
+    help = ("Serve the ASGI application with several worker processes sharing one listening socket. "
+            "Workers are restarted when they die. SIGTERM/SIGINT stop accepting connections, let replies in "
+            "progress and queued frames finish within --drain-timeout, and exit.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="0.0.0.0")
+        parser.add_argument("--port", type=int, default=8000)
+        parser.add_argument("--workers", type=int, default=1,
+                            help="Worker processes. More than one needs a shared channel layer and cache.")
+        parser.add_argument("--allow-per-process-state", action="store_true",
+                            help="Start several workers even with the in-memory channel layer or a local cache "
+                                 "(benchmarks where no user has sockets on two workers).")
+        parser.add_argument("--drain-timeout", type=float, default=30.0,
+                            help="Seconds a stopping worker waits for replies in progress before closing sockets.")
+        parser.add_argument("--application", default=settings.ASGI_APPLICATION, help="Dotted path of the ASGI app.")
+        parser.add_argument("--proxy-headers", action="store_true",
+                            help="Trust X-Forwarded-For/-Port/-Proto (behind a load balancer).")
+        # Internal: run one worker on an inherited listening socket
+        parser.add_argument("--worker-fd", type=int, default=None, help="(internal)")
+
+    def handle(self, *args, **options):
+        if options["worker_fd"] is not None:
+            sys.exit(run_worker(options["worker_fd"], options))
+        if options["workers"] < 1:
+            raise CommandError("--workers must be at least 1")
+        if options["workers"] > 1:
+            problems = per_process_state()
+            if problems and not options["allow_per_process_state"]:
+                raise CommandError(f"Refusing to start {options['workers']} workers: " + "; ".join(problems)
+                                   + ". Use --workers 1, or pass --allow-per-process-state to start anyway.")
+            for problem in problems:
+                self.stderr.write(f"[serve] WARNING: {problem}")
+            # Always per worker: cached history can lag a write made through another worker by up to the TTL
+            self.stderr.write(f"[serve] note: the history cache is per worker; entries from other workers' writes "
+                              f"can be up to CHAT_HISTORY_CACHE_TTL_SECONDS="
+                              f"{getattr(settings, 'CHAT_HISTORY_CACHE_TTL_SECONDS', 300):g}s stale")
+        try:
+            sock = listen_socket(options["host"], options["port"])
+        except OSError as e:
+            raise CommandError(f"Cannot listen on {options['host']}:{options['port']}: {e}")
+        self.stdout.write(f"[serve] pid {os.getpid()} listening on {options['host']}:{options['port']} "
+                          f"with {options['workers']} workers")
+        # Workers share a directory for their metrics snapshots unless one is configured
+        metrics_dir = None
+        if not os.environ.get("CHAT_METRICS_DIR"):
+            metrics_dir = os.environ["CHAT_METRICS_DIR"] = tempfile.mkdtemp(prefix="chat-metrics-")
+        try:
+            self._supervise(sock, options)
+        finally:
+            sock.close()
+            if metrics_dir is not None:
+                shutil.rmtree(metrics_dir, ignore_errors=True)
+
+    def _spawn(self, sock: socket.socket, options, failures: int = 0) -> Worker:
+        argv = [sys.executable, str(settings.BASE_DIR / "manage.py"), "serve", "--worker-fd", str(sock.fileno()),
+                "--drain-timeout", str(options["drain_timeout"]), "--application", options["application"]]
+        if options["proxy_headers"]:
+            argv.append("--proxy-headers")
+        process = subprocess.Popen(argv, pass_fds=[sock.fileno()], start_new_session=True)
+        self.stdout.write(f"[serve] started worker {process.pid}")
+        return Worker(process, failures)
+
+    def _supervise(self, sock: socket.socket, options) -> None:
+        stopping = []
+
+        def stop(signum, frame):
+            stopping.append(signum)
+
+        previous = {signum: signal.signal(signum, stop) for signum in (signal.SIGTERM, signal.SIGINT)}
+        workers = [self._spawn(sock, options) for _ in range(options["workers"])]
+        # (due time, failures) of workers waiting to be restarted
+        restarts: list[tuple[float, int]] = []
+        try:
+            while not stopping:
+                time.sleep(0.2)
+                for worker in [w for w in workers if w.process.poll() is not None]:
+                    workers.remove(worker)
+                    healthy = time.monotonic() - worker.started_at >= MIN_HEALTHY_SECONDS
+                    failures = 0 if healthy else worker.failures + 1
+                    delay = min(MAX_RESTART_DELAY, 0.5 * 2 ** failures) if failures else 0.0
+                    self.stderr.write(f"[serve] worker {worker.process.pid} exited with {worker.process.returncode}; "
+                                      f"restarting in {delay:.1f}s")
+                    restarts.append((time.monotonic() + delay, failures))
+                now = time.monotonic()
+                for due, failures in [r for r in restarts if r[0] <= now]:
+                    restarts.remove((due, failures))
+                    workers.append(self._spawn(sock, options, failures))
+        finally:
+            self._shutdown(sock, workers, options["drain_timeout"])
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+
+    def _shutdown(self, sock: socket.socket, workers: list[Worker], drain_timeout: float) -> None:
+        self.stdout.write(f"[serve] draining {len(workers)} workers (up to {drain_timeout:.0f}s)")
+        # Workers hold their own copies of the socket; stop the supervisor's from keeping the port bound
+        sock.close()
+        for worker in workers:
+            if worker.process.poll() is None:
+                worker.process.send_signal(signal.SIGTERM)
+        # The drain deadline, plus time for the worker to close sockets and let the reactor stop
+        deadline = time.monotonic() + drain_timeout + 10
+        for worker in workers:
+            try:
+                worker.process.wait(timeout=max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                self.stderr.write(f"[serve] worker {worker.process.pid} did not stop in time; killing it")
+                worker.process.kill()
+                worker.process.wait()
+        self.stdout.write("[serve] stopped")
@@ -0,0 +1,83 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.loadtest import latency_summary
+
+
+def load_traces(path: str) -> dict[str, list[dict]]:
+    """Spans of a ``CHAT_TRACING_EXPORTER=file`` trace file, grouped by trace id."""
+    traces: dict[str, list[dict]] = {}
+    with open(path) as f:
+        for line in f:
+            try:
+                span = json.loads(line)
+            except ValueError:
+                continue  # a line still being written
+            traces.setdefault(span["trace_id"], []).append(span)
+    return traces
+
+
+def trace_duration(spans: list[dict]) -> float:
+    """Milliseconds from the first span's start to the last span's end."""
+    start = min(span["start"] for span in spans)
+    return max((span["start"] - start) * 1000 + span["ms"] for span in spans)
+
+
+class Command(BaseCommand):
+    help = ("Summarize a trace file written with CHAT_TRACING_EXPORTER=file: latency percentiles per span name "
+            "(the per-stage breakdown) and the slowest traces as span trees.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", default=None, help="Trace file (default: CHAT_TRACING_FILE).")
+        parser.add_argument("--root", default=None, help="Only traces whose root span has this name (ws.receive).")
+        parser.add_argument("--slowest", type=int, default=3, help="Slowest traces to print as trees.")
+
+    def handle(self, *args, **options):
+        path = options["path"] or settings.CHAT_TRACING_FILE
+        try:
+            traces = load_traces(path)
+        except OSError as e:
+            raise CommandError(f"Cannot read {path}: {e}")
+        if options["root"]:
+            traces = {trace_id: spans for trace_id, spans in traces.items()
+                      if any(s["parent_id"] is None and s["name"] == options["root"] for s in spans)}
+        if not traces:
+            self.stdout.write("No traces")
+            return
+
+        by_name: dict[str, list[float]] = {}
+        for spans in traces.values():
+            for span in spans:
+                by_name.setdefault(span["name"], []).append(span["ms"])
+        self.stdout.write(f"{len(traces)} traces")
+        self.stdout.write(f"  {'span':<28}{'count':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+        for name, timings in sorted(by_name.items(), key=lambda item: -sum(item[1])):
+            summary = latency_summary(timings)
+            self.stdout.write(f"  {name:<28}{len(timings):>8}{summary['p50']:>10.1f}{summary['p95']:>10.1f}"
+                              f"{summary['p99']:>10.1f}{summary['max']:>10.1f}")
+
+        slowest = sorted(traces.items(), key=lambda item: -trace_duration(item[1]))[:options["slowest"]]
+        for trace_id, spans in slowest:
+            self.stdout.write(f"\ntrace {trace_id} ({trace_duration(spans):.1f} ms)")
+            self._print_tree(spans)
+
+    def _print_tree(self, spans: list[dict]) -> None:
+        start = min(span["start"] for span in spans)
+        ids = {span["span_id"] for span in spans}
+        children: dict[str | None, list[dict]] = {}
+        for span in spans:
+            # Spans whose parent was not sampled into this file are shown as roots
+            parent = span["parent_id"] if span["parent_id"] in ids else None
+            children.setdefault(parent, []).append(span)
+
+        def walk(parent, depth):
+            for span in sorted(children.get(parent, []), key=lambda s: s["start"]):
+                attributes = " ".join(f"{k}={v}" for k, v in span["attributes"].items())
+                offset = (span["start"] - start) * 1000
+                self.stdout.write(f"  {'  ' * depth}{span['name']:<{max(1, 30 - 2 * depth)}} +{offset:8.1f} ms "
+                                  f"{span['ms']:8.1f} ms {span['status']} {attributes}".rstrip())
+                walk(span["span_id"], depth + 1)
+
+        walk(None, 0)
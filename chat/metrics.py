@@ -0,0 +1,135 @@
+"""Metrics of the chat hot paths, served at ``/metrics`` (see ``core/metrics.py``).
+
+Provider calls, channel-layer sends and cache lookups update their metrics
+where they happen; socket counts and queue depths are sampled by a collector
+when the metrics are read, so the hot paths pay nothing for them.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from django.conf import settings
+
+from core.metrics import Counter, Gauge, Histogram, register_collector
+from core.tracing import annotate, trace_span
+
+# Channel-layer sends and cache-sized latencies are much shorter than provider calls
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+AI_REQUEST_SECONDS = Histogram(
+    "chat_ai_request_seconds", "Provider call duration, to the last chunk when streaming.", ("model", "mode"))
+AI_REQUESTS = Counter(
+    "chat_ai_requests_total", "Provider calls by outcome (ok, error, cancelled).", ("model", "mode", "outcome"))
+AI_ERRORS = Counter("chat_ai_errors_total", "Failed provider calls by exception type.", ("model", "error"))
+AI_FIRST_TOKEN_SECONDS = Histogram(
+    "chat_ai_first_token_seconds", "Time from the provider call to the first streamed chunk.", ("model",))
+AI_CHUNKS = Counter("chat_ai_stream_chunks_total", "Chunks received from the provider.", ("model",))
+AI_GENERATIONS = Gauge("chat_ai_generations_in_flight", "Replies being generated for open sockets.")
+
+WS_CONNECTIONS = Gauge(
+    "chat_ws_connections", "Open sockets (state=open) and, as of the last reaper pass, how many are "
+    "authenticated, active, idle and awaiting a pong.", ("state",))
+WS_REAPED = Counter("chat_ws_reaped_total", "Sockets closed by the connection reaper.", ("reason",))
+WS_OUTBOUND_FRAMES = Gauge("chat_ws_outbound_queued_frames", "Frames queued for slow clients, over all sockets.")
+WS_OUTBOUND_BYTES = Gauge("chat_ws_outbound_queued_bytes", "Bytes queued for slow clients, over all sockets.")
+
+CHANNEL_SEND_SECONDS = Histogram(
+    "chat_channel_layer_send_seconds", "Channel-layer send and group_send latency by event type.", ("op", "type"),
+    buckets=FAST_BUCKETS)
+CHANNEL_QUEUED = Gauge(
+    "chat_channel_layer_queued_messages", "Messages waiting in the in-memory channel layer (not reported for Redis).")
+
+CACHE_REQUESTS = Counter("chat_cache_requests_total", "Cache lookups by cache and result (hit, miss).",
+                         ("cache", "result"))
+
+
+def model_label() -> str:
+    if getattr(settings, "CHAT_AI_PROVIDER", "zai") == "stub":
+        return "stub"
+    return getattr(settings, "Z_AI_MODEL", "")
+
+
+class AIRequest:
+    """One provider call being measured; see ``ai_request``."""
+    __slots__ = ("model", "mode", "started", "first_token", "outcome")
+
+    def __init__(self, mode: str):
+        self.model = model_label()
+        self.mode = mode
+        self.started = time.perf_counter()
+        self.first_token: float | None = None
+        self.outcome = "ok"
+
+    def chunk(self) -> None:
+        """Record a streamed chunk; the first one also records the time to first token."""
+        if self.first_token is None:
+            self.first_token = time.perf_counter() - self.started
+            AI_FIRST_TOKEN_SECONDS.observe(self.first_token, model=self.model)
+        AI_CHUNKS.inc(model=self.model)
+
+    def fail(self, error: BaseException) -> None:
+        """Record an error the caller handles itself (one that escapes the block is recorded anyway)."""
+        self.outcome = "error"
+        AI_ERRORS.inc(model=self.model, error=type(error).__name__)
+
+
+@contextmanager
+def ai_request(mode: str) -> Iterator[AIRequest]:
+    """Measure the provider call made inside the block: duration, outcome and errors."""
+    request = AIRequest(mode)
+    try:
+        yield request
+    except asyncio.CancelledError:
+        request.outcome = "cancelled"
+        raise
+    except Exception as e:
+        request.fail(e)
+        raise
+    finally:
+        annotate(model=request.model, outcome=request.outcome)
+        if request.first_token is not None:
+            annotate(first_token_ms=round(request.first_token * 1000, 3))
+        AI_REQUEST_SECONDS.observe(time.perf_counter() - request.started, model=request.model, mode=mode)
+        AI_REQUESTS.inc(model=request.model, mode=mode, outcome=request.outcome)
+
+
+def cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+async def timed_group_send(layer, group: str, message: dict) -> None:
+    """``layer.group_send``, timed and traced."""
+    kind = message.get("type", "")
+    with trace_span("channel_layer.group_send", group=group, type=kind), \
+            CHANNEL_SEND_SECONDS.time(op="group_send", type=kind):
+        await layer.group_send(group, message)
+
+
+async def timed_send(layer, channel: str, message: dict) -> None:
+    """``layer.send``, timed and traced."""
+    kind = message.get("type", "")
+    with trace_span("channel_layer.send", type=kind), CHANNEL_SEND_SECONDS.time(op="send", type=kind):
+        await layer.send(channel, message)
+
+
+@register_collector
+def sample_connections() -> None:
+    from channels.layers import InMemoryChannelLayer, get_channel_layer
+
+    from chat.connections import registry
+
+    consumers = [connection.consumer for connection in list(registry._connections.values())]
+    gauges = registry.gauges()
+    WS_CONNECTIONS.set(len(consumers), state="open")
+    for state in ("authenticated", "active", "idle", "awaiting_pong"):
+        WS_CONNECTIONS.set(gauges[state], state=state)
+    queues = [consumer.outbound for consumer in consumers if getattr(consumer, "outbound", None) is not None]
+    WS_OUTBOUND_FRAMES.set(sum(len(queue) for queue in queues))
+    WS_OUTBOUND_BYTES.set(sum(queue.queued_bytes for queue in queues))
+    AI_GENERATIONS.set(sum(len(getattr(consumer, "_generations", ())) for consumer in consumers))
+    layer = get_channel_layer()
+    if isinstance(layer, InMemoryChannelLayer):
+        CHANNEL_QUEUED.set(sum(queue.qsize() for queue in list(layer.channels.values())))
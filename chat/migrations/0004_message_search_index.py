@@ -0,0 +1,100 @@
+"""Create the SQLite FTS5 index backing message search.
+
+The virtual table ``chat_message_fts`` mirrors ``chat_message`` row for row
+(the FTS rowid is the message rowid) and is kept in sync by triggers, so any
+write path - ORM saves, ``bulk_create``, raw SQL deletes - updates the index.
+
+Columns:
+  - content: the searchable message body
+  - owner: ``u<user_id>`` of the conversation owner; searches are scoped with
+    an ``owner:`` filter so FTS5 intersects doclists instead of post-filtering
+  - message_id / conversation_id: unindexed payload used to join back
+
+``VACUUM`` may renumber rowids of tables without an INTEGER PRIMARY KEY, so run
+``manage.py rebuild_search_index`` after vacuuming.
+
+Only applied on SQLite; other backends fall back to ``icontains`` in
+``chat.services.search_service``.
+"""
+
+from django.db import migrations
+
+
+FTS_TABLE_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS chat_message_fts USING fts5(
+    content,
+    owner,
+    message_id UNINDEXED,
+    conversation_id UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+"""
+
+FTS_INSERT_SELECT = """
+    INSERT INTO chat_message_fts(rowid, content, owner, message_id, conversation_id)
+    SELECT {row}.rowid, {row}.content, 'u' || c.user_id, {row}.id, {row}.conversation_id
+    FROM chat_conversation c WHERE c.id = {row}.conversation_id
+"""
+
+FTS_BACKFILL_SQL = """
+    INSERT INTO chat_message_fts(rowid, content, owner, message_id, conversation_id)
+    SELECT m.rowid, m.content, 'u' || c.user_id, m.id, m.conversation_id
+    FROM chat_message m JOIN chat_conversation c ON c.id = m.conversation_id
+"""
+
+FTS_TRIGGERS_SQL = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS chat_message_fts_ai AFTER INSERT ON chat_message BEGIN
+        {FTS_INSERT_SELECT.format(row='new')};
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS chat_message_fts_ad AFTER DELETE ON chat_message BEGIN
+        DELETE FROM chat_message_fts WHERE rowid = old.rowid;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS chat_message_fts_au AFTER UPDATE OF content, conversation_id ON chat_message BEGIN
+        DELETE FROM chat_message_fts WHERE rowid = old.rowid;
+        {FTS_INSERT_SELECT.format(row='new')};
+    END
+    """,
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS chat_message_fts_ai",
+    "DROP TRIGGER IF EXISTS chat_message_fts_ad",
+    "DROP TRIGGER IF EXISTS chat_message_fts_au",
+    "DROP TABLE IF EXISTS chat_message_fts",
+]
+
+
+def forwards(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(FTS_TABLE_SQL)
+        for sql in FTS_TRIGGERS_SQL:
+            cursor.execute(sql)
+        # Backfill existing rows
+        cursor.execute("DELETE FROM chat_message_fts")
+        cursor.execute(FTS_BACKFILL_SQL)
+
+
+def backwards(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for sql in DROP_SQL:
+            cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_alter_message_sender'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_message_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageEmbedding',
+            fields=[
+                ('message', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='embedding', serialize=False, to='chat.message')),
+                ('embedder', models.CharField(max_length=64)),
+                ('dim', models.PositiveSmallIntegerField()),
+                ('vector', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='message_embeddings', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Message Embedding',
+                'verbose_name_plural': 'Message Embeddings',
+                'indexes': [models.Index(fields=['user', 'embedder'], name='chat_messag_user_id_bc1743_idx')],
+            },
+        ),
+    ]
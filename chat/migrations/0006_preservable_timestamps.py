@@ -0,0 +1,38 @@
+"""Switch auto timestamps to PreservableDateTimeField so bulk imports can keep original times.
+
+The column type is unchanged, so this is a state-only change: a real
+AlterField would rebuild ``chat_message`` on SQLite, dropping the FTS triggers
+from 0004 and renumbering rowids.
+"""
+
+import chat.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_message_embedding'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='conversation',
+                    name='created_at',
+                    field=chat.fields.PreservableDateTimeField(auto_now_add=True),
+                ),
+                migrations.AlterField(
+                    model_name='conversation',
+                    name='updated_at',
+                    field=chat.fields.PreservableDateTimeField(auto_now=True),
+                ),
+                migrations.AlterField(
+                    model_name='message',
+                    name='timestamp',
+                    field=chat.fields.PreservableDateTimeField(auto_now_add=True),
+                ),
+            ],
+        ),
+    ]
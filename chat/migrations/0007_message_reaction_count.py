@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_preservable_timestamps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageReactionCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reaction', models.CharField(choices=[('LIKE', '👍'), ('DISLIKE', '👎'), ('LOVE', '❤️'), ('HELPFUL', '✅'), ('NOT_HELPFUL', '❌')], max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('message', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reaction_counts', to='chat.message')),
+            ],
+            options={
+                'verbose_name': 'Message Reaction Count',
+                'verbose_name_plural': 'Message Reaction Counts',
+                'unique_together': {('message', 'reaction')},
+            },
+        ),
+    ]
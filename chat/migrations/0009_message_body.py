@@ -0,0 +1,47 @@
+"""Add content-addressed MessageBody storage for large message bodies.
+
+``Message.content`` becoming a CompactTextField is a state-only change (same
+column type); a real AlterField would rebuild ``chat_message`` on SQLite and
+drop the FTS triggers from 0004.
+"""
+
+import chat.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0008_retention_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageBody',
+            fields=[
+                ('hash', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('data', models.BinaryField()),
+                ('size', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Message Body',
+                'verbose_name_plural': 'Message Bodies',
+            },
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='message',
+                    name='content',
+                    field=chat.fields.CompactTextField(),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='body',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='messages', to='chat.messagebody'),
+        ),
+    ]
@@ -1,5 +1,8 @@
-from django.db import models
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
 from authentication.models import User
+from chat.compression import compress_text, content_hash, inflate
+from chat.fields import CompactTextField, PreservableDateTimeField
 import uuid
 
 class Conversation(models.Model):
@@ -7,12 +10,13 @@ class Conversation(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversations')
     title = models.CharField(max_length=255, blank=True, null=True)
-    created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    created_at = PreservableDateTimeField(auto_now_add=True)
+    updated_at = PreservableDateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
     
     class Meta:
         ordering = ['-updated_at']
+        indexes = [models.Index(fields=['user', 'created_at'], name='chat_conv_user_created_idx')]
         verbose_name = 'Conversation'
         verbose_name_plural = 'Conversations'
     
@@ -32,6 +36,42 @@ class Conversation(models.Model):
         return self.title or f"Conversation {self.created_at.strftime('%Y-%m-%d')}"
 
 
+class MessageBody(models.Model):
+    """Compressed, content-addressed storage for large message bodies (shared by identical messages)"""
+    hash = models.CharField(max_length=64, primary_key=True)  # sha256 of the UTF-8 text
+    data = models.BinaryField()  # zlib-compressed text
+    size = models.PositiveIntegerField()  # uncompressed size in bytes
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Message Body'
+        verbose_name_plural = 'Message Bodies'
+
+    def __str__(self):
+        return f"Body {self.hash[:12]} ({self.size} bytes)"
+
+    @property
+    def text(self) -> str:
+        return inflate(self.hash, self.data)
+
+    @classmethod
+    def store(cls, text: str) -> "MessageBody | None":
+        """Return the (possibly pre-existing) body for ``text``; ``None`` if compression doesn't pay off."""
+        digest = content_hash(text)
+        existing = cls.objects.filter(pk=digest).first()
+        if existing:
+            return existing
+        raw_size = len(text.encode('utf-8'))
+        data = compress_text(text)
+        if len(data) >= raw_size:
+            return None
+        try:
+            with transaction.atomic():
+                return cls.objects.create(hash=digest, data=data, size=raw_size)
+        except IntegrityError:  # stored concurrently
+            return cls.objects.get(pk=digest)
+
+
 class Message(models.Model):
     """Model to represent individual messages in a conversation"""
     
@@ -52,20 +92,48 @@ class Message(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='messages')
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='messages')
-    content = models.TextField()
+    content = CompactTextField(blob_field='body')  # '' in the column when stored in `body`
+    body = models.ForeignKey(MessageBody, null=True, blank=True, on_delete=models.PROTECT, related_name='messages')
     message_type = models.CharField(max_length=10, choices=MESSAGE_TYPE_CHOICES, default='TEXT')
     metadata = models.JSONField(default=dict, blank=True)  # For storing additional data
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = PreservableDateTimeField(auto_now_add=True)
     is_edited = models.BooleanField(default=False)
     edited_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [models.Index(fields=['conversation', 'timestamp'], name='chat_msg_conv_ts_idx')]
         verbose_name = 'Message'
         verbose_name_plural = 'Messages'
     
     def __str__(self):
         return f"{self.sender}: {self.content[:50]}..."
+
+    def pack_body(self) -> bool:
+        """Move large content into a compressed ``MessageBody``; returns True if the row is compacted."""
+        raw = self.__dict__.get('content')
+        if raw is None:  # deferred, leave as is
+            return self.body_id is not None
+        if not raw:
+            return self.body_id is not None
+        threshold = getattr(settings, 'MESSAGE_COMPRESSION_THRESHOLD', 1024)
+        if threshold and len(raw) >= threshold:
+            body = MessageBody.store(raw)
+            if body is not None:
+                self.body = body
+                self.__dict__['content'] = ''
+                self.__dict__['_compact_cache'] = (body.pk, raw)
+                return True
+        self.body = None
+        return False
+
+    def save(self, *args, **kwargs):
+        packed = self.pack_body()
+        super().save(*args, **kwargs)
+        if packed and 'content' in self.__dict__:
+            # The FTS trigger indexed the empty column; index the real text
+            from chat.services.search_service import index_plaintext
+            index_plaintext([(self.id, self.content)])
     
 
 class MessageReaction(models.Model):
@@ -93,6 +161,21 @@ class MessageReaction(models.Model):
         return f"{self.user.username} - {self.get_reaction_display()} on {self.message.id}"
 
 
+class MessageReactionCount(models.Model):
+    """Materialized per-message reaction totals, maintained with atomic increments"""
+    message = models.ForeignKey(Message, on_delete=models.CASCADE, related_name='reaction_counts')
+    reaction = models.CharField(max_length=20, choices=MessageReaction.REACTION_CHOICES)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['message', 'reaction']
+        verbose_name = 'Message Reaction Count'
+        verbose_name_plural = 'Message Reaction Counts'
+
+    def __str__(self):
+        return f"{self.reaction} x{self.count} on {self.message_id}"
+
+
 class ConversationShare(models.Model):
     """Model for sharing conversations publicly"""
     conversation = models.OneToOneField(Conversation, on_delete=models.CASCADE, related_name='share')
@@ -139,4 +222,21 @@ class ChatSettings(models.Model):
         verbose_name_plural = 'Chat Settings'
     
     def __str__(self):
-        return f"{self.user.username}'s Chat Settings"
\ No newline at end of file
+        return f"{self.user.username}'s Chat Settings"
+
+class MessageEmbedding(models.Model):
+    """Embedding vector for a message, used by the semantic memory index"""
+    message = models.OneToOneField(Message, on_delete=models.CASCADE, primary_key=True, related_name='embedding')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='message_embeddings')
+    embedder = models.CharField(max_length=64)
+    dim = models.PositiveSmallIntegerField()
+    vector = models.BinaryField()  # float32 bytes, L2-normalised
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'embedder'])]
+        verbose_name = 'Message Embedding'
+        verbose_name_plural = 'Message Embeddings'
+
+    def __str__(self):
+        return f"Embedding({self.embedder}) for {self.message_id}"
@@ -0,0 +1,177 @@
+"""Bounded per-connection send queue for WebSocket consumers.
+
+Group handlers enqueue frames and return at once; a single writer task per
+connection drains the queue into ``send``. This keeps a slow client from
+stalling the consumer's event loop (and from piling events up in the channel
+layer), and keeps its memory bounded:
+
+- Adjacent ``delta`` frames for the same reply are merged into one frame.
+- Above ``high_water`` queued bytes the connection is downgraded: streamed
+  deltas are no longer sent (the final ``message`` frame still carries the
+  full text) and queued deltas are discarded.
+- Frames are encoded when queued (``encode``, JSON text by default) so
+  their size is known; ``send`` may return the bytes it actually wrote (e.g.
+  after compression) for ``stats.bytes_sent``.
+- If the queue stays above ``high_water`` for ``stall_seconds``, or ever
+  exceeds ``max_bytes``, the queue is closed and ``on_overflow`` is called so
+  the consumer can drop the connection.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from .jsoncodec import dumps
+
+DELTA = "delta"
+_DELTA_OVERHEAD = 64  # rough JSON envelope size of a delta frame
+
+
+@dataclass(slots=True)
+class OutboundStats:
+    frames_sent: int = 0
+    bytes_sent: int = 0
+    deltas_coalesced: int = 0
+    deltas_dropped: int = 0
+    peak_bytes: int = 0
+
+
+class OutboundQueue:
+    def __init__(self, send: Callable[[str | bytes], Awaitable[int | None]], *, max_bytes: int = 1 << 20,
+                 high_water: int = 256 << 10, stall_seconds: float = 10.0,
+                 on_overflow: Callable[[str], None] | None = None,
+                 encode: Callable[[dict], str | bytes] = dumps):
+        self._send = send
+        self._encode = encode
+        self.max_bytes = max_bytes
+        self.high_water = high_water
+        self.stall_seconds = stall_seconds
+        self.on_overflow = on_overflow
+        self.stats = OutboundStats()
+        self.downgraded = False
+        self.closed = False
+        # Entries are [frame, size]; frame is the encoded payload, or a dict for a delta still open to merging
+        self._frames: deque[list] = deque()
+        self._bytes = 0
+        self._over_since: float | None = None
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._writer: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    @property
+    def queued_bytes(self) -> int:
+        return self._bytes
+
+    def start(self) -> None:
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the writer; frames still queued are discarded."""
+        self.closed = True
+        self._frames.clear()
+        self._bytes = 0
+        self._idle.set()
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+        self._writer = None
+
+    async def flush(self) -> None:
+        """Wait until every queued frame has been written."""
+        if self._writer is not None and not self.closed:
+            await self._idle.wait()
+
+    def put(self, frame: dict | str | bytes) -> bool:
+        """Queue ``frame`` (a dict, or a payload already encoded) without waiting; returns False if it was dropped."""
+        if self.closed:
+            return False
+        if isinstance(frame, (str, bytes)):
+            size = len(frame)
+            self._frames.append([frame, size])
+        elif frame.get("type") == DELTA:
+            if self.downgraded:
+                self.stats.deltas_dropped += 1
+                return False
+            tail = self._frames[-1] if self._frames else None
+            if tail is not None and isinstance(tail[0], dict) and tail[0].get("id") == frame.get("id"):
+                tail[0]["delta"] += frame.get("delta", "")
+                size = len(frame.get("delta", ""))
+                tail[1] += size
+                self.stats.deltas_coalesced += 1
+            else:
+                frame = dict(frame)
+                frame.setdefault("delta", "")
+                size = len(frame["delta"]) + _DELTA_OVERHEAD
+                self._frames.append([frame, size])
+        else:
+            payload = self._encode(frame)
+            size = len(payload)
+            self._frames.append([payload, size])
+        self._bytes += size
+        self._idle.clear()
+        self.stats.peak_bytes = max(self.stats.peak_bytes, self._bytes)
+        self._check_pressure()
+        self._wakeup.set()
+        return not self.closed
+
+    def _check_pressure(self) -> None:
+        if self._bytes <= self.high_water:
+            self._over_since = None
+            return
+        now = time.monotonic()
+        if self._over_since is None:
+            self._over_since = now
+        if not self.downgraded:
+            self._downgrade()
+        if self._bytes > self.max_bytes:
+            self._overflow("queue limit exceeded")
+        elif now - self._over_since >= self.stall_seconds:
+            self._overflow("client too slow")
+
+    def _downgrade(self) -> None:
+        self.downgraded = True
+        kept = deque()
+        for entry in self._frames:
+            if isinstance(entry[0], dict):
+                self._bytes -= entry[1]
+                self.stats.deltas_dropped += 1
+            else:
+                kept.append(entry)
+        self._frames = kept
+        notice = self._encode({"type": "notice", "code": "STREAM_DOWNGRADED"})
+        self._frames.append([notice, len(notice)])
+        self._bytes += len(notice)
+
+    def _overflow(self, reason: str) -> None:
+        self.closed = True
+        self._frames.clear()
+        self._bytes = 0
+        self._idle.set()
+        if self.on_overflow:
+            self.on_overflow(reason)
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._frames:
+                frame, size = self._frames.popleft()
+                self._bytes -= size
+                payload = self._encode(frame) if isinstance(frame, dict) else frame
+                sent = await self._send(payload)
+                self.stats.frames_sent += 1
+                self.stats.bytes_sent += len(payload) if sent is None else sent
+            self._idle.set()
+            if self._bytes <= self.high_water:
+                self._over_since = None
@@ -0,0 +1,173 @@
+"""Typing indicators and socket presence, throttled so chatty clients stay cheap.
+
+Clients may send ``typing`` and ``presence`` frames as often as they like
+(every keystroke, every focus change). Each socket runs them through a
+``Throttle``: at most one broadcast per key per interval, plus one trailing
+broadcast at the end of the window if the latest state differs from what was
+last sent. Typing frames carry ``expires_in``; while the user keeps typing the
+indicator is re-sent once per interval, and receivers drop it if it is not
+refreshed.
+
+Presence (``active``/``idle`` per socket) is stored in the Django cache under
+one key per socket, with ``CHAT_PRESENCE_TTL_SECONDS`` expiry refreshed while
+the socket sends anything (heartbeats included), so sockets of a crashed
+worker age out. A per-user index lists the socket ids; it is only rewritten
+when a socket joins or leaves, under a lock taken with ``cache.add``, so
+sockets never overwrite each other's entries. Only changes are broadcast.
+
+The default LocMem cache is per process: with several workers, use a shared
+cache (e.g. Redis) so a worker can answer "which of my sockets are online"
+for sockets held by the others.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Hashable, Iterator
+
+from django.conf import settings
+from django.core.cache import cache
+
+PRESENCE_KEY = "chat:presence:{user_id}"  # the user's socket ids
+PRESENCE_SOCKET_KEY = "chat:presence:{user_id}:{socket_id}"  # one socket's state
+PRESENCE_LOCK_KEY = "chat:presence-lock:{user_id}"
+LOCK_TIMEOUT_SECONDS = 5  # a holder that died releases the lock after this
+LOCK_WAIT_SECONDS = 1.0
+PRESENCE_STATES = ("active", "idle")
+_NOTHING = object()
+
+
+class _KeyState:
+    __slots__ = ("sent_at", "value", "pending", "timer")
+
+    def __init__(self):
+        self.sent_at = float("-inf")
+        self.value = _NOTHING
+        self.pending = _NOTHING
+        self.timer: asyncio.Task | None = None
+
+
+class Throttle:
+    """Leading-edge throttle with a coalesced trailing send, per key.
+
+    ``submit(key, value)`` sends at once if nothing was sent for ``key`` in the
+    last ``interval`` seconds. Otherwise only the latest value is kept and sent
+    when the window closes, unless it equals the last value sent. With
+    ``refresh=False`` an unchanged value is never re-sent.
+    """
+
+    def __init__(self, interval: float, send: Callable[[Hashable, object], Awaitable[None]]):
+        self.interval = interval
+        self._send = send
+        self._keys: dict[Hashable, _KeyState] = {}
+        self._inflight: set[asyncio.Task] = set()
+        self.sent = 0
+        self.suppressed = 0
+
+    def submit(self, key: Hashable, value, refresh: bool = True) -> None:
+        state = self._keys.get(key)
+        if state is None:
+            state = self._keys[key] = _KeyState()
+        now = time.monotonic()
+        unchanged = value == state.value
+        if state.timer is None and now - state.sent_at >= self.interval and not (unchanged and not refresh):
+            self._fire(key, state, value, now)
+            return
+        self.suppressed += 1
+        if unchanged and state.timer is None:
+            return
+        state.pending = value
+        if state.timer is None:
+            state.timer = asyncio.create_task(self._trailing(key, state, state.sent_at + self.interval - now))
+
+    def _fire(self, key, state: _KeyState, value, now: float) -> None:
+        state.sent_at, state.value = now, value
+        self.sent += 1
+        task = asyncio.create_task(self._send(key, value))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _trailing(self, key, state: _KeyState, delay: float) -> None:
+        await asyncio.sleep(max(delay, 0))
+        state.timer = None
+        value, state.pending = state.pending, _NOTHING
+        if value is not _NOTHING and value != state.value:
+            self._fire(key, state, value, time.monotonic())
+
+    def last(self, key: Hashable, default=None):
+        """The value last sent for ``key``."""
+        state = self._keys.get(key)
+        return default if state is None or state.value is _NOTHING else state.value
+
+    def forget(self, key: Hashable) -> None:
+        """Drop ``key`` without sending what is pending (e.g. it is sent directly instead)."""
+        state = self._keys.pop(key, None)
+        if state is not None and state.timer is not None:
+            state.timer.cancel()
+
+    async def close(self) -> None:
+        """Drop everything pending and wait for sends already started."""
+        for key in list(self._keys):
+            self.forget(key)
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+
+def _socket_key(user_id: int, socket_id: str) -> str:
+    return PRESENCE_SOCKET_KEY.format(user_id=user_id, socket_id=socket_id)
+
+
+@contextmanager
+def _index_lock(user_id: int) -> Iterator[None]:
+    """Serialize rewrites of the user's socket index across threads and workers (best effort after a wait)."""
+    key = PRESENCE_LOCK_KEY.format(user_id=user_id)
+    deadline = time.monotonic() + LOCK_WAIT_SECONDS
+    acquired = cache.add(key, 1, LOCK_TIMEOUT_SECONDS)
+    while not acquired and time.monotonic() < deadline:
+        time.sleep(0.01)
+        acquired = cache.add(key, 1, LOCK_TIMEOUT_SECONDS)
+    try:
+        yield
+    finally:
+        if acquired:
+            cache.delete(key)
+
+
+def _update_index(user_id: int, timeout: float, add: str | None = None, discard: str | None = None) -> None:
+    key = PRESENCE_KEY.format(user_id=user_id)
+    with _index_lock(user_id):
+        socket_ids = set(cache.get(key) or ())
+        if add is not None:
+            socket_ids.add(add)
+        socket_ids.discard(discard)
+        # Sockets of a worker that died without saying goodbye have expired by now
+        fresh = cache.get_many([_socket_key(user_id, sid) for sid in socket_ids])
+        socket_ids = {sid for sid in socket_ids if _socket_key(user_id, sid) in fresh}
+        if socket_ids:
+            cache.set(key, socket_ids, timeout)
+        else:
+            cache.delete(key)
+
+
+def set_presence(user_id: int, socket_id: str, state: str | None, ttl: float) -> bool:
+    """Record ``state`` for one socket for ``ttl`` seconds (``None`` removes it); returns True if it changed."""
+    key = _socket_key(user_id, socket_id)
+    previous = cache.get(key)
+    # The index outlives the entries it lists; refreshing any socket keeps it alive
+    index_timeout = 2 * max(ttl, getattr(settings, "CHAT_PRESENCE_TTL_SECONDS", 90.0))
+    if state is None or ttl <= 0:
+        cache.delete(key)
+        if previous is not None:
+            _update_index(user_id, index_timeout, discard=socket_id)
+        return previous != state
+    cache.set(key, state, ttl)
+    if previous is None or not cache.touch(PRESENCE_KEY.format(user_id=user_id), index_timeout):
+        _update_index(user_id, index_timeout, add=socket_id)
+    return previous != state
+
+
+def get_presence(user_id: int) -> dict[str, str]:
+    """``{socket_id: state}`` for the user's sockets that are still fresh."""
+    keys = {_socket_key(user_id, sid): sid for sid in cache.get(PRESENCE_KEY.format(user_id=user_id)) or ()}
+    return {keys[key]: state for key, state in cache.get_many(list(keys)).items()}
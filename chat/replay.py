@@ -0,0 +1,130 @@
+"""Short per-user buffer of recent WebSocket events for resuming sessions.
+
+Every event fanned out to a user's sockets (messages, stream deltas, reaction
+updates, new conversations) is recorded here with a cursor. A reconnecting
+client sends the last cursor it saw as ``last_seen`` and gets only the events
+after it, instead of the full history.
+
+Cursors look like ``<epoch>:<seq>``. ``seq`` comes from one process-wide
+counter and ``epoch`` is random per process, so a cursor from another worker
+or from before a restart is never mistaken for a local one. Each user's
+buffer keeps at most ``CHAT_REPLAY_MAX_EVENTS`` events for
+``CHAT_REPLAY_TTL_SECONDS``; ``since()`` returns ``None`` whenever events
+after the cursor may have been dropped, and the caller falls back to history.
+"""
+from __future__ import annotations
+
+import itertools
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+from django.conf import settings
+
+
+EPOCH = uuid.uuid4().hex[:8]
+
+
+class _UserEvents:
+    __slots__ = ("events", "floor")
+
+    def __init__(self, floor: int):
+        self.events: deque[list] = deque()  # [seq, monotonic time, frame]
+        # Events of this user with seq <= floor are no longer (or never were) buffered
+        self.floor = floor
+
+
+class ReplayBuffer:
+    def __init__(self, max_events: int = 500, ttl: float = 300.0, max_users: int = 10_000):
+        self.max_events = max_events
+        self.ttl = ttl
+        self.max_users = max_users
+        self._seq = itertools.count(1)
+        self._last_seq = 0
+        self._evicted_at = 0  # seq at the most recent LRU eviction of a user's buffer
+        self._users: "OrderedDict[int, _UserEvents]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def format_cursor(seq: int) -> str:
+        return f"{EPOCH}:{seq}"
+
+    @staticmethod
+    def parse_cursor(cursor) -> int | None:
+        epoch, _, seq = str(cursor or "").partition(":")
+        if epoch != EPOCH or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def _state(self, user_id: int) -> _UserEvents:
+        state = self._users.get(user_id)
+        if state is None:
+            state = self._users[user_id] = _UserEvents(self._evicted_at)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+                self._evicted_at = self._last_seq
+        else:
+            self._users.move_to_end(user_id)
+        return state
+
+    def _trim(self, state: _UserEvents, now: float) -> None:
+        events = state.events
+        while events and (len(events) > self.max_events or now - events[0][1] > self.ttl):
+            state.floor = events.popleft()[0]
+
+    def record(self, user_id: int, frame: dict) -> str:
+        """Buffer ``frame`` for ``user_id``, stamp it with its ``cursor`` and return the cursor.
+
+        A ``delta`` following a buffered delta of the same reply is merged into
+        it (the merged frame keeps the first ``offset`` and takes the new
+        cursor), so a streamed reply costs one buffer slot.
+        """
+        now = time.monotonic()
+        with self._lock:
+            seq = self._last_seq = next(self._seq)
+            cursor = frame["cursor"] = self.format_cursor(seq)
+            state = self._state(user_id)
+            tail = state.events[-1] if state.events else None
+            if (frame.get("type") == "delta" and tail is not None and tail[2].get("type") == "delta"
+                    and tail[2].get("id") == frame.get("id")):
+                merged = dict(tail[2], delta=tail[2]["delta"] + frame["delta"], cursor=cursor)
+                tail[0], tail[1], tail[2] = seq, now, merged
+            else:
+                state.events.append([seq, now, frame])
+            self._trim(state, now)
+        return cursor
+
+    def latest(self) -> str:
+        """Cursor a client can resume from after receiving a full history."""
+        with self._lock:
+            return self.format_cursor(self._last_seq)
+
+    def since(self, user_id: int, cursor) -> list[dict] | None:
+        """Frames recorded for ``user_id`` after ``cursor``, or ``None`` if that cannot be answered exactly."""
+        seq = self.parse_cursor(cursor)
+        if seq is None:
+            return None
+        with self._lock:
+            if seq > self._last_seq:
+                return None
+            state = self._users.get(user_id)
+            if state is None:
+                # No events since the cursor, unless the user's buffer may have been evicted after it
+                return [] if seq >= self._evicted_at else None
+            self._users.move_to_end(user_id)
+            self._trim(state, time.monotonic())
+            if seq < state.floor:
+                return None
+            return [frame for event_seq, _, frame in state.events if event_seq > seq]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._users.clear()
+
+
+replay_buffer = ReplayBuffer(
+    max_events=getattr(settings, "CHAT_REPLAY_MAX_EVENTS", 500),
+    ttl=getattr(settings, "CHAT_REPLAY_TTL_SECONDS", 300.0),
+    max_users=getattr(settings, "CHAT_REPLAY_MAX_USERS", 10_000),
+)
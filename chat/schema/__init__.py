@@ -2,3 +2,5 @@ from .types import ConversationType, MessageType  # noqa: F401
 from .queries.conversation_list import ConversationListQuery  # noqa: F401
 from .queries.messages_by_conversation import MessagesByConversationQuery  # noqa: F401
 from .mutations.send_message import SendMessage  # noqa: F401
+from .queries.search_messages import SearchMessagesQuery  # noqa: F401
+from .mutations.react_to_message import ReactToMessage, RemoveReaction  # noqa: F401
@@ -0,0 +1,67 @@
+import graphene
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from chat.metrics import timed_group_send
+from chat.replay import replay_buffer
+from chat.schema.types import ReactionCountType, reaction_count_list
+from chat.services.reaction_service import ReactionChange, remove_reaction, set_reaction
+from core.queries import query_budget
+
+
+def broadcast_reaction(user, change: ReactionChange) -> None:
+    """Push the new counts to the user's open sockets."""
+    channel_layer = get_channel_layer()
+    if channel_layer is None or not change.changed:
+        return
+    updates = [{
+        'message_id': str(change.message_id),
+        'conversation_id': str(change.conversation_id),
+        'counts': change.counts,
+    }]
+    cursor = replay_buffer.record(user.id, {'type': 'reactions', 'updates': updates})
+    async_to_sync(timed_group_send)(channel_layer, f"user_{user.id}", {
+        'type': 'chat.reactions',
+        'updates': updates,
+        'cursor': cursor,
+    })
+
+
+class ReactToMessage(graphene.Mutation):
+    class Arguments:
+        message_id = graphene.ID(required=True)
+        reaction = graphene.String(required=True)
+
+    ok = graphene.Boolean()
+    message_id = graphene.ID()
+    reaction = graphene.String()
+    reactions = graphene.List(graphene.NonNull(ReactionCountType))
+
+    @query_budget("graphql:reactToMessage", 8)
+    @classmethod
+    def mutate(cls, root, info, message_id, reaction):  # type: ignore[override]
+        user = info.context.user
+        if not user.is_authenticated:
+            return cls(ok=False)
+        change = set_reaction(user, message_id, reaction)
+        broadcast_reaction(user, change)
+        return cls(ok=True, message_id=change.message_id, reaction=change.reaction, reactions=reaction_count_list(change.counts))
+
+
+class RemoveReaction(graphene.Mutation):
+    class Arguments:
+        message_id = graphene.ID(required=True)
+
+    ok = graphene.Boolean()
+    message_id = graphene.ID()
+    reactions = graphene.List(graphene.NonNull(ReactionCountType))
+
+    @query_budget("graphql:removeReaction", 7)
+    @classmethod
+    def mutate(cls, root, info, message_id):  # type: ignore[override]
+        user = info.context.user
+        if not user.is_authenticated:
+            return cls(ok=False)
+        change = remove_reaction(user, message_id)
+        broadcast_reaction(user, change)
+        return cls(ok=True, message_id=change.message_id, reactions=reaction_count_list(change.counts))
@@ -1,6 +1,8 @@
 import graphene
 from chat.schema.types import ConversationType, MessageType
 from chat.services.conversation_service import ConversationService
+from chat.services.rate_limit_service import client_ip_from_request, get_rate_limiter
+from core.queries import query_budget
 
 
 class SendMessage(graphene.Mutation):
@@ -14,11 +16,14 @@ class SendMessage(graphene.Mutation):
     user_message = graphene.Field(MessageType)
     ai_message = graphene.Field(MessageType)
 
+    @query_budget("graphql:sendMessage", 10)
     @classmethod
     async def mutate(cls, root, info, content: str, conversation_id: int | None = None, model: str | None = None):  # type: ignore[override]
         user = info.context.user
         if not user.is_authenticated:
             return cls(ok=False, conversation=None, user_message=None, ai_message=None)
+        # Raises RateLimited, reported as a RATE_LIMITED error with retryAfter
+        await get_rate_limiter().acheck("message", user=user, ip=client_ip_from_request(info.context))
         service = ConversationService()
         result = await service.send_message(user=user, conversation_id=conversation_id, content=content, model=model or "gpt-4o-mini")
         return cls(
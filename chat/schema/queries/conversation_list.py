@@ -1,11 +1,13 @@
 import graphene
 from chat.schema.types import ConversationType
 from chat.models import Conversation
+from core.queries import query_budget
 
 
 class ConversationListQuery(graphene.ObjectType):
     conversations = graphene.List(ConversationType)
 
+    @query_budget("graphql:conversations", 2)
     def resolve_conversations(self, info):  # type: ignore[override]
         user = info.context.user
         if not user.is_authenticated:
@@ -1,11 +1,14 @@
 import graphene
-from chat.schema.types import MessageType
+from django.core.exceptions import ValidationError
+from chat.schema.types import MessageType, attach_reaction_counts
 from chat.models import Message, Conversation
+from core.queries import query_budget
 
 
 class MessagesByConversationQuery(graphene.ObjectType):
-    messages = graphene.List(MessageType, conversation_id=graphene.Int(required=True))
+    messages = graphene.List(MessageType, conversation_id=graphene.ID(required=True))
 
+    @query_budget("graphql:messages", 4)
     def resolve_messages(self, info, conversation_id):  # type: ignore[override]
         user = info.context.user
         if not user.is_authenticated:
@@ -13,6 +16,7 @@ class MessagesByConversationQuery(graphene.ObjectType):
         # Ensure conversation belongs to user
         try:
             Conversation.objects.get(pk=conversation_id, user=user)
-        except Conversation.DoesNotExist:
+        except (Conversation.DoesNotExist, ValidationError):
             return []
-        return Message.objects.filter(conversation_id=conversation_id).order_by('created_at')
+        messages = list(Message.objects.filter(conversation_id=conversation_id).select_related('body').order_by('timestamp'))
+        return attach_reaction_counts(messages)
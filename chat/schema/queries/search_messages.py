@@ -0,0 +1,20 @@
+import graphene
+from chat.schema.types import MessageSearchResultType
+from chat.services.search_service import search_messages
+from core.queries import query_budget
+
+
+class SearchMessagesQuery(graphene.ObjectType):
+    search_messages = graphene.Field(
+        MessageSearchResultType,
+        query=graphene.String(required=True),
+        first=graphene.Int(required=False),
+        after=graphene.String(required=False),
+    )
+
+    @query_budget("graphql:searchMessages", 3)
+    def resolve_search_messages(self, info, query, first=None, after=None):  # type: ignore[override]
+        user = info.context.user
+        if not user.is_authenticated:
+            return MessageSearchResultType(hits=[], end_cursor=None, has_next_page=False)
+        return search_messages(user, query, first=first, after=after)
@@ -1,6 +1,7 @@
 import graphene
 from graphene_django import DjangoObjectType
 from chat.models import Conversation, Message
+from chat.services.reaction_service import reaction_counts
 
 
 class ConversationType(DjangoObjectType):
@@ -9,7 +10,48 @@ class ConversationType(DjangoObjectType):
         fields = ("id", "title", "created_at")
 
 
+class ReactionCountType(graphene.ObjectType):
+    reaction = graphene.String(required=True)
+    count = graphene.Int(required=True)
+
+
+def reaction_count_list(counts: dict[str, int]) -> list[ReactionCountType]:
+    return [ReactionCountType(reaction=r, count=c) for r, c in sorted(counts.items())]
+
+
 class MessageType(DjangoObjectType):
+    reactions = graphene.List(graphene.NonNull(ReactionCountType))
+
     class Meta:
         model = Message
         fields = ("id", "conversation", "role", "content", "model", "created_at")
+
+    def resolve_reactions(self, info):  # type: ignore[override]
+        # Filled in bulk by list resolvers (see attach_reaction_counts); single lookup otherwise
+        counts = getattr(self, "_reaction_counts", None)
+        if counts is None:
+            counts = reaction_counts([self.id]).get(self.id, {})
+        return reaction_count_list(counts)
+
+
+def attach_reaction_counts(messages: list[Message]) -> list[Message]:
+    """Prefetch reaction counts for a page of messages with a single query."""
+    counts = reaction_counts([m.id for m in messages])
+    for m in messages:
+        m._reaction_counts = counts.get(m.id, {})
+    return messages
+
+
+class MessageSearchHitType(graphene.ObjectType):
+    message_id = graphene.ID(required=True)
+    conversation_id = graphene.ID(required=True)
+    snippet = graphene.String(required=True)
+    score = graphene.Float()
+    sender = graphene.String()
+    timestamp = graphene.DateTime()
+
+
+class MessageSearchResultType(graphene.ObjectType):
+    hits = graphene.List(graphene.NonNull(MessageSearchHitType), required=True)
+    end_cursor = graphene.String()
+    has_next_page = graphene.Boolean(required=True)
@@ -1,8 +1,16 @@
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable
+
 from zai import ZaiClient
 from asgiref.sync import sync_to_async
-from core.settings import Z_AI_MODEL, Z_AI_API_KEY, AI_SYSTEM_CONTENT, AI_BOT_NAME
+from django.core.cache import cache
+from core.settings import Z_AI_MODEL, Z_AI_API_KEY, AI_SYSTEM_CONTENT, AI_BOT_NAME, CHAT_MEMORY_ENABLED
+from core.settings import CHAT_AI_PROVIDER, CHAT_STUB_TOKENS, CHAT_STUB_FIRST_TOKEN_MS, CHAT_STUB_TOKEN_MS
 from authentication.models import User
+from chat.metrics import ai_request
 from chat.models import Message, Conversation
+from chat.services.memory_service import Memory, recall, remember_messages
+from core.tracing import traced
 
 
 
@@ -10,6 +18,11 @@ from chat.models import Message, Conversation
 # Initialize client
 client = ZaiClient(api_key=Z_AI_API_KEY)
 
+# Sent as the bot's reply when none could be generated
+BOT_MISSING_REPLY = "Bot user not found."
+ERROR_REPLY = "Sorry, I couldn't process your request."
+FALLBACK_REPLIES = (BOT_MISSING_REPLY, ERROR_REPLY)
+
 
 
 
@@ -17,42 +30,198 @@ async def make_title(message:str) -> str:
     """Create a title for the conversation."""
     return "New Conversation"
 
-async def get_ai_response(user: User, user_message: str) -> str:
-    """Get AI response for a user message."""
+@traced("ai.get_response")
+async def get_ai_response(user: User, user_message: str,
+                          on_delta: Callable[[str], Awaitable[None]] | None = None,
+                          reply_id=None, conversation: Conversation | None = None) -> str:
+    """Get AI response for a user message.
+
+    With ``on_delta`` the reply is streamed and each chunk is passed to it as it
+    arrives. ``reply_id`` becomes the primary key of the saved bot message.
+    ``conversation`` defaults to the user's active conversation.
+    If the calling task is cancelled mid-stream, the provider stream is closed
+    and the partial reply is saved with ``metadata={"cancelled": True}``.
+    """
     if not user or not user.is_authenticated:
         return "User not authenticated."
     bot = await sync_to_async(get_bot_user)()
     if not bot:
-        return "Bot user not found."
+        return BOT_MISSING_REPLY
+    parts: list[str] = []
+    saving = False
+
+    async def collect(delta: str):
+        parts.append(delta)
+        await on_delta(delta)
+
     try:
-        message_content = await ai_response(user_message)
- 
-        await save_chat_message(user, bot, user_message, message_content)
+        memories = await recall_memories(user, user_message,
+                                          exclude_conversation_id=conversation.id if conversation else None)
+        if on_delta is None:
+            message_content = await ai_response(user_message, memories=memories)
+        else:
+            message_content = await stream_response_text(user_message, memories, collect)
+
+        saving = True
+        _, user_msg, bot_msg = await save_chat_message(user, bot, user_message, message_content, bot_message_id=reply_id,
+                                                       conversation=conversation)
+        await remember_exchange(user, user_msg, bot_msg)
         return message_content
+    except asyncio.CancelledError:
+        if saving:
+            raise
+        # Keep the exchange so history matches what the client already saw
+        await save_chat_message(user, bot, user_message, "".join(parts), bot_message_id=reply_id,
+                                bot_metadata={"cancelled": True}, conversation=conversation)
+        raise
     except Exception as e:
         print(f"Error getting AI response: {e}")
-        return "Sorry, I couldn't process your request."
+        return ERROR_REPLY
     
 
-async def ai_response(user_message: str) -> str:
+@traced("memory.recall")
+async def recall_memories(user: User, user_message: str, exclude_conversation_id=None) -> list[Memory]:
+    """Fetch related snippets from the user's earlier conversations."""
+    if not CHAT_MEMORY_ENABLED:
+        return []
+    try:
+        return await sync_to_async(recall)(user, user_message, exclude_conversation_id=exclude_conversation_id)
+    except Exception as e:
+        print(f"Error recalling memories: {e}")
+        return []
+
+
+async def remember_exchange(user: User, *messages: Message) -> None:
+    """Add freshly persisted messages to the user's semantic memory."""
+    if not CHAT_MEMORY_ENABLED:
+        return
+    try:
+        await sync_to_async(remember_messages)(user, messages)
+    except Exception as e:
+        print(f"Error storing memories: {e}")
+
+
+def build_context_messages(user_message: str, memories: list[Memory] | None = None) -> list[dict]:
+    """Build the provider message list, injecting recalled memories as extra system context."""
+    messages = [{"role": "system", "content": AI_SYSTEM_CONTENT}]
+    if memories:
+        notes = "\n".join(f"- [{m.timestamp:%Y-%m-%d}] {m.content[:500]}" for m in memories)
+        messages.append({
+            "role": "system",
+            "content": f"Relevant excerpts from this user's earlier conversations (use only if helpful):\n{notes}",
+        })
+    messages.append({"role": "user", "content": user_message})
+    return messages
+
+
+async def stub_stream(user_message: str, memories: list[Memory] | None = None) -> AsyncIterator[str]:
+    """Offline stand-in for the provider: a canned reply streamed with provider-like timing."""
+    words = f"This is a stub reply to: {user_message}".split()
+    await asyncio.sleep(CHAT_STUB_FIRST_TOKEN_MS / 1000)
+    for i in range(CHAT_STUB_TOKENS):
+        if i:
+            await asyncio.sleep(CHAT_STUB_TOKEN_MS / 1000)
+        yield words[i % len(words)] + " "
+
+
+@traced("ai.response")
+async def ai_response(user_message: str, memories: list[Memory] | None = None) -> str:
     """Get AI response for a user message."""
     try:
-        # Wrap the sync client call
-        response = await sync_to_async(client.chat.completions.create)(
-            model=Z_AI_MODEL,
-            messages=[
-                {"role": "system", "content": AI_SYSTEM_CONTENT},
-                {"role": "user", "content": user_message},
-            ],
-            temperature=0.7,
-            top_p=0.8,
-        )
-        return response.choices[0].message.content
+        with ai_request("complete"):
+            if CHAT_AI_PROVIDER == "stub":
+                return "".join([delta async for delta in stub_stream(user_message, memories)])
+            # Wrap the sync client call; off the shared sync thread so replies for different users run in parallel
+            response = await sync_to_async(client.chat.completions.create, thread_sensitive=False)(
+                model=Z_AI_MODEL,
+                messages=build_context_messages(user_message, memories),
+                temperature=0.7,
+                top_p=0.8,
+            )
+            return response.choices[0].message.content
     except Exception as e:
         print(f"Error getting AI response: {e}")
-        return "Sorry, I couldn't process your request."
+        return ERROR_REPLY
+
+
+async def ai_stream(user_message: str, memories: list[Memory] | None = None) -> AsyncIterator[str]:
+    """Yield the AI response in chunks as the provider streams it."""
+    if CHAT_AI_PROVIDER == "stub":
+        async for delta in stub_stream(user_message, memories):
+            yield delta
+        return
+    stream = await sync_to_async(client.chat.completions.create, thread_sensitive=False)(
+        model=Z_AI_MODEL,
+        messages=build_context_messages(user_message, memories),
+        temperature=0.7,
+        top_p=0.8,
+        stream=True,
+    )
+    chunks = iter(stream)
+    next_chunk = sync_to_async(next, thread_sensitive=False)
+    try:
+        while True:
+            chunk = await next_chunk(chunks, None)
+            if chunk is None:
+                return
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                yield delta
+    finally:
+        # Closing the HTTP response stops generation (and billing) when we stop early
+        response = getattr(stream, "response", None)
+        if response is not None:
+            await sync_to_async(response.close, thread_sensitive=False)()
+
+
+@traced("ai.stream")
+async def stream_response_text(user_message: str, memories: list[Memory] | None,
+                               on_delta: Callable[[str], Awaitable[None]]) -> str:
+    """Stream the AI response through ``on_delta`` and return the full text."""
+    parts: list[str] = []
+    with ai_request("stream") as request:
+        try:
+            async for delta in ai_stream(user_message, memories):
+                request.chunk()
+                parts.append(delta)
+                await on_delta(delta)
+        except Exception as e:
+            request.fail(e)
+            print(f"Error streaming AI response: {e}")
+            if not parts:
+                return ERROR_REPLY
+    return "".join(parts)
     
 
+def get_or_create_conversation(user: User, conversation_id=None) -> tuple[Conversation, bool]:
+    """Return ``(conversation, created)``: the user's ``conversation_id`` or their active conversation.
+
+    Raises ``Conversation.DoesNotExist`` if ``conversation_id`` is not one of the user's conversations.
+    """
+    if conversation_id:
+        return Conversation.objects.get(pk=conversation_id, user=user), False
+    conversation = Conversation.objects.filter(user=user, is_active=True).order_by('-updated_at').first()
+    if conversation is not None:
+        return conversation, False
+    return Conversation.objects.create(user=user), True
+
+
+REPLY_ID_KEY = "chat:reply-id:{reply_id}"
+REPLY_ID_CLAIM_SECONDS = 3600  # longer than any reply takes to generate and save
+
+
+def claim_reply_id(reply_id) -> bool:
+    """Reserve a client-chosen reply id; False if a reply with it was already started or saved.
+
+    ``cache.add`` is atomic, so two sockets retrying the same message cannot both
+    start it (across workers too, with a shared cache); the DB check covers ids
+    whose reservation has expired.
+    """
+    if not cache.add(REPLY_ID_KEY.format(reply_id=reply_id), 1, REPLY_ID_CLAIM_SECONDS):
+        return False
+    return not Message.objects.filter(pk=reply_id).exists()
+
+
 def get_bot_user() -> User | None:
     """Get the bot user context."""
     try:
@@ -61,15 +230,15 @@ def get_bot_user() -> User | None:
         return None
 
     
-async def save_chat_message(user: User, bot: User, user_message: str, ai_text: str):
+@traced("db.save_chat_message")
+async def save_chat_message(user: User, bot: User, user_message: str, ai_text: str, bot_message_id=None,
+                            bot_metadata: dict | None = None, conversation: Conversation | None = None):
     """Save the chat message to the database and return (conversation, user_msg, bot_msg)."""
 
 
     # Conversation
-    try:
-        conversation = await sync_to_async(Conversation.objects.get)(user=user, is_active=True)
-    except Conversation.DoesNotExist:
-        conversation = await sync_to_async(Conversation.objects.create)(user=user)
+    if conversation is None:
+        conversation, _ = await sync_to_async(get_or_create_conversation)(user)
     # User message
     user_msg : Message = await sync_to_async(Message.objects.create)(
         conversation=conversation,
@@ -78,11 +247,14 @@ async def save_chat_message(user: User, bot: User, user_message: str, ai_text: s
 
     )
     # Bot message
+    bot_fields = {'id': bot_message_id} if bot_message_id else {}
+    if bot_metadata:
+        bot_fields['metadata'] = bot_metadata
     bot_msg : Message = await sync_to_async(Message.objects.create)(
         conversation=conversation,
         sender=bot,
         content=ai_text,
-
+        **bot_fields,
     )
 
     print(f"Saved messages: User - {user_msg.content}, Bot - {bot_msg.content}")
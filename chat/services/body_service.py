@@ -0,0 +1,153 @@
+"""Compact storage for large message bodies.
+
+Bodies of at least ``MESSAGE_COMPRESSION_THRESHOLD`` characters are moved into
+``MessageBody`` (zlib-compressed, keyed by SHA-256, so identical replies are
+stored once) and the ``chat_message.content`` column is left empty.
+``Message.content`` inflates lazily on attribute access; code reading raw rows
+via ``values_list`` uses ``inflate_rows`` to resolve a whole chunk of bodies
+with one query.
+"""
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from itertools import islice
+from typing import Callable, Iterable, Iterator
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.functions import Length
+
+from chat.compression import compress_text, content_hash, inflate
+from chat.models import Message, MessageBody
+from chat.services.search_service import index_plaintext
+
+
+def _threshold() -> int:
+    return getattr(settings, "MESSAGE_COMPRESSION_THRESHOLD", 1024)
+
+
+def inflate_rows(rows: Iterable[tuple], content_index: int, body_index: int, chunk_size: int = 1000) -> Iterator[tuple]:
+    """Yield ``rows`` with compacted content resolved, fetching bodies once per chunk."""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        wanted = {r[body_index] for r in chunk if r[body_index] is not None and not r[content_index]}
+        bodies = {}
+        if wanted:
+            bodies = {h: inflate(h, data) for h, data in MessageBody.objects.filter(pk__in=wanted).values_list("hash", "data")}
+        for row in chunk:
+            body_id = row[body_index]
+            if body_id is not None and not row[content_index] and body_id in bodies:
+                row = row[:content_index] + (bodies[body_id],) + row[content_index + 1:]
+            yield row
+
+
+def pack_messages(messages: list[Message]) -> list[tuple]:
+    """Compact unsaved ``messages`` in place before ``bulk_create``.
+
+    Bodies are looked up and inserted in bulk. Returns ``(message_id, text)``
+    pairs to pass to ``index_plaintext`` once the messages are inserted.
+    """
+    threshold = _threshold()
+    large = [m for m in messages if threshold and len(m.__dict__.get("content") or "") >= threshold]
+    if not large:
+        return []
+    texts = {content_hash(m.__dict__["content"]): m.__dict__["content"] for m in large}
+    existing = set(MessageBody.objects.filter(pk__in=list(texts)).values_list("hash", flat=True))
+    new_bodies, skipped = [], set()
+    for digest, text in texts.items():
+        if digest in existing:
+            continue
+        data = compress_text(text)
+        size = len(text.encode("utf-8"))
+        if len(data) >= size:
+            skipped.add(digest)
+            continue
+        new_bodies.append(MessageBody(hash=digest, data=data, size=size))
+    MessageBody.objects.bulk_create(new_bodies, ignore_conflicts=True)
+    indexed = []
+    for m in large:
+        text = m.__dict__["content"]
+        digest = content_hash(text)
+        if digest in skipped:
+            continue
+        m.body_id = digest
+        m.__dict__["content"] = ""
+        m.__dict__["_compact_cache"] = (digest, text)
+        indexed.append((m.id, text))
+    return indexed
+
+
+def purge_orphan_bodies(batch_size: int = 1000) -> int:
+    """Delete bodies no message references any more (e.g. after retention purges)."""
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            ids = list(MessageBody.objects.filter(messages__isnull=True).values_list("hash", flat=True)[:batch_size])
+            if not ids:
+                return deleted
+            qs = MessageBody.objects.filter(pk__in=ids)
+            qs._raw_delete(qs.db)
+        deleted += len(ids)
+
+
+@dataclass(slots=True)
+class CompactionStats:
+    scanned: int = 0
+    compacted: int = 0
+    bytes_before: int = 0
+    elapsed: float = 0.0
+
+
+def compact_existing(batch_size: int = 1000, threshold: int | None = None,
+                     on_progress: Callable[[CompactionStats], None] | None = None) -> CompactionStats:
+    """Recompress existing large rows in batches, each batch in its own transaction."""
+    threshold = threshold or _threshold()
+    stats = CompactionStats()
+    started = time.perf_counter()
+    qs = (
+        Message.objects.filter(body__isnull=True)
+        .annotate(content_length=Length("content"))
+        .filter(content_length__gte=threshold)
+        .order_by("pk")
+    )
+    last_pk = None
+    while True:
+        page = qs.filter(pk__gt=last_pk) if last_pk else qs
+        rows = list(page.values_list("pk", "content")[:batch_size])
+        if not rows:
+            break
+        last_pk = rows[-1][0]
+        stats.scanned += len(rows)
+        messages = [Message(id=pk, content=content) for pk, content in rows]
+        with transaction.atomic():
+            indexed = pack_messages(messages)
+            for m in messages:
+                if m.body_id:
+                    Message.objects.filter(pk=m.id).update(content="", body_id=m.body_id)
+            index_plaintext(indexed)
+        stats.compacted += len(indexed)
+        stats.bytes_before += sum(len(text.encode("utf-8")) for _, text in indexed)
+        stats.elapsed = time.perf_counter() - started
+        if on_progress:
+            on_progress(stats)
+    stats.elapsed = time.perf_counter() - started
+    return stats
+
+
+def storage_summary() -> dict:
+    """Bytes held in the message table vs. compressed body storage (SQLite page accounting when available)."""
+    summary = {
+        "bodies": MessageBody.objects.count(),
+        "compacted_messages": Message.objects.filter(body__isnull=False).count(),
+    }
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA page_count")
+            pages = cursor.fetchone()[0]
+            cursor.execute("PRAGMA page_size")
+            summary["database_bytes"] = pages * cursor.fetchone()[0]
+    return summary
@@ -0,0 +1,187 @@
+"""Synthetic users, conversations and messages for benchmarks and load tests.
+
+Rows are built in memory and written with ``bulk_create`` in batches, each
+batch in its own transaction, the same way the NDJSON import writes. One
+password hash is computed for the whole run (hashing is the slowest part of
+creating a user), so every synthetic user logs in with ``DATASET_PASSWORD``.
+Large bot replies are compacted into ``MessageBody`` rows and indexed for
+search like any other message.
+
+Text is drawn from a fixed vocabulary with a seeded RNG, so the same options
+produce the same sizes and distribution on every run; ids and timestamps
+are not reproduced.
+"""
+from __future__ import annotations
+
+import random
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Callable
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from authentication.models import User
+from chat.fields import preserve_timestamps
+from chat.models import Conversation, Message
+from chat.services.body_service import pack_messages
+from chat.services.search_service import index_plaintext
+from core.settings import AI_BOT_NAME
+
+
+DEFAULT_BATCH_SIZE = 5000
+DATASET_PASSWORD = "synthetic-password"
+USERNAME = "{prefix}-{n}"
+
+WORDS = (
+    "the a to of and in is it that for you with on this be are as can what how not your use or if at "
+    "python code function error list data file value model query request server database cache index "
+    "table user message reply token stream socket worker process thread async await return class type "
+    "trip city museum train ticket hotel morning weekend recipe dinner garden coffee music book film "
+    "explain example difference better faster simple short detail step first next last because should "
+    "would could help plan write read run test build deploy install config version update change fix"
+).split()
+
+
+@dataclass(slots=True)
+class DatasetResult:
+    users: int = 0
+    conversations: int = 0
+    messages: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return (self.users + self.conversations + self.messages) / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "users": self.users,
+            "conversations": self.conversations,
+            "messages": self.messages,
+            "elapsed": round(self.elapsed, 3),
+            "rows_per_second": round(self.rows_per_second, 1),
+        }
+
+
+def _sentences(rng: random.Random, count: int = 1024) -> list[str]:
+    return [" ".join(rng.choices(WORDS, k=rng.randint(4, 14))).capitalize() + rng.choice(".?!") for _ in range(count)]
+
+
+class DatasetGenerator:
+    """Write ``users`` users owning ``conversations_per_user`` conversations and ``messages`` messages in total.
+
+    Messages are spread evenly over the conversations and alternate between
+    the user and the bot, starting with the user.
+    """
+
+    def __init__(self, users: int, conversations_per_user: int, messages: int, prefix: str = "synth",
+                 seed: int = 0, batch_size: int = DEFAULT_BATCH_SIZE,
+                 on_progress: Callable[[DatasetResult], None] | None = None):
+        self.users = users
+        self.conversations_per_user = conversations_per_user
+        self.messages = messages
+        self.prefix = prefix
+        self.batch_size = batch_size
+        self.on_progress = on_progress
+        self.rng = random.Random(seed)
+        # Messages are strung together from a pool of sentences: far cheaper than drawing every word
+        self.sentences = _sentences(self.rng)
+        self.result = DatasetResult()
+        self._pending_users: list[User] = []
+        self._pending_conversations: list[Conversation] = []
+        self._pending_messages: list[Message] = []
+        self._started = 0.0
+
+    def run(self) -> DatasetResult:
+        self._started = time.perf_counter()
+        bot, _ = User.objects.get_or_create(username=AI_BOT_NAME, defaults={"role": User.Role.BOT, "is_active": True})
+        password = make_password(DATASET_PASSWORD)
+        total_conversations = self.users * self.conversations_per_user
+        per_conversation, remainder = divmod(self.messages, total_conversations) if total_conversations else (0, 0)
+        now = timezone.now()
+        index = 0
+        for n in range(self.users):
+            user = User(username=USERNAME.format(prefix=self.prefix, n=n),
+                        email=f"{USERNAME.format(prefix=self.prefix, n=n)}@example.com", password=password,
+                        role=User.Role.USER, date_joined=now - timedelta(days=self.rng.randint(30, 720)))
+            self._pending_users.append(user)
+            for c in range(self.conversations_per_user):
+                count = per_conversation + (1 if index < remainder else 0)
+                index += 1
+                # The last conversation is the one the chat socket continues
+                self._add_conversation(user, bot, count, now, active=c == self.conversations_per_user - 1)
+            if len(self._pending_users) + len(self._pending_conversations) >= self.batch_size:
+                self.flush()
+        self.flush()
+        return self.result
+
+    def _add_conversation(self, user: User, bot: User, count: int, now, active: bool) -> None:
+        started = now - timedelta(days=self.rng.uniform(0, 365))
+        conversation = Conversation(id=uuid.uuid4(), user=user, title=self.rng.choice(self.sentences)[:60],
+                                    created_at=started, updated_at=started, is_active=active)
+        self._pending_conversations.append(conversation)
+        at = started
+        stamps = []
+        for _ in range(count):
+            at += timedelta(seconds=self.rng.randint(5, 600))
+            stamps.append(at)
+        conversation.updated_at = at
+        for i, timestamp in enumerate(stamps):
+            from_user = i % 2 == 0
+            self._pending_messages.append(Message(
+                id=uuid.uuid4(),
+                conversation=conversation,
+                sender=user if from_user else bot,
+                # Short questions; replies sometimes long enough to be compacted
+                content=self._text(1, 3) if from_user else self._text(2, 25),
+                timestamp=timestamp,
+            ))
+            if len(self._pending_messages) >= self.batch_size:
+                self.flush()
+
+    def _text(self, low: int, high: int) -> str:
+        return " ".join(self.rng.choices(self.sentences, k=self.rng.randint(low, high)))
+
+    def flush(self) -> None:
+        if not self._pending_users and not self._pending_conversations and not self._pending_messages:
+            return
+        with transaction.atomic(), preserve_timestamps():
+            if self._pending_users:
+                # Ids are only assigned on insert for backends that return them; look them up otherwise
+                User.objects.bulk_create(self._pending_users)
+                if any(user.pk is None for user in self._pending_users):
+                    ids = dict(User.objects.filter(username__in=[u.username for u in self._pending_users])
+                               .values_list("username", "id"))
+                    for user in self._pending_users:
+                        user.pk = ids[user.username]
+                for conversation in self._pending_conversations:
+                    conversation.user_id = conversation.user.pk
+                for message in self._pending_messages:
+                    message.sender_id = message.sender.pk
+            if self._pending_conversations:
+                Conversation.objects.bulk_create(self._pending_conversations)
+            if self._pending_messages:
+                plaintext = pack_messages(self._pending_messages)
+                Message.objects.bulk_create(self._pending_messages)
+                index_plaintext(plaintext)
+        self.result.users += len(self._pending_users)
+        self.result.conversations += len(self._pending_conversations)
+        self.result.messages += len(self._pending_messages)
+        self._pending_users = []
+        self._pending_conversations = []
+        self._pending_messages = []
+        self.result.elapsed = time.perf_counter() - self._started
+        if self.on_progress:
+            self.on_progress(self.result)
+
+
+def generate_dataset(users: int, conversations_per_user: int, messages: int, prefix: str = "synth", seed: int = 0,
+                     batch_size: int = DEFAULT_BATCH_SIZE,
+                     on_progress: Callable[[DatasetResult], None] | None = None) -> DatasetResult:
+    """Generate a synthetic dataset and return row counts and throughput."""
+    return DatasetGenerator(users, conversations_per_user, messages, prefix=prefix, seed=seed,
+                            batch_size=batch_size, on_progress=on_progress).run()
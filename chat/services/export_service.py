@@ -0,0 +1,174 @@
+"""Streaming conversation export.
+
+Everything here is a generator: conversations and messages are read with
+chunked ``.iterator()`` queries over ``values_list`` rows (no model
+instances), serialized one record at a time and coalesced into ~64 KiB byte
+chunks, optionally gzip-compressed on the fly. Memory use is bounded by the
+chunk size, not by the size of the account.
+"""
+from __future__ import annotations
+
+import json
+import uuid
+import zlib
+from datetime import datetime
+from typing import Callable, Iterable, Iterator
+
+from django.utils import timezone
+
+from authentication.models import User
+from chat.models import Conversation, Message
+from chat.services.body_service import inflate_rows
+
+
+DB_CHUNK_SIZE = 2000
+OUTPUT_CHUNK_BYTES = 64 * 1024
+
+MESSAGE_FIELDS = (
+    "id", "sender_id", "sender__username", "content", "message_type",
+    "metadata", "timestamp", "is_edited", "edited_at", "body_id",
+)
+_CONTENT_INDEX = MESSAGE_FIELDS.index("content")
+_BODY_INDEX = MESSAGE_FIELDS.index("body_id")
+
+
+class ExportError(Exception):
+    """Raised for invalid export requests (unknown format, foreign conversation)."""
+    def __init__(self, message: str, code: str = "INVALID_EXPORT"):
+        self.code = code
+        super().__init__(message)
+
+
+def _iso(value: datetime | None) -> str | None:
+    return value.isoformat() if value else None
+
+
+def _conversation_title(title: str | None, created_at: datetime) -> str:
+    return title or f"Conversation {created_at.strftime('%Y-%m-%d')}"
+
+
+def iter_conversations(user: User, conversation_id: uuid.UUID | None = None) -> Iterator[dict]:
+    qs = Conversation.objects.filter(user=user).order_by("created_at")
+    if conversation_id is not None:
+        qs = qs.filter(pk=conversation_id)
+    for conv_id, title, created_at, updated_at, is_active in qs.values_list(
+        "id", "title", "created_at", "updated_at", "is_active"
+    ).iterator(chunk_size=DB_CHUNK_SIZE):
+        yield {
+            "id": str(conv_id),
+            "title": _conversation_title(title, created_at),
+            "created_at": _iso(created_at),
+            "updated_at": _iso(updated_at),
+            "is_active": is_active,
+        }
+
+
+def inflate_message_rows(rows: Iterable[tuple]) -> Iterator[tuple]:
+    """Resolve compacted bodies in ``MESSAGE_FIELDS`` rows (one body query per chunk)."""
+    return inflate_rows(rows, _CONTENT_INDEX, _BODY_INDEX, chunk_size=DB_CHUNK_SIZE)
+
+
+def message_record(owner_id: int, conversation_id: str, row: tuple) -> dict:
+    """Serialize an inflated ``MESSAGE_FIELDS`` values_list row into an export record."""
+    msg_id, sender_id, username, content, message_type, metadata, ts, is_edited, edited_at, _ = row
+    return {
+        "id": str(msg_id),
+        "conversation_id": conversation_id,
+        "sender": username,
+        "kind": "user" if sender_id == owner_id else "bot",
+        "content": content,
+        "message_type": message_type,
+        "metadata": metadata or {},
+        "timestamp": _iso(ts),
+        "is_edited": is_edited,
+        "edited_at": _iso(edited_at),
+    }
+
+
+def iter_messages(user: User, conversation_id: str) -> Iterator[dict]:
+    rows = (
+        Message.objects.filter(conversation_id=conversation_id)
+        .order_by("timestamp")
+        .values_list(*MESSAGE_FIELDS)
+        .iterator(chunk_size=DB_CHUNK_SIZE)
+    )
+    for row in inflate_message_rows(rows):
+        yield message_record(user.id, conversation_id, row)
+
+
+def _dumps(obj: dict) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def render_ndjson(user: User, conversation_id: uuid.UUID | None = None) -> Iterator[str]:
+    for conv in iter_conversations(user, conversation_id):
+        yield _dumps({"type": "conversation", **conv}) + "\n"
+        for msg in iter_messages(user, conv["id"]):
+            yield _dumps({"type": "message", **msg}) + "\n"
+
+
+def render_json(user: User, conversation_id: uuid.UUID | None = None) -> Iterator[str]:
+    yield '{"exported_at":' + json.dumps(_iso(timezone.now())) + ',"conversations":['
+    for i, conv in enumerate(iter_conversations(user, conversation_id)):
+        head = _dumps(conv)
+        yield ("," if i else "") + head[:-1] + ',"messages":['
+        for j, msg in enumerate(iter_messages(user, conv["id"])):
+            yield ("," if j else "") + _dumps(msg)
+        yield "]}"
+    yield "]}\n"
+
+
+def render_markdown(user: User, conversation_id: uuid.UUID | None = None) -> Iterator[str]:
+    for conv in iter_conversations(user, conversation_id):
+        yield f"# {conv['title']}\n\n_Started {conv['created_at']}_\n\n"
+        for msg in iter_messages(user, conv["id"]):
+            yield f"**{msg['sender'] or msg['kind']}** · {msg['timestamp']}\n\n{msg['content']}\n\n"
+        yield "---\n\n"
+
+
+# format -> (renderer, content type, file extension)
+EXPORT_FORMATS: dict[str, tuple[Callable[..., Iterator[str]], str, str]] = {
+    "ndjson": (render_ndjson, "application/x-ndjson", "ndjson"),
+    "json": (render_json, "application/json", "json"),
+    "markdown": (render_markdown, "text/markdown; charset=utf-8", "md"),
+}
+
+
+def coalesce(pieces: Iterable[str], chunk_bytes: int = OUTPUT_CHUNK_BYTES) -> Iterator[bytes]:
+    """Encode string pieces and group them into chunks of roughly ``chunk_bytes``."""
+    buf: list[bytes] = []
+    size = 0
+    for piece in pieces:
+        data = piece.encode("utf-8")
+        buf.append(data)
+        size += len(data)
+        if size >= chunk_bytes:
+            yield b"".join(buf)
+            buf, size = [], 0
+    if buf:
+        yield b"".join(buf)
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def build_export(user: User, fmt: str, conversation_id: uuid.UUID | None = None,
+                 gzip: bool = False) -> tuple[Iterator[bytes], str, str]:
+    """Return (byte chunk iterator, content type, filename) for an export."""
+    if fmt not in EXPORT_FORMATS:
+        raise ExportError(f"Unsupported format '{fmt}'. Use one of: {', '.join(EXPORT_FORMATS)}")
+    if conversation_id is not None and not Conversation.objects.filter(pk=conversation_id, user=user).exists():
+        raise ExportError("Conversation not found", code="NOT_FOUND")
+    renderer, content_type, ext = EXPORT_FORMATS[fmt]
+    scope = f"conversation-{conversation_id}" if conversation_id else f"{user.username}-all"
+    filename = f"{scope}-{timezone.now():%Y%m%d}.{ext}"
+    chunks = coalesce(renderer(user, conversation_id))
+    if gzip:
+        return gzip_stream(chunks), "application/gzip", filename + ".gz"
+    return chunks, content_type, filename
@@ -0,0 +1,263 @@
+"""Bulk NDJSON import of conversations and messages.
+
+The input format is the one produced by the NDJSON export: one JSON object per
+line, ``{"type": "conversation", ...}`` records optionally followed by
+``{"type": "message", "conversation_id": ..., ...}`` records. Messages may also
+reference a conversation id that never got its own record; the conversation
+is then created on the fly. The sender of a message is taken from ``kind``
+(``user``/``bot``) or an OpenAI-style ``role`` (``user``/``assistant``).
+
+Rows are validated one by one, buffered, and written with ``bulk_create`` in
+batches, each batch in its own transaction. Original timestamps are kept via
+``chat.fields.preserve_timestamps``. Imported conversations are created
+inactive so they never compete with the live ``is_active`` conversation.
+
+Rows keep their source ids when those are free UUIDs, so retention archives
+restore exactly. A conversation id that is already one of the user's own
+conversations is restored into; messages it still has are skipped, so the
+same file can be imported twice. Ids taken by other rows get fresh UUIDs.
+"""
+from __future__ import annotations
+
+import json
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone as dt_timezone
+from typing import Callable, Iterable
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from authentication.models import User
+from chat.fields import preserve_timestamps
+from chat.models import Conversation, Message
+from chat.services.body_service import pack_messages
+from chat.services.search_service import index_plaintext
+from core.settings import AI_BOT_NAME
+
+
+DEFAULT_BATCH_SIZE = 5000
+MAX_ERROR_SAMPLES = 100
+
+_USER_KINDS = {"user", "human"}
+_BOT_KINDS = {"bot", "assistant", "ai", "model"}
+_MESSAGE_TYPES = {choice for choice, _ in Message.MESSAGE_TYPE_CHOICES}
+
+
+class ImportRowError(ValueError):
+    """A single NDJSON row failed validation."""
+
+
+@dataclass(slots=True)
+class ImportResult:
+    conversations: int = 0
+    messages: int = 0
+    skipped: int = 0
+    already_present: int = 0
+    lines: int = 0
+    elapsed: float = 0.0
+    errors: list[str] = field(default_factory=list)
+
+    @property
+    def rows_per_second(self) -> float:
+        return (self.conversations + self.messages) / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "conversations": self.conversations,
+            "messages": self.messages,
+            "skipped": self.skipped,
+            "already_present": self.already_present,
+            "lines": self.lines,
+            "elapsed": round(self.elapsed, 3),
+            "rows_per_second": round(self.rows_per_second, 1),
+            "errors": self.errors,
+        }
+
+
+def _parse_ts(value, field_name: str) -> datetime | None:
+    if value in (None, ""):
+        return None
+    try:
+        if isinstance(value, (int, float)):
+            return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+        # Well-formed but impossible dates (month 13) raise instead of returning None
+        parsed = parse_datetime(str(value))
+    except (ValueError, OverflowError, OSError) as e:
+        raise ImportRowError(f"invalid {field_name} '{value}': {e}")
+    if parsed is None:
+        raise ImportRowError(f"invalid {field_name} '{value}'")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
+
+
+class NDJSONImporter:
+    """Stream NDJSON lines into ``Conversation``/``Message`` rows for one user."""
+
+    def __init__(self, user: User, batch_size: int = DEFAULT_BATCH_SIZE,
+                 on_progress: Callable[[ImportResult], None] | None = None):
+        self.user = user
+        self.batch_size = batch_size
+        self.on_progress = on_progress
+        self.result = ImportResult()
+        self._bot: User | None = None
+        self._conversation_ids: dict[str, uuid.UUID] = {}  # source id -> new id
+        self._pending_conversations: list[Conversation] = []
+        self._pending_messages: list[Message] = []
+        self._started = 0.0
+
+    @property
+    def bot(self) -> User:
+        if self._bot is None:
+            self._bot, _ = User.objects.get_or_create(
+                username=AI_BOT_NAME, defaults={"role": User.Role.BOT, "is_active": True}
+            )
+        return self._bot
+
+    def run(self, lines: Iterable[bytes | str]) -> ImportResult:
+        self._started = time.perf_counter()
+        for lineno, line in enumerate(lines, start=1):
+            self.result.lines = lineno
+            if isinstance(line, bytes):
+                line = line.decode("utf-8", errors="replace")
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                self._handle(json.loads(line))
+            except (ImportRowError, json.JSONDecodeError, TypeError, AttributeError) as e:
+                self.result.skipped += 1
+                if len(self.result.errors) < MAX_ERROR_SAMPLES:
+                    self.result.errors.append(f"line {lineno}: {e}")
+            if len(self._pending_messages) + len(self._pending_conversations) >= self.batch_size:
+                self.flush()
+        self.flush()
+        return self.result
+
+    def _handle(self, row: dict) -> None:
+        kind = row.get("type") or ("message" if "content" in row else None)
+        if kind == "conversation":
+            self._add_conversation(row)
+        elif kind == "message":
+            self._add_message(row)
+        else:
+            raise ImportRowError(f"unknown record type '{kind}'")
+
+    def _add_conversation(self, row: dict, source_id: str | None = None) -> uuid.UUID:
+        source_id = str(source_id or row.get("id") or uuid.uuid4())
+        if source_id in self._conversation_ids:
+            return self._conversation_ids[source_id]
+        created_at = _parse_ts(row.get("created_at"), "created_at") or timezone.now()
+        title = row.get("title")
+        conv = Conversation(
+            id=_as_uuid(source_id) or uuid.uuid4(),
+            user=self.user,
+            title=str(title)[:255] if title else None,
+            created_at=created_at,
+            updated_at=_parse_ts(row.get("updated_at"), "updated_at") or created_at,
+            is_active=False,
+        )
+        self._conversation_ids[source_id] = conv.id
+        self._pending_conversations.append(conv)
+        return conv.id
+
+    def _add_message(self, row: dict) -> None:
+        content = row.get("content")
+        if not isinstance(content, str) or not content:
+            raise ImportRowError("message without content")
+        source_conv = row.get("conversation_id")
+        if not source_conv:
+            raise ImportRowError("message without conversation_id")
+        who = str(row.get("kind") or row.get("role") or "").lower()
+        if who in _USER_KINDS:
+            sender = self.user
+        elif who in _BOT_KINDS:
+            sender = self.bot
+        else:
+            raise ImportRowError(f"unknown sender kind '{who}'")
+        message_type = str(row.get("message_type") or "TEXT").upper()
+        if message_type not in _MESSAGE_TYPES:
+            raise ImportRowError(f"unknown message_type '{message_type}'")
+        metadata = row.get("metadata") or {}
+        if not isinstance(metadata, dict):
+            raise ImportRowError("metadata must be an object")
+        timestamp = _parse_ts(row.get("timestamp"), "timestamp") or timezone.now()
+        conversation_id = self._conversation_ids.get(str(source_conv))
+        if conversation_id is None:
+            conversation_id = self._add_conversation({"created_at": timestamp.isoformat()}, source_id=source_conv)
+        self._pending_messages.append(Message(
+            id=_as_uuid(row.get("id")) or uuid.uuid4(),
+            conversation_id=conversation_id,
+            sender=sender,
+            content=content,
+            message_type=message_type,
+            metadata=metadata,
+            timestamp=timestamp,
+            is_edited=bool(row.get("is_edited", False)),
+            edited_at=_parse_ts(row.get("edited_at"), "edited_at"),
+        ))
+
+    def flush(self) -> None:
+        if not self._pending_conversations and not self._pending_messages:
+            return
+        with transaction.atomic(), preserve_timestamps():
+            self._resolve_ids()
+            if self._pending_conversations:
+                Conversation.objects.bulk_create(self._pending_conversations)
+            if self._pending_messages:
+                plaintext = pack_messages(self._pending_messages)
+                Message.objects.bulk_create(self._pending_messages)
+                index_plaintext(plaintext)
+        self.result.conversations += len(self._pending_conversations)
+        self.result.messages += len(self._pending_messages)
+        self._pending_conversations = []
+        self._pending_messages = []
+        self.result.elapsed = time.perf_counter() - self._started
+        if self.on_progress:
+            self.on_progress(self.result)
+
+    def _resolve_ids(self) -> None:
+        """Restore into the user's own existing rows and re-key pending rows whose source id is taken."""
+        conversations = {c.id: c for c in self._pending_conversations}
+        moved = {}
+        if conversations:
+            for conv_id, owner_id in Conversation.objects.filter(pk__in=list(conversations)).values_list("id", "user_id"):
+                if owner_id == self.user.pk:
+                    self._pending_conversations.remove(conversations[conv_id])
+                else:
+                    moved[conv_id] = conversations[conv_id].id = uuid.uuid4()
+        if moved:
+            for source_id, conv_id in self._conversation_ids.items():
+                if conv_id in moved:
+                    self._conversation_ids[source_id] = moved[conv_id]
+            for message in self._pending_messages:
+                message.conversation_id = moved.get(message.conversation_id, message.conversation_id)
+        taken = dict(Message.objects.filter(pk__in=[m.id for m in self._pending_messages])
+                     .values_list("id", "conversation_id"))
+        if not taken:
+            return
+        kept = []
+        for message in self._pending_messages:
+            if taken.get(message.id) == message.conversation_id:
+                self.result.already_present += 1
+                continue
+            if message.id in taken:
+                message.id = uuid.uuid4()
+            kept.append(message)
+        self._pending_messages = kept
+
+
+def _as_uuid(value) -> uuid.UUID | None:
+    try:
+        return uuid.UUID(str(value))
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+def import_ndjson(user: User, lines: Iterable[bytes | str], batch_size: int = DEFAULT_BATCH_SIZE,
+                  on_progress: Callable[[ImportResult], None] | None = None) -> ImportResult:
+    """Import NDJSON ``lines`` into ``user``'s account and return counts and throughput."""
+    return NDJSONImporter(user, batch_size=batch_size, on_progress=on_progress).run(lines)
@@ -0,0 +1,264 @@
+"""Token-bucket rate limiting shared by the chat socket and GraphQL.
+
+Each limited action (e.g. ``message``, which costs a provider request over
+either transport) has a rate per ``User.Role`` and one per client IP, both
+configured in ``CHAT_RATE_LIMITS`` as ``"<count>/<period>"``: the bucket holds
+``count`` tokens (the burst) and refills ``count`` per period. A request takes
+one token from the user's bucket and the IP's bucket together, or from
+neither, and is refused with ``RateLimited`` (code ``RATE_LIMITED``) carrying
+the seconds until it would be allowed.
+
+``CHAT_RATE_LIMIT_BACKEND`` selects where buckets live: ``memory`` keeps them
+in this process (one budget per worker), ``redis`` keeps them in Redis and
+updates them with a Lua script, so all workers share one budget.
+"""
+from __future__ import annotations
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from django.conf import settings
+
+from authentication.models import User
+
+PERIODS = {"s": 1, "sec": 1, "second": 1, "m": 60, "min": 60, "minute": 60, "h": 3600, "hour": 3600, "d": 86400, "day": 86400}
+IP_SCOPE = "ip"
+
+
+class RateLimited(Exception):
+    def __init__(self, message: str, retry_after: float, scope: str, code: str = "RATE_LIMITED"):
+        super().__init__(message)
+        self.code = code
+        self.scope = scope
+        # Whole seconds, rounded up, so clients that wait this long always get through
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+@dataclass(frozen=True, slots=True)
+class Rate:
+    limit: int
+    period: float
+
+    @property
+    def per_second(self) -> float:
+        return self.limit / self.period
+
+    @classmethod
+    def parse(cls, value) -> "Rate | None":
+        """``"20/min"`` -> ``Rate(20, 60)``; ``None``, ``""`` or ``"none"`` mean unlimited."""
+        if value is None or isinstance(value, Rate):
+            return value
+        text = str(value).strip().lower()
+        if text in ("", "none"):
+            return None
+        count, _, period = text.partition("/")
+        multiple, unit = "".join(c for c in period if c.isdigit()), period.lstrip("0123456789")
+        if not count.isdigit() or int(count) < 1 or unit not in PERIODS:
+            raise ValueError(f"Invalid rate '{value}', expected e.g. '20/min'")
+        return cls(int(count), PERIODS[unit] * int(multiple or 1))
+
+
+@dataclass(frozen=True, slots=True)
+class Bucket:
+    key: str
+    scope: str
+    rate: Rate
+
+
+class MemoryBackend:
+    """Buckets in this process, least recently used dropped beyond ``max_keys``."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, list[float]]" = OrderedDict()  # key -> [tokens, updated_at]
+        self._lock = threading.Lock()
+
+    def consume(self, buckets: list[Bucket], cost: float = 1) -> tuple[float, Bucket | None]:
+        """Take ``cost`` tokens from every bucket, or none; returns ``(0, None)`` or ``(wait, limiting bucket)``."""
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            for bucket in buckets:
+                state = self._buckets.get(bucket.key)
+                if state is None:
+                    tokens = bucket.rate.limit
+                else:
+                    tokens = min(bucket.rate.limit, state[0] + (now - state[1]) * bucket.rate.per_second)
+                    self._buckets.move_to_end(bucket.key)
+                levels.append(tokens)
+            wait, limiting = 0.0, None
+            for bucket, tokens in zip(buckets, levels):
+                if tokens < cost:
+                    needed = (cost - tokens) / bucket.rate.per_second
+                    if needed > wait:
+                        wait, limiting = needed, bucket
+            if limiting is not None:
+                return wait, limiting
+            for bucket, tokens in zip(buckets, levels):
+                self._buckets[bucket.key] = [tokens - cost, now]
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return 0.0, None
+
+    async def aconsume(self, buckets: list[Bucket], cost: float = 1) -> tuple[float, Bucket | None]:
+        return self.consume(buckets, cost)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+# KEYS: bucket keys; ARGV: now, cost, then capacity and refill-per-second for each key.
+# Returns -1 when every bucket had enough tokens (and took them), else the 0-based index of the
+# bucket that needs the longest wait, followed by that wait in milliseconds.
+_CONSUME_SCRIPT = """
+local now = tonumber(ARGV[1])
+local cost = tonumber(ARGV[2])
+local levels = {}
+local worst, wait = -1, 0
+for i, key in ipairs(KEYS) do
+  local capacity = tonumber(ARGV[1 + 2 * i])
+  local rate = tonumber(ARGV[2 + 2 * i])
+  local state = redis.call('HMGET', key, 'tokens', 'ts')
+  local tokens = capacity
+  if state[1] then
+    tokens = math.min(capacity, tonumber(state[1]) + math.max(0, now - tonumber(state[2])) * rate)
+  end
+  levels[i] = tokens
+  if tokens < cost and (cost - tokens) / rate > wait then
+    worst, wait = i - 1, (cost - tokens) / rate
+  end
+end
+if worst >= 0 then
+  return {worst, math.ceil(wait * 1000)}
+end
+for i, key in ipairs(KEYS) do
+  local capacity = tonumber(ARGV[1 + 2 * i])
+  local rate = tonumber(ARGV[2 + 2 * i])
+  redis.call('HSET', key, 'tokens', levels[i] - cost, 'ts', now)
+  redis.call('PEXPIRE', key, math.ceil(capacity / rate * 1000))
+end
+return {-1, 0}
+"""
+
+
+class RedisBackend:
+    """Buckets shared by every worker, updated atomically by a Lua script."""
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        import redis
+        import redis.asyncio
+
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+        self._async_client = redis.asyncio.Redis.from_url(url)
+        self._script = self._client.register_script(_CONSUME_SCRIPT)
+        self._async_script = self._async_client.register_script(_CONSUME_SCRIPT)
+
+    def _args(self, buckets: list[Bucket], cost: float):
+        # Redis TIME would need a second round trip; worker clocks only need to agree to within a refill step
+        argv = [time.time(), cost]
+        for bucket in buckets:
+            argv += [bucket.rate.limit, bucket.rate.per_second]
+        return [self.prefix + b.key for b in buckets], argv
+
+    @staticmethod
+    def _result(buckets: list[Bucket], result) -> tuple[float, Bucket | None]:
+        index, wait_ms = int(result[0]), int(result[1])
+        return (0.0, None) if index < 0 else (wait_ms / 1000, buckets[index])
+
+    def consume(self, buckets: list[Bucket], cost: float = 1) -> tuple[float, Bucket | None]:
+        keys, argv = self._args(buckets, cost)
+        return self._result(buckets, self._script(keys=keys, args=argv))
+
+    async def aconsume(self, buckets: list[Bucket], cost: float = 1) -> tuple[float, Bucket | None]:
+        keys, argv = self._args(buckets, cost)
+        return self._result(buckets, await self._async_script(keys=keys, args=argv))
+
+
+class RateLimiter:
+    def __init__(self, backend, limits: dict[str, dict]):
+        self.backend = backend
+        self.limits = {action: {scope: Rate.parse(rate) for scope, rate in rates.items()}
+                       for action, rates in limits.items()}
+
+    def buckets(self, action: str, user: User | None = None, ip: str | None = None) -> list[Bucket]:
+        rates = self.limits.get(action, {})
+        buckets = []
+        if user is not None and getattr(user, "is_authenticated", False):
+            # Roles without their own entry get the USER rate
+            rate = rates.get(getattr(user, "role", None), rates.get(User.Role.USER))
+            if rate is not None:
+                buckets.append(Bucket(f"{action}:user:{user.pk}", "user", rate))
+        if ip and rates.get(IP_SCOPE) is not None:
+            buckets.append(Bucket(f"{action}:ip:{ip}", IP_SCOPE, rates[IP_SCOPE]))
+        return buckets
+
+    @staticmethod
+    def _raise(wait: float, bucket: Bucket) -> None:
+        who = "this address" if bucket.scope == IP_SCOPE else "your account"
+        raise RateLimited(f"Too many requests from {who}; try again in {max(1, math.ceil(wait))}s",
+                          retry_after=wait, scope=bucket.scope)
+
+    def check(self, action: str, user: User | None = None, ip: str | None = None, cost: float = 1) -> None:
+        """Take a token for ``action`` from the user's and the IP's bucket, or raise ``RateLimited``."""
+        buckets = self.buckets(action, user, ip)
+        if buckets:
+            wait, bucket = self.backend.consume(buckets, cost)
+            if bucket is not None:
+                self._raise(wait, bucket)
+
+    async def acheck(self, action: str, user: User | None = None, ip: str | None = None, cost: float = 1) -> None:
+        buckets = self.buckets(action, user, ip)
+        if buckets:
+            wait, bucket = await self.backend.aconsume(buckets, cost)
+            if bucket is not None:
+                self._raise(wait, bucket)
+
+
+def _forwarded_for(value: str | None) -> str | None:
+    if getattr(settings, "CHAT_RATE_LIMIT_TRUST_X_FORWARDED_FOR", False) and value:
+        return value.split(",")[0].strip() or None
+    return None
+
+
+def client_ip_from_request(request) -> str | None:
+    meta = getattr(request, "META", {})
+    return _forwarded_for(meta.get("HTTP_X_FORWARDED_FOR")) or meta.get("REMOTE_ADDR")
+
+
+def client_ip_from_scope(scope) -> str | None:
+    headers = dict(scope.get("headers") or [])
+    forwarded = headers.get(b"x-forwarded-for")
+    client = scope.get("client")
+    return _forwarded_for(forwarded.decode("latin-1") if forwarded else None) or (client[0] if client else None)
+
+
+_limiter: RateLimiter | None = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """The process-wide limiter built from settings on first use."""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                backend_name = getattr(settings, "CHAT_RATE_LIMIT_BACKEND", "memory")
+                if backend_name == "redis":
+                    backend = RedisBackend(getattr(settings, "CHAT_RATE_LIMIT_REDIS_URL", "redis://localhost:6379/1"))
+                elif backend_name == "memory":
+                    backend = MemoryBackend()
+                else:
+                    raise ValueError(f"Unknown CHAT_RATE_LIMIT_BACKEND '{backend_name}'")
+                _limiter = RateLimiter(backend, getattr(settings, "CHAT_RATE_LIMITS", {}))
+    return _limiter
+
+
+def reset_rate_limiter() -> None:
+    """Forget the limiter (and in-process buckets), e.g. after changing settings in tests."""
+    global _limiter
+    _limiter = None
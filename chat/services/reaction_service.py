@@ -0,0 +1,113 @@
+"""Message reactions with materialized per-message counts.
+
+``MessageReaction`` stays the source of truth (one reaction per user per
+message); ``MessageReactionCount`` holds the totals, changed only through
+``F()`` increments inside the same transaction. Reading counts for a page of
+messages is one query (``reaction_counts``), however many messages there are.
+"""
+from __future__ import annotations
+
+import uuid
+from dataclasses import dataclass
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from authentication.models import User
+from chat.history_cache import history_cache
+from chat.models import ChatSettings, Message, MessageReaction, MessageReactionCount
+
+
+VALID_REACTIONS = {choice for choice, _ in MessageReaction.REACTION_CHOICES}
+
+
+class ReactionError(Exception):
+    """Raised when a reaction cannot be applied."""
+    def __init__(self, message: str, code: str = "REACTION_ERROR"):
+        self.code = code
+        super().__init__(message)
+
+
+@dataclass(slots=True)
+class ReactionChange:
+    message_id: uuid.UUID
+    conversation_id: uuid.UUID
+    reaction: str | None  # the user's reaction after the change
+    counts: dict[str, int]
+    changed: bool
+
+
+def _increment(message_id: uuid.UUID, reaction: str, delta: int) -> None:
+    qs = MessageReactionCount.objects.filter(message_id=message_id, reaction=reaction)
+    if delta < 0:
+        qs.filter(count__gte=-delta).update(count=F("count") + delta)
+        return
+    if qs.update(count=F("count") + delta):
+        return
+    try:
+        with transaction.atomic():
+            MessageReactionCount.objects.create(message_id=message_id, reaction=reaction, count=delta)
+    except IntegrityError:  # created concurrently
+        qs.update(count=F("count") + delta)
+
+
+def _get_message(user: User, message_id) -> Message:
+    try:
+        message = Message.objects.only("id", "conversation_id").get(pk=message_id, conversation__user=user)
+    except (Message.DoesNotExist, ValueError, ValidationError):  # malformed ids raise ValidationError
+        raise ReactionError("Message not found", code="NOT_FOUND")
+    enabled = ChatSettings.objects.filter(user=user).values_list("enable_message_reactions", flat=True).first()
+    if enabled is False:
+        raise ReactionError("Reactions are disabled in your chat settings", code="REACTIONS_DISABLED")
+    return message
+
+
+def _refresh_cached_counts(message: Message, counts: dict[str, int]) -> None:
+    transaction.on_commit(lambda: history_cache.set_reactions(message.conversation_id, message.id, counts))
+
+
+def reaction_counts(message_ids) -> dict[uuid.UUID, dict[str, int]]:
+    """Return ``{message_id: {reaction: count}}`` for all ``message_ids`` in one query."""
+    result: dict[uuid.UUID, dict[str, int]] = {}
+    rows = MessageReactionCount.objects.filter(message_id__in=list(message_ids), count__gt=0).values_list(
+        "message_id", "reaction", "count"
+    )
+    for message_id, reaction, count in rows:
+        result.setdefault(message_id, {})[reaction] = count
+    return result
+
+
+@transaction.atomic
+def set_reaction(user: User, message_id, reaction: str) -> ReactionChange:
+    reaction = (reaction or "").upper()
+    if reaction not in VALID_REACTIONS:
+        raise ReactionError(f"Unknown reaction '{reaction}'", code="INVALID_REACTION")
+    message = _get_message(user, message_id)
+    existing = MessageReaction.objects.select_for_update().filter(message=message, user=user).first()
+    changed = True
+    if existing is None:
+        MessageReaction.objects.create(message=message, user=user, reaction=reaction)
+        _increment(message.id, reaction, 1)
+    elif existing.reaction != reaction:
+        _increment(message.id, existing.reaction, -1)
+        existing.reaction = reaction
+        existing.save(update_fields=["reaction"])
+        _increment(message.id, reaction, 1)
+    else:
+        changed = False
+    counts = reaction_counts([message.id]).get(message.id, {})
+    _refresh_cached_counts(message, counts)
+    return ReactionChange(message.id, message.conversation_id, reaction, counts, changed)
+
+
+@transaction.atomic
+def remove_reaction(user: User, message_id) -> ReactionChange:
+    message = _get_message(user, message_id)
+    existing = MessageReaction.objects.select_for_update().filter(message=message, user=user).first()
+    if existing is not None:
+        existing.delete()
+        _increment(message.id, existing.reaction, -1)
+    counts = reaction_counts([message.id]).get(message.id, {})
+    _refresh_cached_counts(message, counts)
+    return ReactionChange(message.id, message.conversation_id, None, counts, existing is not None)
@@ -0,0 +1,231 @@
+"""Retention engine enforcing ``ChatSettings.auto_delete_after_days``.
+
+Expired rows are removed in small, index-driven chunks, each chunk in its own
+short transaction followed by a pause, so SQLite's write lock is released
+often and live chat writes interleave with the purge:
+
+1. For each user with a retention window, walk their conversations created
+   before the cutoff (``chat_conv_user_created_idx``).
+2. Per conversation, select up to ``chunk_size`` expired message ids via
+   ``chat_msg_conv_ts_idx``, optionally append them to a gzip NDJSON archive,
+   delete their dependent rows and then the messages with raw DELETEs (no
+   model instances, no per-row signals; FTS triggers still fire).
+3. Delete conversations last updated before the cutoff that have no messages
+   left, and drop their cached share links. That only reaches the servers
+   through a shared cache; ``enforce_retention`` refuses a per-process one.
+
+Archives use the NDJSON export record format, each conversation record
+written before the first of its messages, so they can be restored with
+``import_conversations``: into the original conversation when it still
+exists, otherwise into a new one with the original title and timestamps.
+"""
+from __future__ import annotations
+
+import gzip
+import json
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, TextIO
+
+from django.db import models, transaction
+from django.utils import timezone
+
+from chat.history_cache import history_cache
+from chat.models import ChatSettings, Conversation, ConversationShare, Message
+from chat.services.body_service import purge_orphan_bodies
+from chat.services.export_service import MESSAGE_FIELDS, inflate_message_rows, message_record
+from chat.services.share_service import invalidate_snapshot, invalidate_token
+
+
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_PAUSE = 0.05
+
+
+@dataclass(slots=True)
+class RetentionStats:
+    users: int = 0
+    messages_deleted: int = 0
+    conversations_deleted: int = 0
+    archived: int = 0
+    chunks: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        total = self.messages_deleted + self.conversations_deleted
+        return total / self.elapsed if self.elapsed else 0.0
+
+
+def _raw_delete_cascade(model, ids: list) -> None:
+    """Delete ``ids`` and their CASCADE dependents, transitively, with plain DELETE statements.
+
+    Unlike ``QuerySet.delete()`` this never loads model instances or sends
+    per-row signals. Rows still referenced through PROTECT or RESTRICT, and
+    relations this cannot honour with a raw DELETE (SET_NULL, SET_DEFAULT,
+    SET), raise instead of being left dangling.
+    """
+    for rel in model._meta.related_objects:
+        dependents = rel.related_model._base_manager.filter(**{f"{rel.field.name}__in": ids})
+        if rel.on_delete is models.DO_NOTHING:
+            continue
+        if rel.on_delete in (models.PROTECT, models.RESTRICT):
+            if dependents.exists():
+                raise models.ProtectedError(
+                    f"Cannot delete {model.__name__} rows referenced by {rel.related_model.__name__}.{rel.field.name}",
+                    set(),
+                )
+            continue
+        if rel.on_delete is not models.CASCADE:
+            raise NotImplementedError(
+                f"{rel.related_model.__name__}.{rel.field.name} uses {rel.on_delete.__name__}, "
+                f"which a raw delete cannot apply"
+            )
+        if rel.related_model._meta.related_objects:
+            # Their own dependents go first
+            _raw_delete_cascade(rel.related_model, list(dependents.values_list("pk", flat=True)))
+        else:
+            dependents._raw_delete(dependents.db)
+    qs = model._base_manager.filter(pk__in=ids)
+    qs._raw_delete(qs.db)
+
+
+class RetentionRunner:
+    def __init__(self, chunk_size: int = DEFAULT_CHUNK_SIZE, pause: float = DEFAULT_PAUSE,
+                 archive_dir: str | Path | None = None, dry_run: bool = False,
+                 on_progress: Callable[[RetentionStats], None] | None = None):
+        self.chunk_size = chunk_size
+        self.pause = pause
+        self.archive_dir = Path(archive_dir) if archive_dir else None
+        self.dry_run = dry_run
+        self.on_progress = on_progress
+        self.stats = RetentionStats()
+        self._started = 0.0
+        self._archived_conversations: set[uuid.UUID] = set()
+
+    def run(self, now: datetime | None = None) -> RetentionStats:
+        now = now or timezone.now()
+        self._started = time.perf_counter()
+        policies = (
+            ChatSettings.objects.filter(auto_delete_after_days__gt=0)
+            .values_list("user_id", "auto_delete_after_days")
+            .order_by("user_id")
+        )
+        for user_id, days in list(policies):
+            self.stats.users += 1
+            self.purge_user(user_id, now - timedelta(days=days))
+        if not self.dry_run and self.stats.messages_deleted:
+            purge_orphan_bodies(self.chunk_size)
+        self._report()
+        return self.stats
+
+    def purge_user(self, user_id: int, cutoff: datetime) -> None:
+        archive = self._open_archive(user_id) if self.archive_dir and not self.dry_run else None
+        try:
+            conversation_ids = list(
+                Conversation.objects.filter(user_id=user_id, created_at__lt=cutoff).values_list("id", flat=True)
+            )
+            for conversation_id in conversation_ids:
+                self._purge_messages(user_id, conversation_id, cutoff, archive)
+            self._purge_conversations(user_id, cutoff, archive)
+        finally:
+            if archive is not None:
+                archive.close()
+            if not self.dry_run:
+                # Raw deletes bypass the signals that keep cached history current
+                history_cache.invalidate_user(user_id)
+
+    def _purge_messages(self, user_id: int, conversation_id: uuid.UUID, cutoff: datetime, archive: TextIO | None) -> None:
+        expired = Message.objects.filter(conversation_id=conversation_id, timestamp__lt=cutoff).order_by("timestamp")
+        if self.dry_run:
+            self.stats.messages_deleted += expired.count()
+            return
+        touched = False
+        while True:
+            with transaction.atomic():
+                if archive is not None:
+                    rows = list(inflate_message_rows(expired.values_list(*MESSAGE_FIELDS)[:self.chunk_size]))
+                    ids = [row[0] for row in rows]
+                    if rows and conversation_id not in self._archived_conversations:
+                        self._archive_conversation(archive, *Conversation.objects.filter(pk=conversation_id)
+                                                   .values_list("id", "title", "created_at", "updated_at").get())
+                    for row in rows:
+                        archive.write(json.dumps({"type": "message", **message_record(user_id, str(conversation_id), row)},
+                                                 ensure_ascii=False) + "\n")
+                    self.stats.archived += len(rows)
+                else:
+                    ids = list(expired.values_list("id", flat=True)[:self.chunk_size])
+                if not ids:
+                    break
+                _raw_delete_cascade(Message, ids)
+            touched = True
+            self.stats.messages_deleted += len(ids)
+            self._tick()
+            if len(ids) < self.chunk_size:
+                break
+        if touched:
+            invalidate_snapshot(conversation_id)
+
+    def _purge_conversations(self, user_id: int, cutoff: datetime, archive: TextIO | None) -> None:
+        empty = Conversation.objects.filter(user_id=user_id, updated_at__lt=cutoff, messages__isnull=True)
+        if self.dry_run:
+            # Nothing was deleted: count the conversations the message purge would have emptied too
+            kept = Message.objects.filter(conversation__user_id=user_id, timestamp__gte=cutoff)
+            expiring = Conversation.objects.filter(user_id=user_id, updated_at__lt=cutoff).exclude(
+                id__in=kept.values("conversation_id"))
+            self.stats.conversations_deleted += expiring.count()
+            return
+        while True:
+            with transaction.atomic():
+                rows = list(empty.values_list("id", "title", "created_at", "updated_at")[:self.chunk_size])
+                if not rows:
+                    break
+                ids = [row[0] for row in rows]
+                tokens = list(ConversationShare.objects.filter(conversation_id__in=ids)
+                              .values_list("share_token", flat=True))
+                if archive is not None:
+                    for row in rows:
+                        if row[0] not in self._archived_conversations:
+                            self._archive_conversation(archive, *row)
+                _raw_delete_cascade(Conversation, ids)
+            for conv_id in ids:
+                invalidate_snapshot(conv_id)
+            # The raw delete sends no signal; cached share targets would point at deleted conversations
+            for token in tokens:
+                invalidate_token(token)
+            self.stats.conversations_deleted += len(ids)
+            self._tick()
+            if len(ids) < self.chunk_size:
+                break
+
+    def _archive_conversation(self, archive: TextIO, conv_id: uuid.UUID, title: str | None,
+                              created_at: datetime, updated_at: datetime) -> None:
+        archive.write(json.dumps({
+            "type": "conversation", "id": str(conv_id), "title": title,
+            "created_at": created_at.isoformat(), "updated_at": updated_at.isoformat(),
+        }, ensure_ascii=False) + "\n")
+        self._archived_conversations.add(conv_id)
+
+    def _open_archive(self, user_id: int) -> TextIO:
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        path = self.archive_dir / f"retention-user{user_id}-{timezone.now():%Y%m%dT%H%M%S}.ndjson.gz"
+        return gzip.open(path, "at", encoding="utf-8")
+
+    def _report(self) -> None:
+        self.stats.elapsed = time.perf_counter() - self._started
+        if self.on_progress:
+            self.on_progress(self.stats)
+
+    def _tick(self) -> None:
+        """Called after each committed chunk: report, then yield the write lock to live traffic."""
+        self.stats.chunks += 1
+        self._report()
+        if self.pause:
+            time.sleep(self.pause)
+
+
+def enforce_retention(**kwargs) -> RetentionStats:
+    """Run one retention pass; see ``RetentionRunner`` for options."""
+    return RetentionRunner(**kwargs).run()
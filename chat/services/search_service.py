@@ -0,0 +1,190 @@
+"""Full-text search over a user's message history.
+
+On SQLite the search runs against the ``chat_message_fts`` FTS5 table created
+by migration ``0004_message_search_index`` (kept in sync by triggers). Other
+database backends fall back to an ``icontains`` scan.
+"""
+from __future__ import annotations
+
+import re
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable
+
+from django.db import connection, transaction
+from graphql_relay import cursor_to_offset, offset_to_cursor
+
+from authentication.models import User
+from chat.compression import inflate
+from chat.models import Message
+
+
+FTS_TABLE = "chat_message_fts"
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+SNIPPET_TOKENS = 12
+HIGHLIGHT_OPEN = "<mark>"
+HIGHLIGHT_CLOSE = "</mark>"
+
+# bm25 column weights: content, owner, message_id, conversation_id
+_BM25_WEIGHTS = "10.0, 0.0, 0.0, 0.0"
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+
+@dataclass(slots=True)
+class SearchHit:
+    message_id: str
+    conversation_id: str
+    snippet: str
+    score: float
+    sender: str | None
+    timestamp: datetime | None
+
+
+@dataclass(slots=True)
+class SearchPage:
+    hits: list[SearchHit]
+    end_cursor: str | None
+    has_next_page: bool
+
+
+def fts_available() -> bool:
+    return connection.vendor == "sqlite"
+
+
+def build_match_expression(user_id: int, query: str) -> str | None:
+    """Turn free text into a safe FTS5 MATCH expression scoped to one owner.
+
+    Every term is quoted so user input can never inject FTS5 operators; the
+    last term gets a prefix wildcard for type-ahead search.
+    """
+    terms = _TERM_RE.findall(query or "")
+    if not terms:
+        return None
+    quoted = [f'"{t}"' for t in terms]
+    quoted[-1] += "*"
+    return f'owner:"u{user_id}" AND content:({" ".join(quoted)})'
+
+
+def _page_bounds(first: int | None, after: str | None) -> tuple[int, int]:
+    limit = max(1, min(first or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+    offset = 0
+    if after:
+        parsed = cursor_to_offset(after)
+        if parsed is not None:
+            offset = parsed + 1
+    return limit, offset
+
+
+def search_messages(user: User, query: str, first: int | None = None, after: str | None = None) -> SearchPage:
+    """Return one ranked, snippet-highlighted page of the user's messages matching ``query``."""
+    limit, offset = _page_bounds(first, after)
+    if fts_available():
+        rows = _fts_search(user.id, query, limit + 1, offset)
+    else:
+        rows = _fallback_search(user, query, limit + 1, offset)
+
+    has_next = len(rows) > limit
+    rows = rows[:limit]
+
+    # One query for sender/timestamp of the whole page
+    messages = Message.objects.select_related("sender").in_bulk([uuid.UUID(r[0]) for r in rows])
+    hits = []
+    for message_id, conversation_id, snippet, score in rows:
+        msg = messages.get(uuid.UUID(message_id))
+        hits.append(SearchHit(
+            message_id=str(uuid.UUID(message_id)),
+            conversation_id=str(uuid.UUID(conversation_id)),
+            snippet=snippet,
+            score=score,
+            sender=getattr(getattr(msg, "sender", None), "username", None),
+            timestamp=getattr(msg, "timestamp", None),
+        ))
+    end_cursor = offset_to_cursor(offset + len(hits) - 1) if hits else None
+    return SearchPage(hits=hits, end_cursor=end_cursor, has_next_page=has_next)
+
+
+def _fts_search(user_id: int, query: str, limit: int, offset: int) -> list[tuple[str, str, str, float]]:
+    expression = build_match_expression(user_id, query)
+    if not expression:
+        return []
+    sql = (
+        f"SELECT message_id, conversation_id, "
+        f"snippet({FTS_TABLE}, 0, %s, %s, '…', %s), "
+        f"bm25({FTS_TABLE}, {_BM25_WEIGHTS}) AS score "
+        f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+        f"ORDER BY score LIMIT %s OFFSET %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [HIGHLIGHT_OPEN, HIGHLIGHT_CLOSE, SNIPPET_TOKENS, expression, limit, offset])
+        return [(r[0], r[1], r[2], float(r[3])) for r in cursor.fetchall()]
+
+
+def _fallback_search(user: User, query: str, limit: int, offset: int) -> list[tuple[str, str, str, float]]:
+    # Non-SQLite backends only; compacted bodies (see body_service) are not matched here
+    query = (query or "").strip()
+    if not query:
+        return []
+    qs = (
+        Message.objects.filter(conversation__user=user, content__icontains=query)
+        .order_by("-timestamp")
+        .values_list("id", "conversation_id", "content")[offset:offset + limit]
+    )
+    return [(m_id.hex, c_id.hex, content[:200], 0.0) for m_id, c_id, content in qs]
+
+
+def index_plaintext(pairs: Iterable[tuple[uuid.UUID, str]]) -> None:
+    """Index the real text of compacted messages (the trigger only sees the empty column)."""
+    pairs = [(text, message_id.hex) for message_id, text in pairs]
+    if not pairs or not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"UPDATE {FTS_TABLE} SET content = %s WHERE rowid = (SELECT rowid FROM chat_message WHERE id = %s)",
+            pairs,
+        )
+
+
+def _index_compacted(batch_size: int) -> None:
+    rows = (
+        Message.objects.filter(body__isnull=False)
+        .values_list("id", "body_id", "body__data")
+        .iterator(chunk_size=batch_size)
+    )
+    batch = []
+    for message_id, digest, data in rows:
+        batch.append((message_id, inflate(digest, data)))
+        if len(batch) >= batch_size:
+            index_plaintext(batch)
+            batch = []
+    index_plaintext(batch)
+
+
+def rebuild_index(batch_size: int = 10_000) -> int:
+    """Drop and repopulate the FTS index from ``chat_message``; returns rows indexed."""
+    if not fts_available():
+        return 0
+    indexed = 0
+    with connection.cursor() as cursor:
+        with transaction.atomic():
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        last_rowid = 0
+        while True:
+            with transaction.atomic():
+                cursor.execute(
+                    f"INSERT INTO {FTS_TABLE}(rowid, content, owner, message_id, conversation_id) "
+                    f"SELECT m.rowid, m.content, 'u' || c.user_id, m.id, m.conversation_id "
+                    f"FROM chat_message m JOIN chat_conversation c ON c.id = m.conversation_id "
+                    f"WHERE m.rowid > %s ORDER BY m.rowid LIMIT %s",
+                    [last_rowid, batch_size],
+                )
+                inserted = cursor.rowcount
+                if inserted <= 0:
+                    break
+                cursor.execute(f"SELECT MAX(rowid) FROM {FTS_TABLE}")
+                last_rowid = cursor.fetchone()[0]
+            indexed += inserted
+        _index_compacted(batch_size)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    return indexed
@@ -0,0 +1,190 @@
+"""Public, cached read access to shared conversations.
+
+A share page is rendered once into a JSON snapshot (body bytes + ETag +
+Last-Modified) and kept in the Django cache, keyed by conversation id. The
+``chat.signals`` handlers drop the snapshot whenever the conversation or one
+of its messages changes, and drop the token lookup when the share changes.
+
+View counts are aggregated in process by ``ViewCounter`` and written back by
+a background thread every ``SHARE_VIEW_FLUSH_INTERVAL`` seconds (and at exit)
+with an ``F('view_count') + n`` UPDATE per share, so a hot link costs one
+cache read per hit and one UPDATE per interval instead of one UPDATE per hit.
+Counts that fail to write are kept for the next flush.
+"""
+from __future__ import annotations
+
+import atexit
+import hashlib
+import json
+import threading
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from chat.models import Conversation, ConversationShare, Message
+from chat.services.body_service import inflate_rows
+
+
+SNAPSHOT_KEY = "share:snapshot:{conversation_id}"
+TOKEN_KEY = "share:token:{token}"
+
+
+@dataclass(slots=True)
+class ShareSnapshot:
+    body: bytes
+    etag: str
+    last_modified: datetime
+
+
+@dataclass(slots=True)
+class ShareTarget:
+    share_id: int
+    conversation_id: uuid.UUID
+    expires_at: datetime | None
+
+    @property
+    def is_expired(self) -> bool:
+        return self.expires_at is not None and timezone.now() > self.expires_at
+
+
+def _cache_timeout() -> int:
+    return getattr(settings, "SHARE_CACHE_TIMEOUT", 60 * 60)
+
+
+def get_share_target(token: uuid.UUID) -> ShareTarget | None:
+    """Resolve a public share token (cached); ``None`` when unknown or not public."""
+    key = TOKEN_KEY.format(token=token)
+    cached = cache.get(key)
+    if cached is None:
+        row = (
+            ConversationShare.objects.filter(share_token=token, is_public=True)
+            .values_list("id", "conversation_id", "expires_at")
+            .first()
+        )
+        cached = ShareTarget(*row) if row else False
+        cache.set(key, cached, _cache_timeout())
+    return cached or None
+
+
+def build_snapshot(conversation_id: uuid.UUID) -> ShareSnapshot:
+    conv = Conversation.objects.select_related("user").get(pk=conversation_id)
+    messages = [
+        row[:4] for row in inflate_rows(
+            Message.objects.filter(conversation_id=conversation_id)
+            .order_by("timestamp")
+            .values_list("sender_id", "content", "message_type", "timestamp", "body_id"),
+            content_index=1, body_index=4,
+        )
+    ]
+    last_modified = max([conv.updated_at] + [m[3] for m in messages[-1:]])
+    payload = {
+        "title": conv.title or f"Conversation {conv.created_at.strftime('%Y-%m-%d')}",
+        "created_at": conv.created_at.isoformat(),
+        "messages": [
+            {
+                "kind": "user" if sender_id == conv.user_id else "bot",
+                "content": content,
+                "message_type": message_type,
+                "timestamp": ts.isoformat(),
+            }
+            for sender_id, content, message_type, ts in messages
+        ],
+    }
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+    return ShareSnapshot(body=body, etag=etag, last_modified=last_modified)
+
+
+def get_snapshot(conversation_id: uuid.UUID) -> ShareSnapshot:
+    key = SNAPSHOT_KEY.format(conversation_id=conversation_id)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_snapshot(conversation_id)
+        cache.set(key, snapshot, _cache_timeout())
+    return snapshot
+
+
+def invalidate_snapshot(conversation_id: uuid.UUID) -> None:
+    cache.delete(SNAPSHOT_KEY.format(conversation_id=conversation_id))
+
+
+def invalidate_token(token: uuid.UUID) -> None:
+    cache.delete(TOKEN_KEY.format(token=token))
+
+
+class ViewCounter:
+    """Thread-safe in-memory view counter, flushed to the DB every ``interval`` seconds by a daemon thread."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._pending: dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._flusher: threading.Thread | None = None
+        self._stopping = threading.Event()
+
+    def hit(self, share_id: int) -> None:
+        with self._lock:
+            self._pending[share_id] = self._pending.get(share_id, 0) + 1
+            if self._flusher is None or not self._flusher.is_alive():
+                # Started on first use, so management commands and tests that never count views stay thread-free
+                self._stopping.clear()
+                self._flusher = threading.Thread(target=self._run, name="share-view-flusher", daemon=True)
+                self._flusher.start()
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.interval):
+            try:
+                try:
+                    self.flush()
+                finally:
+                    close_old_connections()
+            except Exception as e:
+                # Anything escaping here would end the thread and leave counts unwritten until restart
+                print(f"[SHARE] Failed to flush view counts, retrying in {self.interval:g}s: {e}")
+
+    def stop(self) -> None:
+        """Stop the flusher thread, if any; the next ``hit`` starts a new one."""
+        self._stopping.set()
+        if self._flusher is not None:
+            self._flusher.join()
+
+    def pending(self, share_id: int) -> int:
+        with self._lock:
+            return self._pending.get(share_id, 0)
+
+    def flush(self) -> int:
+        """Write pending counts with ``F()`` increments; returns the number of views written."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        written = 0
+        try:
+            for share_id, count in list(pending.items()):
+                ConversationShare.objects.filter(pk=share_id).update(view_count=F("view_count") + count)
+                del pending[share_id]
+                written += count
+        except Exception:
+            # Put back what was not written, merged with hits counted meanwhile
+            with self._lock:
+                for share_id, count in pending.items():
+                    self._pending[share_id] = self._pending.get(share_id, 0) + count
+            raise
+        return written
+
+
+view_counter = ViewCounter(getattr(settings, "SHARE_VIEW_FLUSH_INTERVAL", 10.0))
+
+
+def _flush_at_exit() -> None:
+    try:
+        view_counter.flush()
+    except Exception as e:  # pragma: no cover - interpreter shutdown
+        print(f"[SHARE] Failed to flush view counts: {e}")
+
+
+atexit.register(_flush_at_exit)
@@ -0,0 +1,35 @@
+"""Model signal handlers for the chat app (connected in ChatConfig.ready)."""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from chat.history_cache import history_cache
+from chat.models import Conversation, ConversationShare, Message
+from chat.services.share_service import invalidate_snapshot, invalidate_token
+
+
+@receiver([post_save, post_delete], sender=Message)
+def message_changed(sender, instance: Message, **kwargs):
+    invalidate_snapshot(instance.conversation_id)
+
+
+@receiver(post_save, sender=Message)
+def message_saved(sender, instance: Message, created: bool, **kwargs):
+    owner_id = history_cache.owner_of(instance.conversation_id)
+    if owner_id is not None:
+        history_cache.message_saved(instance, owner_id, created)
+
+
+@receiver(post_delete, sender=Message)
+def message_deleted(sender, instance: Message, **kwargs):
+    history_cache.invalidate_conversation(instance.conversation_id)
+
+
+@receiver([post_save, post_delete], sender=Conversation)
+def conversation_changed(sender, instance: Conversation, **kwargs):
+    invalidate_snapshot(instance.pk)
+    history_cache.conversation_changed(instance.user_id, instance.pk, deleted='created' not in kwargs)
+
+
+@receiver([post_save, post_delete], sender=ConversationShare)
+def share_changed(sender, instance: ConversationShare, **kwargs):
+    invalidate_token(instance.share_token)
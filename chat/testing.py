@@ -0,0 +1,40 @@
+"""Helpers shared by the socket tests in ``chat/tests``: authenticated connections and a canned provider stream."""
+from contextlib import contextmanager
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from channels.testing import WebsocketCommunicator
+from graphql_jwt.shortcuts import get_token
+
+from chat.consumers import ChatConsumer
+
+
+async def fake_stream(user_message, memories=None):
+    yield f"re: {user_message}"
+
+
+@contextmanager
+def stub_provider(stream=fake_stream):
+    """Answer with ``stream`` instead of calling the provider, with memory recall off."""
+    with mock.patch("chat.service.ai_stream", stream), mock.patch("chat.service.CHAT_MEMORY_ENABLED", False):
+        yield
+
+
+async def connect(user, path="/ws/chat/", **auth) -> tuple[WebsocketCommunicator, dict]:
+    """A socket authenticated as ``user`` by a token frame (with extra ``auth`` fields such as ``last_seen``),
+    and the frame that follows AUTH_OK: the history, or ``resumed`` when resuming."""
+    ws = WebsocketCommunicator(ChatConsumer.as_asgi(), path)
+    await ws.connect()
+    await ws.receive_json_from()  # Connected
+    await ws.send_json_to({"token": await sync_to_async(get_token)(user), **auth})
+    frame = await ws.receive_json_from()
+    assert frame.get("code") == "AUTH_OK", frame
+    return ws, await ws.receive_json_from()
+
+
+async def receive_reply(ws: WebsocketCommunicator, timeout: float = 2) -> list[dict]:
+    """Frames received up to and including the bot message that completes a reply."""
+    frames = [await ws.receive_json_from(timeout=timeout)]
+    while frames[-1].get("kind") != "bot":
+        frames.append(await ws.receive_json_from(timeout=timeout))
+    return frames
@@ -0,0 +1,74 @@
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+
+from chat.models import Conversation, Message, MessageBody
+from chat.services.body_service import compact_existing, inflate_rows, purge_orphan_bodies
+from chat.services.export_service import iter_messages
+from chat.services.search_service import search_messages
+
+User = get_user_model()
+
+LONG_TEXT = "Here is a detailed walkthrough of SQLite write-ahead logging. " * 40
+
+
+@override_settings(MESSAGE_COMPRESSION_THRESHOLD=1024)
+class MessageBodyTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="alice", password="pass1234")
+        self.conv = Conversation.objects.create(user=self.user)
+
+    def test_large_content_is_compacted_and_read_transparently(self):
+        msg = Message.objects.create(conversation=self.conv, sender=self.user, content=LONG_TEXT)
+        raw = Message.objects.filter(pk=msg.pk).values_list("content", "body_id").get()
+        self.assertEqual(raw, ("", msg.body_id))
+        self.assertLess(MessageBody.objects.get().size, len(LONG_TEXT) + 1)
+        self.assertLess(len(MessageBody.objects.get().data), len(LONG_TEXT) // 4)
+
+        fresh = Message.objects.get(pk=msg.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(fresh.content, LONG_TEXT)
+        joined = Message.objects.select_related("body").get(pk=msg.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(joined.content, LONG_TEXT)
+
+    def test_small_content_stays_inline_and_bodies_are_deduplicated(self):
+        short = Message.objects.create(conversation=self.conv, sender=self.user, content="hi")
+        a = Message.objects.create(conversation=self.conv, sender=self.user, content=LONG_TEXT)
+        b = Message.objects.create(conversation=self.conv, sender=self.user, content=LONG_TEXT)
+        self.assertIsNone(short.body_id)
+        self.assertEqual(a.body_id, b.body_id)
+        self.assertEqual(MessageBody.objects.count(), 1)
+
+        b.content = "now short"
+        b.save()
+        self.assertEqual(Message.objects.get(pk=b.pk).content, "now short")
+        a.delete()
+        self.assertEqual(purge_orphan_bodies(), 1)
+        self.assertFalse(MessageBody.objects.exists())
+
+    def test_search_and_export_see_plaintext(self):
+        msg = Message.objects.create(conversation=self.conv, sender=self.user, content=LONG_TEXT)
+        hits = search_messages(self.user, "walkthrough").hits
+        self.assertEqual([h.message_id for h in hits], [str(msg.id)])
+        records = list(iter_messages(self.user, str(self.conv.id)))
+        self.assertEqual(records[-1]["content"], LONG_TEXT)
+
+    def test_inflate_rows_resolves_bodies_in_one_query(self):
+        for _ in range(3):
+            Message.objects.create(conversation=self.conv, sender=self.user, content=LONG_TEXT)
+        Message.objects.create(conversation=self.conv, sender=self.user, content="short")
+        rows = Message.objects.values_list("content", "body_id")
+        with self.assertNumQueries(2):
+            contents = [r[0] for r in inflate_rows(rows, content_index=0, body_index=1)]
+        self.assertEqual(sorted(contents), sorted([LONG_TEXT] * 3 + ["short"]))
+
+    def test_compact_existing_moves_inline_rows(self):
+        with self.settings(MESSAGE_COMPRESSION_THRESHOLD=0):
+            msg = Message.objects.create(conversation=self.conv, sender=self.user, content=LONG_TEXT)
+        self.assertIsNone(msg.body_id)
+        stats = compact_existing(batch_size=10)
+        self.assertEqual((stats.scanned, stats.compacted), (1, 1))
+        msg.refresh_from_db()
+        self.assertIsNotNone(msg.body_id)
+        self.assertEqual(msg.content, LONG_TEXT)
+        self.assertEqual(len(search_messages(self.user, "walkthrough").hits), 1)
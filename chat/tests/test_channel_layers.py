@@ -0,0 +1,43 @@
+from django.test import SimpleTestCase
+
+from chat.loadtest import percentile
+from chat.management.commands.bench_fanout import summarize
+from core.channels.layers import build_channel_layer, channel_layer_config
+
+
+class ChannelLayerProfileTests(SimpleTestCase):
+    def test_profiles(self):
+        pubsub = channel_layer_config("redis-pubsub", url="redis://a:6379/2, redis://b:6379/2", prefix="p")
+        self.assertEqual(pubsub, {"BACKEND": "channels_redis.pubsub.RedisPubSubChannelLayer",
+                                  "CONFIG": {"hosts": ["redis://a:6379/2", "redis://b:6379/2"], "prefix": "p"}})
+        core = channel_layer_config("redis", capacity=500, expiry=10, group_expiry=7200)
+        self.assertEqual(core["BACKEND"], "channels_redis.core.RedisChannelLayer")
+        self.assertEqual((core["CONFIG"]["capacity"], core["CONFIG"]["expiry"], core["CONFIG"]["group_expiry"]),
+                         (500, 10, 7200))
+        with self.assertRaises(ValueError):
+            channel_layer_config("rabbitmq")
+
+    def test_redis_layers_build_without_connecting(self):
+        for profile, name in (("redis-pubsub", "RedisPubSubChannelLayer"), ("redis", "RedisChannelLayer")):
+            layer = build_channel_layer(channel_layer_config(profile, url="redis://127.0.0.1:1/0"))
+            self.assertEqual(type(layer).__name__, name)
+
+    async def test_memory_profile_fans_out_to_group(self):
+        layer = build_channel_layer(channel_layer_config("memory", capacity=2))
+        channels = [await layer.new_channel() for _ in range(3)]
+        for channel in channels:
+            await layer.group_add("user_1", channel)
+        for seq in range(3):
+            await layer.group_send("user_1", {"type": "chat.message", "seq": seq})
+        # Each member keeps at most `capacity` messages; the rest are dropped, not queued without bound
+        received = [[(await layer.receive(channel))["seq"] for _ in range(2)] for channel in channels]
+        self.assertEqual(received, [[0, 1]] * 3)
+
+
+class FanoutSummaryTests(SimpleTestCase):
+    def test_summary(self):
+        latencies = [float(n) for n in range(1, 101)]
+        result = summarize(latencies, published=10, expected=110, elapsed=2.0)
+        self.assertEqual((result["delivered"], result["lost"], result["delivered_per_second"]), (100, 10, 50.0))
+        self.assertEqual(result["latency_ms"], {"p50": 50.0, "p95": 95.0, "p99": 99.0, "max": 100.0})
+        self.assertEqual(percentile([], 0.5), 0.0)
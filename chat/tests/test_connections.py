@@ -0,0 +1,105 @@
+import asyncio
+import time
+from unittest import mock
+
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.test import TransactionTestCase, override_settings
+
+from chat.connections import (AUTH_TIMEOUT_CLOSE_CODE, HEARTBEAT_TIMEOUT_CLOSE_CODE, IDLE_CLOSE_CODE,
+                              registry)
+from chat.consumers import ChatConsumer
+from chat.history_cache import history_cache
+from chat.testing import connect
+
+User = get_user_model()
+
+
+def reap_after(seconds):
+    """Run a reaper pass as if ``seconds`` had passed."""
+    registry.reap(now=time.monotonic() + seconds)
+
+
+@override_settings(CHAT_WS_REAP_INTERVAL_SECONDS=3600, CHAT_WS_PING_INTERVAL_SECONDS=25,
+                   CHAT_WS_PONG_TIMEOUT_SECONDS=20, CHAT_WS_IDLE_TIMEOUT_SECONDS=1800,
+                   CHAT_WS_AUTH_TIMEOUT_SECONDS=30, CHAT_WS_ACTIVE_WINDOW_SECONDS=60)
+class ConnectionReaperTests(TransactionTestCase):
+    def setUp(self):
+        history_cache.clear()
+        self.user = User.objects.create_user(username="alice", password="pass1234")
+
+    async def _connect(self, path="/ws/chat/", authenticate=True):
+        if authenticate:
+            ws, _ = await connect(self.user, path)
+            return ws
+        ws = WebsocketCommunicator(ChatConsumer.as_asgi(), path)
+        await ws.connect()
+        await ws.receive_json_from()  # Connected
+        return ws
+
+    async def _closed_with(self, ws):
+        while True:
+            output = await ws.receive_output(timeout=2)
+            if output["type"] == "websocket.close":
+                return output.get("code")
+
+    async def test_ping_pong_and_dead_socket(self):
+        ws = await self._connect("/ws/chat/?heartbeat=1")
+        await ws.send_json_to({"type": "ping", "t": 7})
+        self.assertEqual(await ws.receive_json_from(), {"type": "pong", "t": 7})
+
+        reap_after(30)
+        self.assertEqual((await ws.receive_json_from())["type"], "ping")
+        self.assertEqual(registry.gauges()["awaiting_pong"], 1)
+        reap_after(35)  # one ping per interval
+        self.assertTrue(await ws.receive_nothing(0.1))
+
+        reaped = registry.stats.reaped_dead
+        reap_after(50)
+        self.assertEqual(await self._closed_with(ws), HEARTBEAT_TIMEOUT_CLOSE_CODE)
+        self.assertEqual(registry.stats.reaped_dead, reaped + 1)
+        await ws.disconnect()
+        self.assertEqual(len(registry), 0)
+
+    async def test_pong_is_liveness_not_activity(self):
+        ws = await self._connect("/ws/chat/?heartbeat=1")
+        (connection,) = registry._connections.values()
+        received, activity = connection.last_received, connection.last_activity
+        reap_after(30)
+        await ws.receive_json_from()  # ping
+        await ws.send_json_to({"type": "pong"})
+        self.assertTrue(await ws.receive_nothing(0.05))
+        self.assertGreater(connection.last_received, received)
+        self.assertEqual(connection.last_activity, activity)
+        await ws.disconnect()
+
+    async def test_idle_socket_is_closed(self):
+        ws = await self._connect()
+        reap_after(120)
+        gauges = registry.gauges()
+        self.assertEqual((gauges["connections"], gauges["authenticated"], gauges["active"], gauges["idle"]),
+                         (1, 1, 0, 1))
+        self.assertTrue(await ws.receive_nothing(0.1))  # no heartbeat requested: never pinged
+
+        reap_after(1801)
+        self.assertEqual(await self._closed_with(ws), IDLE_CLOSE_CODE)
+        await ws.disconnect()
+
+    async def test_unauthenticated_socket_is_closed(self):
+        ws = await self._connect(authenticate=False)
+        await ws.send_json_to({"type": "ping"})
+        await ws.receive_json_from()  # pong
+        reap_after(31)
+        self.assertEqual(await self._closed_with(ws), AUTH_TIMEOUT_CLOSE_CODE)
+        await ws.disconnect()
+
+    async def test_socket_without_close_handshake_is_cleaned_up(self):
+        ws = await self._connect()
+        with mock.patch.object(ChatConsumer, "reap") as reap:
+            reap_after(1801)
+        reap.assert_called_once_with(IDLE_CLOSE_CODE, "idle timeout")
+        cleanups = registry.stats.forced_cleanups
+        reap_after(1812)
+        await asyncio.sleep(0.05)
+        self.assertEqual((registry.stats.forced_cleanups, len(registry)), (cleanups + 1, 0))
+        await ws.disconnect()
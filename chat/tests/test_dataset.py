@@ -0,0 +1,58 @@
+import json
+
+from django.contrib.auth import authenticate
+from django.test import TestCase
+
+from authentication.models import User
+from chat.benchmarks import BENCHMARKS, build_fixture, compare, count_queries, run_benchmark
+from chat.models import Conversation, Message
+from chat.services.dataset_service import DATASET_PASSWORD, generate_dataset
+
+
+class GenerateDatasetTests(TestCase):
+    def test_counts_and_shape(self):
+        progress = []
+        result = generate_dataset(3, 2, 13, prefix="t", batch_size=4, on_progress=progress.append)
+        self.assertEqual((result.users, result.conversations, result.messages), (3, 6, 13))
+        self.assertGreater(len(progress), 2)
+        self.assertEqual(Message.objects.filter(conversation__user__username__startswith="t-").count(), 13)
+
+        user = User.objects.get(username="t-0")
+        conversations = list(Conversation.objects.filter(user=user).order_by("created_at"))
+        self.assertEqual(len(conversations), 2)
+        self.assertEqual(sum(c.is_active for c in conversations), 1)
+        # 13 messages over 6 conversations: 3 for the first, 2 for the others
+        messages = list(Message.objects.filter(conversation__user=user).order_by("conversation", "timestamp"))
+        self.assertEqual(len(messages), 5)
+        first = [m for m in messages if m.conversation_id == messages[0].conversation_id]
+        self.assertEqual([m.sender.username for m in first][:2], ["t-0", "Z-Chatbot"])
+        self.assertTrue(all(m.content for m in messages))
+        self.assertEqual(authenticate(username="t-1", password=DATASET_PASSWORD), User.objects.get(username="t-1"))
+
+
+class BenchmarkSuiteTests(TestCase):
+    def setUp(self):
+        generate_dataset(2, 2, 20, prefix="b")
+        self.fixture = build_fixture("b-0")
+
+    def test_every_benchmark_runs_and_writes_are_rolled_back(self):
+        users, messages = User.objects.count(), Message.objects.count()
+        results = {b.name: run_benchmark(b, self.fixture, iterations=1) for b in BENCHMARKS}
+        self.assertEqual((User.objects.count(), Message.objects.count()), (users, messages))
+        for name, result in results.items():
+            self.assertEqual(result["iterations"], 1, name)
+            self.assertGreater(result["latency_ms"]["max"], 0, name)
+            self.assertGreater(result["queries"], 0, name)
+        json.dumps(results)
+
+    def test_fixture_uses_busiest_conversation(self):
+        self.assertEqual(self.fixture.conversation.messages.count(), 5)
+        self.assertEqual(count_queries(lambda: self.fixture.graphql("{ conversations { id } }")), 2)
+
+    def test_compare(self):
+        def report(p50, ops, queries):
+            return {"results": {"x": {"latency_ms": {"p50": p50}, "ops_per_second": ops, "queries": queries}}}
+
+        self.assertEqual(compare(report(5.0, 200.0, 3), report(10.0, 100.0, 4)),
+                         {"x": {"p50_ratio": 0.5, "ops_ratio": 2.0, "queries_delta": -1}})
+        self.assertEqual(compare(report(5.0, 200.0, 3), {"results": {}}), {})
@@ -0,0 +1,54 @@
+import gzip
+import json
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from graphql_jwt.shortcuts import get_token
+
+from chat.models import Conversation, Message
+
+User = get_user_model()
+
+
+class ExportViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="alice", password="pass1234")
+        self.bot = User.objects.create_user(username="Z-Chatbot", password="pass1234")
+        self.conv = Conversation.objects.create(user=self.user, title="Trip")
+        Message.objects.create(conversation=self.conv, sender=self.user, content="Plan a trip")
+        Message.objects.create(conversation=self.conv, sender=self.bot, content="Sure — where to?")
+        other = User.objects.create_user(username="bob", password="pass1234")
+        self.foreign = Conversation.objects.create(user=other)
+        self.auth = {"HTTP_AUTHORIZATION": f"JWT {get_token(self.user)}"}
+
+    def _body(self, response):
+        return b"".join(response.streaming_content)
+
+    def test_requires_authentication(self):
+        self.assertEqual(self.client.get(reverse("chat-export")).status_code, 401)
+
+    def test_ndjson_export(self):
+        response = self.client.get(reverse("chat-export"), **self.auth)
+        self.assertEqual(response.status_code, 200)
+        records = [json.loads(line) for line in self._body(response).decode().splitlines()]
+        self.assertEqual([r["type"] for r in records], ["conversation", "message", "message"])
+        self.assertEqual([r.get("kind") for r in records[1:]], ["user", "bot"])
+
+    def test_json_export_gzip(self):
+        response = self.client.get(reverse("chat-export"), {"format": "json", "gzip": "1"}, **self.auth)
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        data = json.loads(gzip.decompress(self._body(response)))
+        self.assertEqual(data["conversations"][0]["title"], "Trip")
+        self.assertEqual(len(data["conversations"][0]["messages"]), 2)
+
+    def test_markdown_single_conversation(self):
+        url = reverse("chat-export-conversation", args=[self.conv.id])
+        body = self._body(self.client.get(url, {"format": "markdown"}, **self.auth)).decode()
+        self.assertIn("# Trip", body)
+        self.assertIn("Sure — where to?", body)
+
+    def test_foreign_conversation_and_bad_format(self):
+        url = reverse("chat-export-conversation", args=[self.foreign.id])
+        self.assertEqual(self.client.get(url, **self.auth).status_code, 404)
+        self.assertEqual(self.client.get(reverse("chat-export"), {"format": "xml"}, **self.auth).status_code, 400)
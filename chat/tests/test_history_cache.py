@@ -0,0 +1,117 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from chat.consumers import ChatConsumer
+from chat.history_cache import MISSING, HistoryCache, history_cache
+from chat.models import Conversation, Message
+from chat.replay import replay_buffer
+from chat.services.reaction_service import set_reaction
+from chat.testing import connect
+
+User = get_user_model()
+
+
+def entry(i, content="x"):
+    return {"id": str(i), "content": content, "sender": "u", "kind": "user", "timestamp": "", "reactions": {}}
+
+
+class HistoryCacheTests(SimpleTestCase):
+    def test_fill_get_and_ring_capacity(self):
+        cache = HistoryCache(capacity=3)
+        self.assertIsNone(cache.get(1, "c", 3))
+        cache.begin_fill(1, "c")
+        self.assertIsNone(cache.get(1, "c", 3))  # still loading
+        cache.fill(1, "c", [entry(i) for i in range(5)])
+        self.assertEqual([e["id"] for e in cache.get(1, "c", 2)], ["3", "4"])
+        self.assertIsNone(cache.get(1, "c", 10))  # more than is cached
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+
+        cache.begin_fill(1, "short")
+        cache.fill(1, "short", [entry(1)])
+        self.assertEqual(len(cache.get(1, "short", 50)), 1)  # whole conversation is cached
+
+    def test_evicts_least_recently_used_users(self):
+        cache = HistoryCache(capacity=5, max_users=2, max_bytes=10_000)
+        for user_id in (1, 2):
+            cache.begin_fill(user_id, f"c{user_id}")
+            cache.fill(user_id, f"c{user_id}", [entry(1)])
+        cache.get(1, "c1", 1)
+        cache.set_active(3, None)
+        self.assertEqual(len(cache), 2)
+        self.assertIs(cache.get_active(2), MISSING)
+        self.assertIsNotNone(cache.get(1, "c1", 1))
+
+        cache.begin_fill(3, "big")
+        cache.fill(3, "big", [entry(1, "x" * 20_000)])
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.nbytes, 0)
+
+    def test_invalidation_during_fill_skips_stale_read(self):
+        cache = HistoryCache()
+        cache.begin_fill(1, "c")
+        cache.invalidate_conversation("c")
+        cache.fill(1, "c", [entry(1)])
+        self.assertIsNone(cache.get(1, "c", 1))
+
+    def test_expired_user_is_reloaded(self):
+        cache = HistoryCache(ttl=0.000001)
+        cache.set_active(1, "c")
+        self.assertIs(cache.get_active(1), MISSING)
+
+
+class HistoryCacheSignalTests(TestCase):
+    def setUp(self):
+        history_cache.clear()
+        self.user = User.objects.create_user(username="alice", password="pass1234")
+        self.conversation = Conversation.objects.create(user=self.user)
+        self.first = Message.objects.create(conversation=self.conversation, sender=self.user, content="first")
+        history_cache.begin_fill(self.user.id, self.conversation.id)
+
+    def tearDown(self):
+        history_cache.clear()
+
+    def test_messages_saved_during_fill_are_merged(self):
+        racing = Message.objects.create(conversation=self.conversation, sender=self.user, content="racing")
+        history_cache.fill(self.user.id, self.conversation.id, [entry(self.first.id, "first")])
+        later = Message.objects.create(conversation=self.conversation, sender=self.user, content="later")
+        cached = history_cache.get(self.user.id, self.conversation.id, 10)
+        self.assertEqual([e["id"] for e in cached], [str(self.first.id), str(racing.id), str(later.id)])
+
+        later.content = "edited"
+        later.save()
+        self.assertEqual(history_cache.get(self.user.id, self.conversation.id, 1)[0]["content"], "edited")
+        later.delete()
+        self.assertIsNone(history_cache.get(self.user.id, self.conversation.id, 1))
+
+    def test_reaction_counts_are_refreshed_on_commit(self):
+        history_cache.fill(self.user.id, self.conversation.id, [entry(self.first.id, "first")])
+        with self.captureOnCommitCallbacks(execute=True):
+            set_reaction(self.user, self.first.id, "like")
+        self.assertEqual(history_cache.get(self.user.id, self.conversation.id, 1)[0]["reactions"], {"LIKE": 1})
+
+
+class CachedHistoryConsumerTests(TransactionTestCase):
+    def setUp(self):
+        history_cache.clear()
+        replay_buffer.clear()
+        self.user = User.objects.create_user(username="alice", password="pass1234")
+        conversation = Conversation.objects.create(user=self.user, title="hot")
+        for i in range(3):
+            Message.objects.create(conversation=conversation, sender=self.user, content=f"m{i}")
+
+    async def _history(self):
+        ws, history = await connect(self.user)
+        await ws.disconnect()
+        return history
+
+    async def test_second_connection_reads_history_from_cache(self):
+        first = await self._history()
+        with mock.patch.object(ChatConsumer, "_get_recent_messages") as load, \
+                mock.patch("chat.consumers.Conversation.objects") as conversations:
+            second = await self._history()
+        load.assert_not_called()
+        conversations.filter.assert_not_called()
+        self.assertEqual(second["messages"], first["messages"])
+        self.assertEqual([m["content"] for m in second["messages"]], ["m0", "m1", "m2"])
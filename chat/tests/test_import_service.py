@@ -0,0 +1,95 @@
+import gzip
+import json
+from datetime import datetime, timezone
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from graphql_jwt.shortcuts import get_token
+
+from chat.models import Conversation, Message
+from chat.services.import_service import import_ndjson
+
+User = get_user_model()
+
+
+def ndjson(*rows):
+    return [json.dumps(r) for r in rows]
+
+
+class ImportServiceTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="alice", password="pass1234")
+
+    def test_import_preserves_timestamps_and_senders(self):
+        rows = ndjson(
+            {"type": "conversation", "id": "c1", "title": "Old chat", "created_at": "2021-03-01T10:00:00Z"},
+            {"type": "message", "conversation_id": "c1", "kind": "user", "content": "hi", "timestamp": "2021-03-01T10:00:01Z"},
+            {"type": "message", "conversation_id": "c1", "role": "assistant", "content": "hello", "timestamp": "2021-03-01T10:00:02Z"},
+            {"type": "message", "conversation_id": "c2", "role": "user", "content": "implicit conversation"},
+        )
+        result = import_ndjson(self.user, rows, batch_size=2)
+        self.assertEqual((result.conversations, result.messages, result.skipped), (2, 3, 0))
+
+        conv = Conversation.objects.get(title="Old chat")
+        self.assertFalse(conv.is_active)
+        self.assertEqual(conv.created_at, datetime(2021, 3, 1, 10, 0, tzinfo=timezone.utc))
+        first, second = Message.objects.filter(conversation=conv).order_by("timestamp")
+        self.assertEqual(first.timestamp, datetime(2021, 3, 1, 10, 0, 1, tzinfo=timezone.utc))
+        self.assertEqual(first.sender, self.user)
+        self.assertEqual(second.sender.role, User.Role.BOT)
+
+    def test_invalid_rows_are_skipped_and_reported(self):
+        rows = ["{not json", *ndjson(
+            {"type": "message", "conversation_id": "c1", "kind": "user"},
+            {"type": "message", "conversation_id": "c1", "kind": "alien", "content": "x"},
+            {"type": "message", "conversation_id": "c1", "kind": "user", "content": "x", "timestamp": "yesterday"},
+            {"type": "message", "conversation_id": "c1", "kind": "user", "content": "ok"},
+        )]
+        result = import_ndjson(self.user, rows)
+        self.assertEqual(result.messages, 1)
+        self.assertEqual(result.skipped, 4)
+        self.assertEqual(len(result.errors), 4)
+
+    def test_impossible_and_out_of_range_timestamps_are_skipped(self):
+        rows = ndjson(
+            {"type": "message", "conversation_id": "c1", "kind": "user", "content": "x",
+             "timestamp": "2021-13-45T00:00:00Z"},
+            {"type": "message", "conversation_id": "c1", "kind": "user", "content": "x", "timestamp": 1e20},
+            {"type": "message", "conversation_id": "c1", "kind": "user", "content": "ok"},
+        )
+        result = import_ndjson(self.user, rows)
+        self.assertEqual((result.messages, result.skipped), (1, 2))
+        self.assertIn("line 1: invalid timestamp", result.errors[0])
+        self.assertIn("line 2: invalid timestamp", result.errors[1])
+
+    def test_ids_of_other_users_rows_are_not_reused(self):
+        bob = User.objects.create_user(username="bob", password="pass1234")
+        conv = Conversation.objects.create(user=bob, title="Bob's")
+        msg = Message.objects.create(conversation=conv, sender=bob, content="mine")
+        rows = ndjson(
+            {"type": "conversation", "id": str(conv.pk), "title": "Copy"},
+            {"type": "message", "id": str(msg.pk), "conversation_id": str(conv.pk), "kind": "user", "content": "mine"},
+        )
+        result = import_ndjson(self.user, rows)
+        self.assertEqual((result.conversations, result.messages, result.already_present), (1, 1, 0))
+        copy = Conversation.objects.get(user=self.user)
+        self.assertNotEqual(copy.pk, conv.pk)
+        self.assertEqual([m.content for m in copy.messages.all()], ["mine"])
+        self.assertEqual(Conversation.objects.get(pk=conv.pk).title, "Bob's")
+
+    def test_auto_timestamps_unaffected_outside_import(self):
+        conv = Conversation.objects.create(user=self.user, created_at=datetime(2000, 1, 1, tzinfo=timezone.utc))
+        self.assertGreater(conv.created_at.year, 2000)
+
+    def test_import_endpoint_accepts_gzip_body(self):
+        body = gzip.compress("\n".join(ndjson(
+            {"type": "message", "conversation_id": "c1", "kind": "user", "content": "from the api"},
+        )).encode())
+        response = self.client.post(
+            reverse("chat-import"), data=body, content_type="application/x-ndjson",
+            HTTP_CONTENT_ENCODING="gzip", HTTP_AUTHORIZATION=f"JWT {get_token(self.user)}",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["messages"], 1)
+        self.assertTrue(Message.objects.filter(content="from the api").exists())
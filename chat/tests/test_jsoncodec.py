@@ -0,0 +1,55 @@
+import datetime
+import json
+import unittest
+import uuid
+
+from django.test import SimpleTestCase
+
+from chat.history_cache import HistoryCache
+from chat.jsoncodec import JSONDecodeError, StdlibCodec, get_codec, orjson
+from chat.outbound import OutboundStats
+
+
+class JsonCodecTests(SimpleTestCase):
+    frame = {
+        "type": "message",
+        "id": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+        "timestamp": datetime.datetime(2024, 5, 1, 12, 30, 15, 250000, tzinfo=datetime.timezone.utc),
+        "content": "héllo ✓",
+        "reactions": {1: 2},
+        "stats": OutboundStats(frames_sent=3),
+    }
+
+    def test_stdlib_encodes_native_types_compactly(self):
+        text = StdlibCodec().dumps(self.frame)
+        self.assertNotIn(" ", text.replace("héllo ✓", ""))
+        decoded = json.loads(text)
+        self.assertEqual(decoded["id"], "12345678-1234-5678-1234-567812345678")
+        self.assertEqual(decoded["timestamp"], "2024-05-01T12:30:15.250000+00:00")
+        self.assertEqual(decoded["content"], "héllo ✓")
+        self.assertEqual(decoded["stats"]["frames_sent"], 3)
+
+    @unittest.skipIf(orjson is None, "orjson is not installed")
+    def test_backends_agree(self):
+        fast, slow = get_codec("orjson"), get_codec("json")
+        self.assertEqual(fast.loads(fast.dumps(self.frame)), slow.loads(slow.dumps(self.frame)))
+        self.assertEqual(fast.dumpb([1]), b"[1]")
+        with self.assertRaises(JSONDecodeError):
+            fast.loads("{not json")
+
+    def test_unknown_backend_is_rejected(self):
+        with self.assertRaises(ValueError):
+            get_codec("yaml")
+        with self.assertRaises(TypeError):
+            StdlibCodec().dumps({"value": object()})
+
+    def test_history_array_is_encoded_once_until_it_changes(self):
+        cache = HistoryCache()
+        cache.begin_fill(1, "c")
+        cache.fill(1, "c", [{"id": "1", "content": "a", "reactions": {}}])
+        first = cache.get_encoded(1, "c", 20)
+        self.assertIs(cache.get_encoded(1, "c", 20), first)
+        size = cache.nbytes
+        cache.set_reactions("c", "1", {"LIKE": 1})
+        self.assertLess(cache.nbytes, size)
+        self.assertEqual(json.loads(cache.get_encoded(1, "c", 20))[0]["reactions"], {"LIKE": 1})
@@ -0,0 +1,118 @@
+import asyncio
+import os
+import struct
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+
+from chat import service
+from chat.loadtest import Client, LoadStats, _exchange, latency_summary, process_rss
+from chat.management.commands.loadtest_ws import Command
+from core.settings import AI_BOT_NAME
+
+User = get_user_model()
+
+
+class LoadtestHelperTests(SimpleTestCase):
+    def test_latency_summary(self):
+        summary = latency_summary([float(n) for n in range(1, 201)])
+        self.assertEqual((summary["count"], summary["p50"], summary["p95"], summary["p99"], summary["max"]),
+                         (200, 100.0, 190.0, 198.0, 200.0))
+        self.assertEqual(latency_summary([])["p99"], 0.0)
+
+    def test_process_rss_includes_this_process(self):
+        rss = process_rss(os.getpid())
+        if rss is None:
+            self.skipTest("no /proc")
+        self.assertGreater(rss, 1 << 20)
+
+
+class ClientFramingTests(SimpleTestCase):
+    def open_client(self, data: bytes) -> tuple[Client, list[bytes]]:
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        written: list[bytes] = []
+
+        class Writer:
+            write = written.append
+
+            @staticmethod
+            def is_closing():
+                return False
+
+        return Client(reader, Writer()), written
+
+    async def test_fragmented_text_and_ping(self):
+        frames = (b"\x01\x05" + b'{"a":' + b"\x89\x02hi" + b"\x80\x02" + b"1}"
+                  + b"\x81\x7e" + struct.pack("!H", 300) + b'"' + b"x" * 298 + b'"')
+        client, written = self.open_client(frames)
+        self.assertEqual(await client.receive(1), {"a": 1})
+        self.assertEqual(await client.receive(1), "x" * 298)
+        # The ping in between was answered with a masked pong carrying its payload
+        pong = written[0]
+        self.assertEqual(pong[:2], b"\x8a\x82")
+        mask = pong[2:6]
+        self.assertEqual(bytes(b ^ mask[i % 4] for i, b in enumerate(pong[6:])), b"hi")
+
+    async def test_close_frame_raises(self):
+        client, _ = self.open_client(b"\x88\x02" + struct.pack("!H", 4009))
+        with self.assertRaisesRegex(ConnectionError, "4009"):
+            await client.receive(1)
+
+
+class StubProviderTests(SimpleTestCase):
+    @patch.multiple(service, CHAT_AI_PROVIDER="stub", CHAT_STUB_TOKENS=7, CHAT_STUB_FIRST_TOKEN_MS=0,
+                    CHAT_STUB_TOKEN_MS=0)
+    async def test_stub_replaces_provider(self):
+        with patch.object(service.client.chat.completions, "create") as create:
+            chunks = [delta async for delta in service.ai_stream("hello there")]
+            self.assertEqual(len(chunks), 7)
+            self.assertEqual("".join(chunks), "This is a stub reply to: hello ")
+            self.assertEqual(await service.ai_response("hello there"), "".join(chunks))
+        create.assert_not_called()
+
+
+class ScriptedClient:
+    """Answers every send with ``reply(frame)``: the frames the server would push for that message."""
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.frames: list[dict] = []
+
+    def send(self, frame: dict) -> None:
+        self.frames.extend(self.reply(frame))
+
+    async def receive(self, timeout: float) -> dict:
+        return self.frames.pop(0)
+
+
+class ExchangeTests(SimpleTestCase):
+    async def exchange(self, *frames) -> LoadStats:
+        stats = LoadStats()
+        client = ScriptedClient(lambda sent: [{"reply_id": sent["id"]}, *({"id": sent["id"], **f} for f in frames)])
+        await _exchange(client, "hi", 1, stats)
+        return stats
+
+    async def test_reply_is_measured(self):
+        stats = await self.exchange({"type": "delta", "delta": "he"}, {"type": "message", "content": "hello"})
+        self.assertEqual((len(stats.ack_ms), len(stats.first_token_ms), len(stats.reply_ms)), (1, 1, 1))
+        self.assertEqual(stats.reply_errors, 0)
+
+    async def test_fallback_and_error_frames_are_failures(self):
+        for frame in ({"type": "message", "content": service.BOT_MISSING_REPLY},
+                      {"type": "message", "content": service.ERROR_REPLY},
+                      {"error": "Internal server error"}):
+            with self.subTest(frame=frame):
+                stats = await self.exchange(frame)
+                self.assertEqual(stats.reply_errors, 1)
+                self.assertEqual((stats.first_token_ms, stats.reply_ms), ([], []))
+
+
+class LoadtestUsersTests(TestCase):
+    def test_tokens_create_users_and_the_bot(self):
+        self.assertEqual(len(Command()._tokens(3)), 3)
+        self.assertEqual(len(Command()._tokens(3)), 3)
+        self.assertEqual(User.objects.filter(username__startswith="loadtest-").count(), 3)
+        self.assertEqual(User.objects.get(username=AI_BOT_NAME).role, User.Role.BOT)
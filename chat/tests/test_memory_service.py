@@ -0,0 +1,106 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import numpy as np
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+
+from chat.models import Conversation, Message
+from chat.services import memory_service
+from chat.services.memory_service import (
+    HashingEmbedder,
+    UserMemoryIndex,
+    get_user_index,
+    recall,
+    remember_messages,
+    reset_memory_state,
+)
+
+User = get_user_model()
+
+
+class HashingEmbedderTests(TestCase):
+    def test_deterministic_and_normalised(self):
+        a = HashingEmbedder().embed(["deploying django with docker"])
+        b = HashingEmbedder().embed(["deploying django with docker"])
+        np.testing.assert_array_equal(a, b)
+        self.assertAlmostEqual(float(np.linalg.norm(a[0])), 1.0, places=5)
+
+
+class UserMemoryIndexTests(TestCase):
+    def test_append_grows_and_search_ranks(self):
+        embedder = HashingEmbedder(dim=64)
+        index = UserMemoryIndex(dim=64, capacity=2)
+        texts = ["postgres indexes", "react hooks", "postgres vacuum tuning", "cooking pasta"]
+        ids = [uuid.uuid4() for _ in texts]
+        conv = uuid.uuid4()
+        index.append(ids, [conv] * len(ids), embedder.embed(texts))
+        index.append(ids[:1], [conv], embedder.embed(texts[:1]))  # duplicates ignored
+        self.assertEqual(len(index), 4)
+        top = index.search(embedder.embed(["postgres tuning"])[0], k=2)
+        self.assertEqual(top[0][0], ids[2])
+        self.assertEqual(index.search(embedder.embed(["postgres"])[0], k=2, exclude_conversation=conv), [])
+
+    def test_search_is_fast_for_large_histories(self):
+        index = UserMemoryIndex(dim=384)
+        rng = np.random.default_rng(0)
+        vectors = rng.standard_normal((30_000, 384)).astype(np.float32)
+        index.append([uuid.uuid4() for _ in range(30_000)], [uuid.uuid4()] * 30_000, vectors)
+        started = time.perf_counter()
+        for _ in range(10):
+            index.search(vectors[0], k=5)
+        self.assertLess((time.perf_counter() - started) / 10, 0.05)
+
+
+class RecallTests(TestCase):
+    def setUp(self):
+        reset_memory_state()
+        self.user = User.objects.create_user(username="alice", password="pass1234")
+        self.other = User.objects.create_user(username="bob", password="pass1234")
+
+    def tearDown(self):
+        reset_memory_state()
+
+    def _say(self, user, content):
+        conv = Conversation.objects.create(user=user)
+        msg = Message.objects.create(conversation=conv, sender=user, content=content)
+        remember_messages(user, [msg])
+        return msg
+
+    def test_recall_is_scoped_per_user(self):
+        mine = self._say(self.user, "My dog is called Biscuit")
+        self._say(self.other, "My dog is called Rex")
+        memories = recall(self.user, "what is my dog called", k=3)
+        self.assertEqual([m.message_id for m in memories], [mine.id])
+
+    def test_loaded_index_receives_appends(self):
+        self._say(self.user, "I prefer tabs over spaces")
+        recall(self.user, "tabs", k=1)  # loads the index
+        later = self._say(self.user, "My favourite database is SQLite")
+        self.assertEqual(recall(self.user, "favourite database", k=1)[0].message_id, later.id)
+
+    def test_index_loads_outside_the_lock(self):
+        release = threading.Event()
+        real_load = memory_service._load_index
+
+        def load(user_id, embedder):
+            if user_id != self.user.id:
+                return real_load(user_id, embedder)
+            release.wait(5)
+            return UserMemoryIndex(embedder.dim)  # read before the message below was saved
+
+        with mock.patch.object(memory_service, "_load_index", side_effect=load) as loader, \
+                ThreadPoolExecutor(2) as pool:
+            first = pool.submit(get_user_index, self.user.id)
+            second = pool.submit(get_user_index, self.user.id)
+            time.sleep(0.05)
+            self.assertEqual(len(get_user_index(self.other.id)), 0)
+            self.assertFalse(first.done())  # bob's index was loaded while alice's load is still running
+            said = self._say(self.user, "My favourite database is SQLite")  # lands while alice's index loads
+            release.set()
+            self.assertIs(first.result(timeout=5), second.result(timeout=5))
+        self.assertEqual(loader.call_count, 2)  # alice once, bob once
+        self.assertIn(said.id, first.result())
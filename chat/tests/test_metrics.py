@@ -0,0 +1,132 @@
+import tempfile
+from unittest.mock import patch
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from chat import service
+from chat.metrics import AI_ERRORS, AI_FIRST_TOKEN_SECONDS, AI_REQUESTS, CACHE_REQUESTS, CHANNEL_SEND_SECONDS
+from chat.metrics import timed_group_send
+from core import metrics
+from core.metrics import Counter, Gauge, Histogram, merge, render, snapshot
+
+
+class RegistryTests(SimpleTestCase):
+    def metric(self, cls, name, *args, **kwargs):
+        metric = cls(name, *args, **kwargs)
+        self.addCleanup(metrics._metrics.pop, name)
+        return metric
+
+    def test_render_prometheus_text(self):
+        requests = self.metric(Counter, "test_requests_total", "Requests.", ("path",))
+        requests.inc(path="/a")
+        requests.inc(2, path='say "hi"\n')
+        depth = self.metric(Gauge, "test_depth", "Queue depth.")
+        depth.set(3)
+        latency = self.metric(Histogram, "test_seconds", "Latency.", ("op",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5):
+            latency.observe(value, op="x")
+        text = render({name: entry for name, entry in snapshot()["metrics"].items() if name.startswith("test_")})
+        self.assertIn("# HELP test_requests_total Requests.\n# TYPE test_requests_total counter\n", text)
+        self.assertIn('test_requests_total{path="/a"} 1\n', text)
+        self.assertIn('test_requests_total{path="say \\"hi\\"\\n"} 2\n', text)
+        self.assertIn("# TYPE test_depth gauge\ntest_depth 3\n", text)
+        self.assertIn('test_seconds_bucket{op="x",le="0.1"} 1\n'
+                      'test_seconds_bucket{op="x",le="1"} 2\n'
+                      'test_seconds_bucket{op="x",le="+Inf"} 3\n'
+                      'test_seconds_sum{op="x"} 5.55\n'
+                      'test_seconds_count{op="x"} 3\n', text)
+
+    def test_labels_must_match(self):
+        counter = self.metric(Counter, "test_labelled_total", "Labelled.", ("a",))
+        with self.assertRaisesRegex(ValueError, "takes labels"):
+            counter.inc(b="x")
+
+    def test_merge_sums_processes_and_drops_gauges_of_dead_ones(self):
+        def process(pid, count, depth, observations):
+            return {"pid": pid, "metrics": {
+                "c_total": {"type": "counter", "help": "", "labels": ["k"], "samples": [[["x"], count]]},
+                "g": {"type": "gauge", "help": "", "labels": [], "samples": [[[], depth]]},
+                "h": {"type": "histogram", "help": "", "labels": [], "buckets": [1.0],
+                      "samples": [[[], [observations, 0, 0.5 * observations]]]},
+            }}
+
+        merged = merge([process(1, 2, 5, 1), process(2, 3, 7, 2)], alive=lambda pid: pid == 1)
+        self.assertEqual(merged["c_total"]["samples"], {("x",): 5})
+        self.assertEqual(merged["g"]["samples"], {(): 5})
+        self.assertEqual(merged["h"]["samples"], {(): [3, 0, 1.5]})
+
+
+@override_settings(CHAT_AI_PROVIDER="stub")
+@patch.multiple(service, CHAT_AI_PROVIDER="stub", CHAT_STUB_TOKENS=3, CHAT_STUB_FIRST_TOKEN_MS=0,
+                CHAT_STUB_TOKEN_MS=0)
+class HotPathMetricsTests(SimpleTestCase):
+    async def test_streamed_reply(self):
+        requests = AI_REQUESTS.value(model="stub", mode="stream", outcome="ok")
+        first_tokens = AI_FIRST_TOKEN_SECONDS.count(model="stub")
+        chunks = []
+
+        async def on_delta(delta):
+            chunks.append(delta)
+
+        await service.stream_response_text("hi", None, on_delta)
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(AI_REQUESTS.value(model="stub", mode="stream", outcome="ok"), requests + 1)
+        self.assertEqual(AI_FIRST_TOKEN_SECONDS.count(model="stub"), first_tokens + 1)
+
+    async def test_provider_error(self):
+        errors = AI_ERRORS.value(model="stub", error="RuntimeError")
+
+        async def broken(user_message, memories=None):
+            raise RuntimeError("provider down")
+            yield
+
+        with patch.object(service, "stub_stream", broken):
+            self.assertEqual(await service.ai_response("hi"), "Sorry, I couldn't process your request.")
+        self.assertEqual(AI_ERRORS.value(model="stub", error="RuntimeError"), errors + 1)
+
+    async def test_group_send_is_timed(self):
+        class Layer:
+            async def group_send(self, group, message):
+                pass
+
+        sends = CHANNEL_SEND_SECONDS.count(op="group_send", type="chat.test")
+        await timed_group_send(Layer(), "user_1", {"type": "chat.test"})
+        self.assertEqual(CHANNEL_SEND_SECONDS.count(op="group_send", type="chat.test"), sends + 1)
+
+
+@override_settings(CHAT_METRICS_ENABLED=True)
+class EndpointTests(SimpleTestCase):
+    def test_serves_prometheus_text(self):
+        CACHE_REQUESTS.inc(cache="history", result="hit")
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], metrics.CONTENT_TYPE)
+        body = response.content.decode()
+        self.assertIn("# TYPE chat_ai_request_seconds histogram", body)
+        self.assertIn('chat_ws_connections{state="open"}', body)
+        self.assertRegex(body, r'chat_cache_requests_total\{cache="history",result="hit"\} \d+')
+
+    @override_settings(CHAT_METRICS_TOKEN="s3cret")
+    def test_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 401)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong").status_code, 401)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret").status_code, 200)
+
+    def test_off_by_default(self):
+        with self.settings():
+            del settings.CHAT_METRICS_ENABLED
+            self.assertEqual(self.client.get("/metrics").status_code, 404)
+        with self.settings(CHAT_METRICS_ENABLED=False):
+            self.assertEqual(self.client.get("/metrics").status_code, 404)
+
+    def test_merges_worker_snapshots(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        CACHE_REQUESTS.inc(cache="test", result="miss")
+        # The snapshot of a worker that has exited: its counters still count
+        with patch("core.metrics.os.getpid", return_value=2 ** 22 + 1):
+            metrics.write_snapshot(directory.name)
+        with self.settings(CHAT_METRICS_DIR=directory.name):
+            body = self.client.get("/metrics").content.decode()
+        self.assertIn('chat_cache_requests_total{cache="test",result="miss"} 2', body)
@@ -0,0 +1,73 @@
+from django.test import TransactionTestCase, override_settings
+from django.contrib.auth import get_user_model
+
+from chat.history_cache import history_cache
+from chat.models import Conversation, Message
+from chat.testing import connect, receive_reply, stub_provider
+
+User = get_user_model()
+
+
+class MultiplexedConversationTests(TransactionTestCase):
+    def setUp(self):
+        history_cache.clear()
+        self.user = User.objects.create_user(username="alice", password="pass1234")
+        self.bot = User.objects.create_user(username="Z-Chatbot", password="pass1234")
+        self.first = Conversation.objects.create(user=self.user, title="first")
+        self.second = Conversation.objects.create(user=self.user, title="second", is_active=False)
+        Message.objects.create(conversation=self.second, sender=self.user, content="older question")
+        self.foreign = Conversation.objects.create(user=User.objects.create_user(username="bob", password="pass1234"))
+
+    async def _connect(self):
+        ws, history = await connect(self.user)
+        self.assertEqual(history["conversation_id"], str(self.first.id))
+        return ws
+
+    async def test_messages_are_routed_per_conversation(self):
+        a = await self._connect()
+        b = await self._connect()
+        await b.send_json_to({"type": "subscribe", "conversation_id": str(self.second.id)})
+        history = await b.receive_json_from()
+        self.assertEqual((history["conversation_id"], [m["content"] for m in history["messages"]]),
+                         (str(self.second.id), ["older question"]))
+
+        with stub_provider():
+            await b.send_json_to({"message": "in second", "conversation_id": str(self.second.id)})
+            frames = await receive_reply(b)
+
+        self.assertEqual({f["conversation_id"] for f in frames}, {str(self.second.id)})
+        self.assertEqual(frames[-1]["content"], "re: in second")
+        self.assertTrue(await a.receive_nothing())  # only subscribed to the first conversation
+        self.assertEqual(await Message.objects.filter(conversation=self.second).acount(), 3)
+        self.assertEqual(await Message.objects.filter(conversation=self.first).acount(), 0)
+        await a.disconnect()
+        await b.disconnect()
+
+    async def test_cannot_open_foreign_conversations(self):
+        ws = await self._connect()
+        for frame in ({"type": "subscribe", "conversation_id": str(self.foreign.id)},
+                      {"type": "history", "conversation_id": "not-a-uuid"},
+                      {"message": "hi", "conversation_id": str(self.foreign.id)}):
+            await ws.send_json_to(frame)
+            self.assertEqual((await ws.receive_json_from())["code"], "NOT_FOUND")
+        self.assertFalse(await Message.objects.filter(conversation=self.foreign).aexists())
+        await ws.disconnect()
+
+    @override_settings(CHAT_WS_MAX_SUBSCRIPTIONS=1)
+    async def test_no_reply_without_a_free_subscription(self):
+        ws = await self._connect()  # subscribed to the first conversation: the limit is reached
+        with stub_provider():
+            await ws.send_json_to({"message": "in second", "conversation_id": str(self.second.id)})
+            self.assertEqual((await ws.receive_json_from())["code"], "TOO_MANY_SUBSCRIPTIONS")
+            self.assertTrue(await ws.receive_nothing(0.2))
+        self.assertEqual(await Message.objects.filter(conversation=self.second).acount(), 1)
+        await ws.disconnect()
+
+    async def test_create_conversation(self):
+        ws = await self._connect()
+        await ws.send_json_to({"type": "conversation.create", "title": "Side quest"})
+        frame = await ws.receive_json_from()
+        self.assertTrue(frame["created"])
+        self.assertTrue(await Conversation.objects.filter(pk=frame["conversation_id"], user=self.user,
+                                                          title="Side quest").aexists())
+        await ws.disconnect()
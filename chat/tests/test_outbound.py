@@ -0,0 +1,152 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase
+from django.contrib.auth import get_user_model
+
+from chat.history_cache import history_cache
+from chat.models import Message
+from chat.outbound import OutboundQueue
+from chat.testing import connect, receive_reply, stub_provider
+
+User = get_user_model()
+
+
+class SlowSink:
+    def __init__(self):
+        self.frames = []
+        self.gate = asyncio.Event()
+
+    async def send(self, text):
+        await self.gate.wait()
+        self.frames.append(json.loads(text))
+
+
+class OutboundQueueTests(TestCase):
+    async def test_adjacent_deltas_are_coalesced(self):
+        sink = SlowSink()
+        queue = OutboundQueue(sink.send)
+        queue.start()
+        queue.put({"type": "message", "kind": "user", "content": "hi"})
+        for part in ("Hel", "lo", " there"):
+            queue.put({"type": "delta", "id": "r1", "delta": part})
+        queue.put({"type": "message", "id": "r1", "kind": "bot", "content": "Hello there"})
+        sink.gate.set()
+        await asyncio.sleep(0.01)
+        await queue.stop()
+        self.assertEqual([f["type"] for f in sink.frames], ["message", "delta", "message"])
+        self.assertEqual(sink.frames[1]["delta"], "Hello there")
+        self.assertEqual(queue.stats.deltas_coalesced, 2)
+
+    async def test_slow_client_is_downgraded_then_dropped(self):
+        sink = SlowSink()
+        dropped = []
+        queue = OutboundQueue(sink.send, high_water=1000, max_bytes=5000, stall_seconds=60, on_overflow=dropped.append)
+        queue.start()
+        for i in range(20):
+            queue.put({"type": "delta", "id": f"r{i}", "delta": "x" * 100})
+        self.assertTrue(queue.downgraded)
+        self.assertLessEqual(queue.queued_bytes, 1000)
+        self.assertFalse(queue.put({"type": "delta", "id": "r99", "delta": "late"}))
+        for _ in range(10):
+            queue.put({"type": "message", "content": "y" * 600})
+        self.assertEqual(dropped, ["queue limit exceeded"])
+        self.assertEqual(queue.queued_bytes, 0)
+        self.assertFalse(queue.put({"type": "message", "content": "after"}))
+        await queue.stop()
+
+
+class StreamingConsumerTests(TransactionTestCase):
+    def setUp(self):
+        history_cache.clear()
+        cache.clear()
+        self.user = User.objects.create_user(username="alice", password="pass1234")
+        User.objects.create_user(username="Z-Chatbot", password="pass1234")
+
+    async def _connect(self):
+        communicator, history = await connect(self.user)
+        self.assertEqual(history["type"], "history")
+        return communicator
+
+    async def test_reply_is_streamed_then_persisted_with_reply_id(self):
+        async def fake_stream(user_message, memories=None):
+            for part in ("Sure", ", ", "done"):
+                yield part
+
+        communicator = await self._connect()
+
+        with stub_provider(fake_stream):
+            await communicator.send_json_to({"message": "Can you help?"})
+            frames = await receive_reply(communicator)
+        await communicator.disconnect()
+
+        self.assertEqual(frames.pop(0)["type"], "conversation")  # first message starts the active conversation
+        self.assertEqual(frames[0]["content"], "Can you help?")
+        self.assertEqual(frames[0]["reply_id"], frames[-1]["id"])
+        deltas = "".join(f["delta"] for f in frames if f["type"] == "delta")
+        self.assertEqual(deltas, "Sure, done")
+        final = frames[-1]
+        self.assertEqual(final["content"], "Sure, done")
+        self.assertTrue(await Message.objects.filter(pk=final["id"], content="Sure, done").aexists())
+
+    async def test_retried_reply_id_is_not_stored_twice(self):
+        communicator = await self._connect()
+        reply_id = "0b0e4f3c-2d3e-4a8f-9a51-6d3c1a9e7b20"
+        with stub_provider():
+            await communicator.send_json_to({"message": "Hello", "id": reply_id})
+            await receive_reply(communicator)
+            await communicator.send_json_to({"message": "Hello", "id": reply_id})
+            self.assertEqual((await communicator.receive_json_from(timeout=2))["code"], "DUPLICATE_ID")
+            await sync_to_async(cache.clear)()  # the reservation expired: the saved reply still counts
+            await communicator.send_json_to({"message": "Hello", "id": reply_id})
+            self.assertEqual((await communicator.receive_json_from(timeout=2))["code"], "DUPLICATE_ID")
+        await communicator.disconnect()
+        self.assertEqual(await Message.objects.filter(content="Hello").acount(), 1)
+
+    async def test_cancel_stops_stream_and_keeps_partial_reply(self):
+        closed = asyncio.Event()
+
+        async def hanging_stream(user_message, memories=None):
+            try:
+                yield "Partial"
+                await asyncio.sleep(30)
+                yield "never"
+            finally:
+                closed.set()
+
+        communicator = await self._connect()
+        reply_id = "6f1c1e0e-7c1b-4e55-9d0a-2b7f3f0f9a11"
+        with stub_provider(hanging_stream):
+            await communicator.send_json_to({"message": "Write an essay", "id": reply_id})
+            self.assertEqual((await communicator.receive_json_from(timeout=2))["type"], "conversation")
+            self.assertEqual((await communicator.receive_json_from(timeout=2))["reply_id"], reply_id)
+            self.assertEqual((await communicator.receive_json_from(timeout=2))["delta"], "Partial")
+            await communicator.send_json_to({"type": "cancel", "id": reply_id})
+            final = await communicator.receive_json_from(timeout=2)
+        await communicator.disconnect()
+
+        self.assertTrue(closed.is_set())
+        self.assertEqual((final["id"], final["content"], final["cancelled"]), (reply_id, "Partial", True))
+        saved = await Message.objects.aget(pk=reply_id)
+        self.assertEqual((saved.content, saved.metadata), ("Partial", {"cancelled": True}))
+
+    async def test_disconnect_cancels_in_flight_generation(self):
+        closed = asyncio.Event()
+
+        async def hanging_stream(user_message, memories=None):
+            try:
+                yield "Hi"
+                await asyncio.sleep(30)
+            finally:
+                closed.set()
+
+        communicator = await self._connect()
+        with stub_provider(hanging_stream):
+            await communicator.send_json_to({"message": "Hello"})
+            await communicator.receive_json_from(timeout=2)
+            await communicator.receive_json_from(timeout=2)
+            await communicator.receive_json_from(timeout=2)
+            await communicator.disconnect()
+        self.assertTrue(closed.is_set())
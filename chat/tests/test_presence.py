@@ -0,0 +1,116 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from chat.history_cache import history_cache
+from chat.models import ChatSettings, Conversation
+from chat.presence import Throttle, get_presence, set_presence
+from chat.testing import connect
+
+User = get_user_model()
+
+
+class ThrottleTests(SimpleTestCase):
+    async def test_bursts_are_coalesced(self):
+        sent = []
+
+        async def send(key, value):
+            sent.append((key, value))
+
+        throttle = Throttle(0.05, send)
+        for _ in range(20):
+            throttle.submit("c", True)
+        throttle.submit("c", False)
+        throttle.submit("c", True)
+        throttle.submit("c", False)
+        await asyncio.sleep(0.08)
+        self.assertEqual(sent, [("c", True), ("c", False)])
+        await asyncio.sleep(0.05)
+        throttle.submit("c", False, refresh=False)
+        throttle.submit("c", True)  # refreshes are let through once the window has passed
+        await throttle.close()
+        self.assertEqual(sent[2:], [("c", True)])
+        self.assertEqual((throttle.sent, throttle.suppressed), (3, 23))
+
+    def test_presence_entries_expire(self):
+        self.assertTrue(set_presence(99, "a", "active", ttl=60))
+        self.assertFalse(set_presence(99, "a", "active", ttl=60))
+        set_presence(99, "b", "idle", ttl=-1)
+        self.assertEqual(get_presence(99), {"a": "active"})
+        self.assertTrue(set_presence(99, "a", None, ttl=60))
+        self.assertEqual(get_presence(99), {})
+
+    def test_concurrent_sockets_keep_their_entries(self):
+        cache.clear()
+        socket_ids = [f"s{n}" for n in range(20)]
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(lambda sid: set_presence(98, sid, "active", ttl=60), socket_ids))
+        self.assertEqual(get_presence(98), dict.fromkeys(socket_ids, "active"))
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(lambda sid: set_presence(98, sid, None, ttl=60), socket_ids[::2]))
+        self.assertEqual(get_presence(98), dict.fromkeys(socket_ids[1::2], "active"))
+
+
+@override_settings(CHAT_TYPING_INTERVAL_SECONDS=60, CHAT_PRESENCE_INTERVAL_SECONDS=0.1)
+class TypingAndPresenceTests(TransactionTestCase):
+    def setUp(self):
+        history_cache.clear()
+        self.user = User.objects.create_user(username="alice", password="pass1234")
+        Conversation.objects.create(user=self.user)
+
+    async def _connect(self):
+        ws, history = await connect(self.user)
+        return ws, history["conversation_id"]
+
+    async def test_keystrokes_reach_other_tabs_once_per_interval(self):
+        first, conversation_id = await self._connect()
+        second, _ = await self._connect()
+        for _ in range(10):
+            await first.send_json_to({"type": "typing", "conversation_id": conversation_id, "typing": True})
+        frame = await second.receive_json_from()
+        self.assertEqual((frame["type"], frame["typing"], frame["conversation_id"]), ("typing", True, conversation_id))
+        self.assertTrue(await second.receive_nothing(0.2))
+        self.assertTrue(await first.receive_nothing(0.1))
+
+        await first.send_json_to({"type": "typing", "conversation_id": "not-mine"})
+        self.assertEqual((await first.receive_json_from())["code"], "NOT_SUBSCRIBED")
+        await first.disconnect()
+        await second.disconnect()
+
+    async def test_typing_is_off_when_disabled_in_settings(self):
+        await sync_to_async(ChatSettings.objects.create)(user=self.user, show_typing_indicator=False)
+        first, conversation_id = await self._connect()
+        second, _ = await self._connect()
+        await first.send_json_to({"type": "typing", "conversation_id": conversation_id})
+        self.assertTrue(await second.receive_nothing(0.2))
+        await first.disconnect()
+        await second.disconnect()
+
+    async def test_presence_snapshot_and_changes(self):
+        first, _ = await self._connect()
+        second, _ = await self._connect()
+        await second.send_json_to({"type": "presence"})
+        snapshot = await second.receive_json_from()
+        self.assertEqual(list(snapshot["sockets"].values()), ["active"])
+        (first_id,) = snapshot["sockets"]
+
+        await first.send_json_to({"type": "presence", "state": "idle"})
+        await first.send_json_to({"type": "presence", "state": "idle"})
+        self.assertEqual(await second.receive_json_from(), {"type": "presence", "socket": first_id, "state": "idle"})
+        await first.disconnect()
+        self.assertEqual((await second.receive_json_from())["state"], "offline")
+        self.assertEqual(len(await sync_to_async(get_presence)(self.user.id)), 1)
+        await second.disconnect()
+
+    async def test_heartbeats_keep_a_quiet_tab_present(self):
+        with override_settings(CHAT_PRESENCE_TTL_SECONDS=0.3):
+            ws, _ = await self._connect()
+            for _ in range(8):
+                await ws.send_json_to({"type": "pong"})
+                await asyncio.sleep(0.1)
+            self.assertEqual(list((await sync_to_async(get_presence)(self.user.id)).values()), ["active"])
+            await ws.disconnect()
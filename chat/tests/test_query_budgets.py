@@ -0,0 +1,130 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from graphql_jwt.shortcuts import get_token
+
+from chat.history_cache import history_cache
+from chat.models import Conversation, Message
+from chat.testing import connect, receive_reply, stub_provider
+from core.queries import assert_query_budget, budget_for, register_budgets, track_queries
+
+User = get_user_model()
+
+
+class QueryCounterTests(TransactionTestCase):
+    async def test_counts_queries_in_sync_to_async_threads(self):
+        with assert_query_budget("test:count", limit=2) as finished:
+            with track_queries("test:count") as stats:
+                await User.objects.acount()
+                await sync_to_async(User.objects.exists)()
+        self.assertEqual(stats.count, 2)
+        self.assertEqual([s.label for s in finished], ["test:count"])
+        # Nothing counts after the operation has finished
+        await User.objects.acount()
+        self.assertEqual(stats.count, 2)
+
+    def test_over_budget_fails_with_statements(self):
+        with self.assertRaisesRegex(AssertionError, r"test:over ran 2 queries, budget is 1:\n.*SELECT"):
+            with assert_query_budget(limit=1):
+                with track_queries("test:over"):
+                    User.objects.count()
+                    User.objects.count()
+
+    def test_every_checked_operation_needs_a_budget(self):
+        with self.assertRaisesRegex(AssertionError, "test:unbudgeted has no query budget"):
+            with assert_query_budget():
+                with track_queries("test:unbudgeted"):
+                    pass
+        with self.assertRaisesRegex(AssertionError, "No operation named test:missing"):
+            with assert_query_budget("test:missing"):
+                pass
+
+
+class BudgetLookupTests(SimpleTestCase):
+    def test_graphql_operations_sum_their_root_fields(self):
+        register_budgets({"graphql:a": 2, "graphql:b": 3})
+        self.assertEqual(budget_for("graphql:a+b"), 5)
+        self.assertIsNone(budget_for("graphql:a+unknown"))
+
+
+@override_settings(QUERY_PROFILING=True)
+class GraphQLQueryBudgetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="alice", password="pass1234")
+        bot = User.objects.create_user(username="Z-Chatbot", password="pass1234")
+        self.conversations = [Conversation.objects.create(user=self.user, title=f"c{i}") for i in range(5)]
+        for conversation in self.conversations:
+            for i in range(10):
+                Message.objects.create(conversation=conversation, sender=bot if i % 2 else self.user, content=f"m{i}")
+        self.token = get_token(self.user)
+
+    def graphql(self, query: str, variables: dict | None = None) -> dict:
+        response = self.client.post("/graphql/", json.dumps({"query": query, "variables": variables or {}}),
+                                    content_type="application/json", HTTP_AUTHORIZATION=f"JWT {self.token}")
+        return response.json()
+
+    def test_hot_paths_stay_within_budget(self):
+        message = Message.objects.filter(conversation=self.conversations[0]).first()
+        operations = [
+            ("graphql:conversations", "{ conversations { id title createdAt } }", None),
+            ("graphql:messages", "query($id: ID!) { messages(conversationId: $id) { id content reactions { count } } }",
+             {"id": str(self.conversations[0].id)}),
+            ("graphql:me", "{ me { id username } }", None),
+            ("graphql:searchMessages", '{ searchMessages(query: "m1") { hits { messageId } hasNextPage } }', None),
+            ("graphql:reactToMessage", "mutation($id: ID!) { reactToMessage(messageId: $id, reaction: \"LIKE\") "
+                                       "{ ok } }", {"id": str(message.id)}),
+            ("graphql:removeReaction", "mutation($id: ID!) { removeReaction(messageId: $id) { ok } }",
+             {"id": str(message.id)}),
+            ("graphql:registerUser", 'mutation { registerUser(username: "bob", password: "pass12345", '
+                                     'email: "bob@example.com") { success } }', None),
+        ]
+        for label, query, variables in operations:
+            with self.subTest(label), assert_query_budget(label):
+                payload = self.graphql(query, variables)
+            self.assertNotIn("errors", payload, label)
+            self.assertEqual(payload["extensions"]["queries"]["operation"], label)
+
+    def test_extensions(self):
+        with assert_query_budget("graphql:conversations+me"):
+            payload = self.graphql("{ me { id } conversations { id } }")
+        queries = payload["extensions"]["queries"]
+        self.assertEqual(queries["budget"], budget_for("graphql:conversations") + budget_for("graphql:me"))
+        self.assertEqual(len(queries["statements"]), queries["count"])
+        with override_settings(QUERY_PROFILING=False):
+            self.assertNotIn("extensions", self.graphql("{ me { id } }"))
+
+
+@override_settings(QUERY_PROFILING=True)
+class WebSocketQueryBudgetTests(TransactionTestCase):
+    def setUp(self):
+        history_cache.clear()
+        self.user = User.objects.create_user(username="alice", password="pass1234")
+        self.bot = User.objects.create_user(username="Z-Chatbot", password="pass1234")
+        self.conversation = Conversation.objects.create(user=self.user, title="first")
+        self.other = Conversation.objects.create(user=self.user, title="second", is_active=False)
+        for i in range(30):
+            Message.objects.create(conversation=self.conversation, sender=self.bot if i % 2 else self.user,
+                                   content=f"m{i}")
+
+    async def test_session_events_stay_within_budget(self):
+        message = await Message.objects.filter(conversation=self.conversation).afirst()
+        with assert_query_budget() as finished, stub_provider():
+            ws, _ = await connect(self.user)
+            for frame in ({"type": "ping", "t": 1}, {"type": "subscribe", "conversation_id": str(self.other.id)},
+                          {"type": "history", "conversation_id": str(self.conversation.id)},
+                          {"type": "stats"}):
+                await ws.send_json_to(frame)
+                reply = await ws.receive_json_from()
+                self.assertNotIn("error", reply)
+            self.assertIn("ws:auth", reply["queries"])
+            await ws.send_json_to({"type": "unsubscribe", "conversation_id": str(self.other.id)})
+            await ws.send_json_to({"type": "reaction", "message_id": str(message.id), "reaction": "LIKE"})
+            await ws.send_json_to({"type": "typing", "conversation_id": str(self.conversation.id), "typing": True})
+            await ws.send_json_to({"message": "hello", "conversation_id": str(self.conversation.id)})
+            await receive_reply(ws)
+            await ws.disconnect()
+        labels = {stats.label for stats in finished}
+        self.assertTrue({"ws:connect", "ws:auth", "ws:ping", "ws:subscribe", "ws:history", "ws:unsubscribe",
+                         "ws:stats", "ws:reaction", "ws:typing", "ws:message", "ws:reply"} <= labels, labels)
@@ -0,0 +1,99 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+
+from chat.history_cache import history_cache
+from chat.services.rate_limit_service import (MemoryBackend, Rate, RateLimited, RateLimiter, get_rate_limiter,
+                                              reset_rate_limiter)
+from chat.testing import connect, receive_reply, stub_provider
+from core.graphql.error_middleware import DomainErrorMiddleware
+from core.schema import schema
+
+User = get_user_model()
+
+LIMITS = {"message": {"ADMIN": "2/min", "USER": "1/min", "BOT": None, "ip": "3/min"}}
+
+
+class RateParsingTests(SimpleTestCase):
+    def test_parse(self):
+        self.assertEqual(Rate.parse("20/min"), Rate(20, 60))
+        self.assertEqual(Rate.parse("5/10s"), Rate(5, 10))
+        self.assertIsNone(Rate.parse(""))
+        self.assertIsNone(Rate.parse(None))
+        for bad in ("fast", "10/fortnight", "0/min"):
+            with self.assertRaises(ValueError):
+                Rate.parse(bad)
+
+
+class RateLimiterTests(SimpleTestCase):
+    def setUp(self):
+        self.limiter = RateLimiter(MemoryBackend(), LIMITS)
+
+    def user(self, pk, role):
+        return User(pk=pk, username=f"u{pk}", role=role)
+
+    def test_user_and_ip_buckets_are_taken_together(self):
+        admin, user = self.user(1, User.Role.ADMIN), self.user(2, User.Role.USER)
+        self.limiter.check("message", admin, "10.0.0.1")
+        self.limiter.check("message", admin, "10.0.0.1")
+        with self.assertRaises(RateLimited) as denied:
+            self.limiter.check("message", admin, "10.0.0.1")
+        self.assertEqual((denied.exception.scope, denied.exception.code), ("user", "RATE_LIMITED"))
+        self.assertEqual(denied.exception.retry_after, 30)
+
+        # The denied request took nothing from the IP bucket: one token is left there
+        self.limiter.check("message", user, "10.0.0.1")
+        with self.assertRaises(RateLimited) as denied:
+            self.limiter.check("message", self.user(3, User.Role.USER), "10.0.0.1")
+        self.assertEqual(denied.exception.scope, "ip")
+
+    def test_unlimited_roles_and_actions(self):
+        bot = self.user(4, User.Role.BOT)
+        for _ in range(5):
+            self.limiter.check("message", bot)
+            self.limiter.check("search", self.user(5, User.Role.USER), "10.0.0.2")
+        self.assertEqual(self.limiter.buckets("message", self.user(6, "AUDITOR"))[0].rate, Rate(1, 60))
+
+    def test_tokens_refill(self):
+        backend = MemoryBackend()
+        limiter = RateLimiter(backend, {"message": {"USER": "1/s"}})
+        user = self.user(7, User.Role.USER)
+        with mock.patch("chat.services.rate_limit_service.time.monotonic", return_value=100.0):
+            limiter.check("message", user)
+            with self.assertRaises(RateLimited):
+                limiter.check("message", user)
+        with mock.patch("chat.services.rate_limit_service.time.monotonic", return_value=101.0):
+            limiter.check("message", user)
+
+
+@override_settings(CHAT_RATE_LIMITS=LIMITS, CHAT_RATE_LIMIT_BACKEND="memory")
+class RateLimitedTransportTests(TransactionTestCase):
+    def setUp(self):
+        reset_rate_limiter()
+        history_cache.clear()
+        self.user = User.objects.create_user(username="alice", password="pass1234", role=User.Role.USER)
+        User.objects.create_user(username="Z-Chatbot", password="pass1234")
+
+    def tearDown(self):
+        reset_rate_limiter()
+
+    async def test_socket_reports_rate_limited(self):
+        ws, _ = await connect(self.user)
+        with stub_provider():
+            await ws.send_json_to({"message": "one"})
+            await receive_reply(ws)
+            await ws.send_json_to({"message": "two", "id": "client-1"})
+            error = await ws.receive_json_from(timeout=2)
+        self.assertEqual((error["code"], error["retry_after"], error["id"]), ("RATE_LIMITED", 60, "client-1"))
+        await ws.disconnect()
+
+    async def test_graphql_reports_rate_limited(self):
+        request = RequestFactory().post("/graphql/", REMOTE_ADDR="10.0.0.9")
+        request.user = self.user
+        get_rate_limiter().check("message", self.user)
+        result = await schema.execute_async(
+            'mutation { sendMessage(content: "hi") { ok } }',
+            context_value=request, middleware=[DomainErrorMiddleware()],
+        )
+        self.assertEqual(result.errors[0].extensions, {"code": "RATE_LIMITED", "retryAfter": 60})
@@ -0,0 +1,49 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+
+from chat.models import ChatSettings, Conversation, Message
+from chat.schema.types import attach_reaction_counts
+from chat.services.reaction_service import ReactionError, reaction_counts, remove_reaction, set_reaction
+
+User = get_user_model()
+
+
+class ReactionServiceTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="alice", password="pass1234")
+        self.conv = Conversation.objects.create(user=self.user)
+        self.msg = Message.objects.create(conversation=self.conv, sender=self.user, content="hi")
+
+    def test_counts_follow_set_change_and_remove(self):
+        self.assertEqual(set_reaction(self.user, self.msg.id, "like").counts, {"LIKE": 1})
+        self.assertFalse(set_reaction(self.user, self.msg.id, "LIKE").changed)
+        self.assertEqual(set_reaction(self.user, self.msg.id, "HELPFUL").counts, {"HELPFUL": 1})
+        self.assertEqual(remove_reaction(self.user, self.msg.id).counts, {})
+        self.assertFalse(remove_reaction(self.user, self.msg.id).changed)
+
+    def test_rejects_foreign_messages_unknown_reactions_and_disabled_setting(self):
+        other = User.objects.create_user(username="bob", password="pass1234")
+        with self.assertRaises(ReactionError):
+            set_reaction(other, self.msg.id, "LIKE")
+        with self.assertRaises(ReactionError):
+            set_reaction(self.user, self.msg.id, "SHRUG")
+        ChatSettings.objects.create(user=self.user, enable_message_reactions=False)
+        with self.assertRaises(ReactionError) as ctx:
+            set_reaction(self.user, self.msg.id, "LIKE")
+        self.assertEqual(ctx.exception.code, "REACTIONS_DISABLED")
+
+    def test_malformed_message_id_is_not_found(self):
+        for call in (lambda: set_reaction(self.user, "not-a-uuid", "LIKE"), lambda: remove_reaction(self.user, "x")):
+            with self.assertRaises(ReactionError) as ctx:
+                call()
+            self.assertEqual(ctx.exception.code, "NOT_FOUND")
+
+    def test_page_of_messages_costs_one_query(self):
+        messages = [Message.objects.create(conversation=self.conv, sender=self.user, content=str(i)) for i in range(50)]
+        for m in messages[:10]:
+            set_reaction(self.user, m.id, "LOVE")
+        with self.assertNumQueries(1):
+            attach_reaction_counts(messages)
+        self.assertEqual(messages[0]._reaction_counts, {"LOVE": 1})
+        self.assertEqual(messages[-1]._reaction_counts, {})
+        self.assertEqual(len(reaction_counts(m.id for m in messages)), 10)
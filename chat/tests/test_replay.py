@@ -0,0 +1,74 @@
+from django.test import SimpleTestCase, TransactionTestCase
+from django.contrib.auth import get_user_model
+
+from chat.history_cache import history_cache
+from chat.replay import ReplayBuffer, replay_buffer
+from chat.testing import connect, receive_reply, stub_provider
+
+User = get_user_model()
+
+
+class ReplayBufferTests(SimpleTestCase):
+    def test_since_returns_only_newer_events_and_merges_deltas(self):
+        buf = ReplayBuffer()
+        start = buf.latest()
+        buf.record(1, {"type": "message", "content": "hi"})
+        mark = buf.record(1, {"type": "delta", "id": "r", "offset": 0, "delta": "Hel"})
+        buf.record(2, {"type": "message", "content": "other user"})
+        buf.record(1, {"type": "delta", "id": "r", "offset": 3, "delta": "lo"})
+
+        frames = buf.since(1, start)
+        self.assertEqual([f["type"] for f in frames], ["message", "delta"])
+        self.assertEqual((frames[1]["offset"], frames[1]["delta"]), (0, "Hello"))
+        # A client that saw the first chunk gets the merged delta and skips text before its offset
+        self.assertEqual(buf.since(1, mark)[0]["delta"], "Hello")
+        self.assertEqual(buf.since(1, frames[-1]["cursor"]), [])
+
+    def test_unanswerable_cursors_fall_back(self):
+        buf = ReplayBuffer(max_events=2, max_users=1)
+        start = buf.latest()
+        for i in range(3):
+            buf.record(1, {"type": "message", "content": str(i)})
+        self.assertIsNone(buf.since(1, start))  # oldest event trimmed
+        self.assertIsNone(buf.since(1, "other-epoch:1"))
+        self.assertIsNone(buf.since(1, None))
+        recent = buf.latest()
+        self.assertEqual(buf.since(7, recent), [])  # no events for an unknown user
+        buf.record(2, {"type": "message", "content": "evicts user 1"})
+        self.assertIsNone(buf.since(1, recent))
+
+
+class ResumeSessionTests(TransactionTestCase):
+    def setUp(self):
+        replay_buffer.clear()
+        history_cache.clear()
+        self.user = User.objects.create_user(username="alice", password="pass1234")
+        User.objects.create_user(username="Z-Chatbot", password="pass1234")
+
+    async def _exchange(self, ws, text):
+        await ws.send_json_to({"message": text})
+        return await receive_reply(ws)
+
+    async def test_reconnect_replays_only_missed_events(self):
+        with stub_provider():
+            first, _ = await connect(self.user)
+            frames = await self._exchange(first, "one")
+            last_seen = frames[-1]["cursor"]
+            await first.disconnect()
+
+            other, _ = await connect(self.user)
+            await self._exchange(other, "two")
+            await other.disconnect()
+
+            resumed, head = await connect(self.user, last_seen=last_seen)
+            self.assertEqual((head["type"], head["replayed"]), ("resumed", 3))
+            replayed = [await resumed.receive_json_from() for _ in range(3)]
+            self.assertEqual([f.get("kind") or f["type"] for f in replayed], ["user", "delta", "bot"])
+            self.assertEqual(replayed[0]["content"], "two")
+            self.assertEqual(head["cursor"], replayed[-1]["cursor"])
+            self.assertTrue(await resumed.receive_nothing())
+            await resumed.disconnect()
+
+        stale, head = await connect(self.user, last_seen="00000000:1")
+        self.assertEqual(head["type"], "history")
+        await stale.disconnect()
@@ -0,0 +1,135 @@
+import gzip
+import io
+import json
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.db.models import ProtectedError
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from chat.fields import preserve_timestamps
+from chat.models import ChatSettings, Conversation, ConversationShare, Message, MessageBody
+from chat.services.import_service import import_ndjson
+from chat.services.reaction_service import set_reaction
+from chat.services.retention_service import RetentionRunner, RetentionStats, _raw_delete_cascade
+from chat.services.share_service import get_share_target
+
+User = get_user_model()
+
+
+class RetentionRunnerTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.user = User.objects.create_user(username="alice", password="pass1234")
+        self.keeper = User.objects.create_user(username="bob", password="pass1234")
+        ChatSettings.objects.create(user=self.user, auto_delete_after_days=30)
+        old = self.now - timedelta(days=60)
+        with preserve_timestamps():
+            self.old_conv = Conversation.objects.create(user=self.user, created_at=old, updated_at=old)
+            self.mixed_conv = Conversation.objects.create(user=self.user, created_at=old, updated_at=self.now)
+            self.bob_conv = Conversation.objects.create(user=self.keeper, created_at=old, updated_at=old)
+            for i in range(7):
+                Message.objects.create(conversation=self.old_conv, sender=self.user, content=f"old {i}", timestamp=old)
+            self.expired = Message.objects.create(conversation=self.mixed_conv, sender=self.user, content="stale", timestamp=old)
+            Message.objects.create(conversation=self.bob_conv, sender=self.keeper, content="bob's", timestamp=old)
+        self.fresh = Message.objects.create(conversation=self.mixed_conv, sender=self.user, content="fresh")
+        set_reaction(self.user, self.expired.id, "LIKE")
+
+    def test_purges_expired_rows_in_chunks(self):
+        stats = RetentionRunner(chunk_size=3, pause=0).run(now=self.now)
+        self.assertEqual(stats.messages_deleted, 8)
+        self.assertEqual(stats.conversations_deleted, 1)
+        self.assertGreaterEqual(stats.chunks, 4)
+        self.assertFalse(Conversation.objects.filter(pk=self.old_conv.pk).exists())
+        self.assertEqual(list(Message.objects.filter(conversation=self.mixed_conv)), [self.fresh])
+        self.assertTrue(Message.objects.filter(conversation=self.bob_conv).exists())
+
+    def test_dry_run_and_archive(self):
+        stats = RetentionRunner(dry_run=True, pause=0).run(now=self.now)
+        # Counts what a real run deletes, including conversations emptied by the message purge
+        self.assertEqual((stats.messages_deleted, stats.conversations_deleted), (8, 1))
+        self.assertEqual(Message.objects.count(), 10)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            stats = RetentionRunner(archive_dir=tmp, pause=0).run(now=self.now)
+            files = list(Path(tmp).glob("*.ndjson.gz"))
+            self.assertEqual(len(files), 1)
+            records = [json.loads(line) for line in gzip.open(files[0], "rt")]
+        self.assertEqual(stats.archived, 8)
+        self.assertEqual(sum(r["type"] == "message" for r in records), 8)
+        # One record per conversation, each ahead of its messages
+        self.assertCountEqual([r["id"] for r in records if r["type"] == "conversation"],
+                              [str(self.old_conv.pk), str(self.mixed_conv.pk)])
+        first = {}
+        for i, r in enumerate(records):
+            first.setdefault(r.get("conversation_id", r["id"]), i)
+            if r["type"] == "conversation":
+                self.assertEqual(first[r["id"]], i)
+
+    def test_archive_round_trips_through_import(self):
+        self.old_conv.title = "Old chat"
+        self.old_conv.save(update_fields=["title"])
+        Conversation.objects.filter(pk=self.old_conv.pk).update(updated_at=self.now - timedelta(days=45))
+        old_conv = Conversation.objects.get(pk=self.old_conv.pk)
+        with tempfile.TemporaryDirectory() as tmp:
+            RetentionRunner(archive_dir=tmp, pause=0).run(now=self.now)
+            path = next(Path(tmp).glob("*.ndjson.gz"))
+            with gzip.open(path, "rt") as f:
+                result = import_ndjson(self.user, f)
+            with gzip.open(path, "rt") as f:
+                again = import_ndjson(self.user, f)
+        self.assertEqual((result.conversations, result.messages), (1, 8))
+        self.assertEqual((again.conversations, again.messages, again.already_present), (0, 0, 8))
+
+        restored = Conversation.objects.get(pk=old_conv.pk, title="Old chat")
+        self.assertEqual((restored.created_at, restored.updated_at), (old_conv.created_at, old_conv.updated_at))
+        self.assertEqual(sorted(m.content for m in restored.messages.all()), [f"old {i}" for i in range(7)])
+        # The partly purged conversation gets its expired message back, under its original id
+        self.assertEqual(set(Message.objects.filter(conversation=self.mixed_conv)), {self.expired, self.fresh})
+        self.assertEqual(Conversation.objects.filter(user=self.user).count(), 2)
+
+    def test_purged_share_links_stop_resolving(self):
+        share = ConversationShare.objects.create(conversation=self.old_conv, is_public=True)
+        self.assertIsNotNone(get_share_target(share.share_token))  # now cached
+        RetentionRunner(pause=0).run(now=self.now)
+        self.assertIsNone(get_share_target(share.share_token))
+
+    def test_raw_delete_refuses_protected_rows(self):
+        body = MessageBody.objects.create(hash="0" * 64, data=b"", size=0)
+        Message.objects.filter(pk=self.fresh.pk).update(body=body)
+        with self.assertRaises(ProtectedError):
+            _raw_delete_cascade(MessageBody, [body.pk])
+        self.assertTrue(MessageBody.objects.filter(pk=body.pk).exists())
+
+
+class EnforceRetentionCommandTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username="alice", password="pass1234")
+        ChatSettings.objects.create(user=user, auto_delete_after_days=30)
+        old = timezone.now() - timedelta(days=60)
+        with preserve_timestamps():
+            conv = Conversation.objects.create(user=user, created_at=old, updated_at=old)
+            Message.objects.create(conversation=conv, sender=user, content="old", timestamp=old)
+
+    def test_local_cache_is_refused(self):
+        with self.assertRaisesMessage(CommandError, "LocMemCache"):
+            call_command("enforce_retention", "--pause", "0", stdout=io.StringIO())
+        self.assertEqual(Message.objects.count(), 1)
+        call_command("enforce_retention", "--pause", "0", "--dry-run", stdout=io.StringIO())
+
+    def test_allow_local_cache_runs(self):
+        call_command("enforce_retention", "--pause", "0", "--allow-local-cache", stdout=io.StringIO())
+        self.assertFalse(Message.objects.exists())
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache",
+                                           "LOCATION": "redis://127.0.0.1:6379"}})
+    def test_shared_cache_is_accepted(self):
+        with mock.patch("chat.management.commands.enforce_retention.RetentionRunner") as runner:
+            runner.return_value.run.return_value = RetentionStats()
+            call_command("enforce_retention", "--pause", "0", stdout=io.StringIO())
+        runner.return_value.run.assert_called_once()
@@ -0,0 +1,48 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+
+from chat.models import Conversation, Message
+from chat.services.search_service import build_match_expression, search_messages
+
+User = get_user_model()
+
+
+class SearchServiceTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username="alice", password="pass1234")
+        self.bob = User.objects.create_user(username="bob", password="pass1234")
+        self.conv = Conversation.objects.create(user=self.alice)
+        other = Conversation.objects.create(user=self.bob)
+        Message.objects.create(conversation=self.conv, sender=self.alice, content="How do I tune SQLite pragmas?")
+        Message.objects.create(conversation=self.conv, sender=self.alice, content="Explain Django signals")
+        Message.objects.create(conversation=other, sender=self.bob, content="SQLite pragmas for bob")
+
+    def test_results_are_scoped_to_user_and_highlighted(self):
+        page = search_messages(self.alice, "sqlite")
+        self.assertEqual(len(page.hits), 1)
+        self.assertIn("<mark>SQLite</mark>", page.hits[0].snippet)
+        self.assertEqual(page.hits[0].sender, "alice")
+
+    def test_index_follows_updates_and_deletes(self):
+        msg = Message.objects.get(content="Explain Django signals")
+        msg.content = "Explain Django middleware"
+        msg.save()
+        self.assertEqual(len(search_messages(self.alice, "signals").hits), 0)
+        self.assertEqual(len(search_messages(self.alice, "middleware").hits), 1)
+        msg.delete()
+        self.assertEqual(len(search_messages(self.alice, "middleware").hits), 0)
+
+    def test_pagination_cursor(self):
+        for i in range(3):
+            Message.objects.create(conversation=self.conv, sender=self.alice, content=f"pagination note {i}")
+        first = search_messages(self.alice, "pagination", first=2)
+        self.assertTrue(first.has_next_page)
+        rest = search_messages(self.alice, "pagination", first=2, after=first.end_cursor)
+        self.assertFalse(rest.has_next_page)
+        ids = {h.message_id for h in first.hits} | {h.message_id for h in rest.hits}
+        self.assertEqual(len(ids), 3)
+
+    def test_match_expression_quotes_operators(self):
+        expr = build_match_expression(7, 'foo OR "bar" NEAR(')
+        self.assertEqual(expr, 'owner:"u7" AND content:("foo" "OR" "bar" "NEAR"*)')
+        self.assertIsNone(build_match_expression(7, '  "" '))
@@ -0,0 +1,97 @@
+import asyncio
+import socket
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from chat.connections import SERVICE_RESTART_CLOSE_CODE, registry
+from chat.history_cache import history_cache
+from chat.management.commands.serve import listen_socket
+from chat.testing import connect, stub_provider
+
+User = get_user_model()
+
+
+class ListenSocketTests(SimpleTestCase):
+    def test_port_can_be_bound_again_while_in_use(self):
+        first = listen_socket("127.0.0.1", 0)
+        port = first.getsockname()[1]
+        second = listen_socket("127.0.0.1", port)  # a new deployment starting next to a draining one
+        self.assertEqual(second.getsockname()[1], port)
+        self.assertTrue(first.getsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT))
+        first.close()
+        second.close()
+
+
+class WorkerStateTests(SimpleTestCase):
+    def test_several_workers_refused_with_per_process_state(self):
+        with mock.patch("chat.management.commands.serve.listen_socket") as listen, \
+                self.assertRaisesMessage(CommandError, "InMemoryChannelLayer"):
+            call_command("serve", "--workers", "2")
+        listen.assert_not_called()
+
+    @override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels_redis.pubsub.RedisPubSubChannelLayer"}})
+    def test_local_cache_alone_is_refused(self):
+        with self.assertRaisesMessage(CommandError, "LocMemCache"):
+            call_command("serve", "--workers", "2")
+
+
+def slow_stream(release: asyncio.Event):
+    async def stream(user_message, memories=None):
+        yield "Hel"
+        await release.wait()
+        yield "lo"
+    return stream
+
+
+class DrainTests(TransactionTestCase):
+    def setUp(self):
+        history_cache.clear()
+        self.user = User.objects.create_user(username="alice", password="pass1234")
+        User.objects.create_user(username="Z-Chatbot", password="pass1234")
+
+    def tearDown(self):
+        registry.draining = False
+
+    async def _frames_until_close(self, ws):
+        frames = []
+        while True:
+            output = await ws.receive_output(timeout=3)
+            if output["type"] == "websocket.close":
+                return frames, output.get("code")
+            frames.append(output)
+
+    async def test_reply_in_progress_finishes_before_close(self):
+        release = asyncio.Event()
+        with stub_provider(slow_stream(release)):
+            (busy, _), (idle, _) = await connect(self.user), await connect(self.user)
+            await busy.send_json_to({"message": "hi", "id": "11111111-1111-4111-8111-111111111111"})
+            while (await busy.receive_json_from()).get("type") != "delta":
+                pass
+            drain = asyncio.ensure_future(registry.drain(timeout=5))
+            _, code = await self._frames_until_close(idle)  # nothing in flight: closed at once
+            self.assertEqual(code, SERVICE_RESTART_CLOSE_CODE)
+
+            await busy.send_json_to({"message": "another", "id": "x"})
+            self.assertEqual((await busy.receive_json_from())["code"], "SERVER_DRAINING")
+            release.set()
+            frames, code = await self._frames_until_close(busy)
+            self.assertEqual(await drain, 0)
+        self.assertEqual(code, SERVICE_RESTART_CLOSE_CODE)
+        self.assertIn('"content":"Hello"', frames[-1]["text"].replace(" ", ""))
+        await busy.disconnect()
+        await idle.disconnect()
+
+    async def test_replies_are_cut_off_at_the_deadline(self):
+        with stub_provider(slow_stream(asyncio.Event())):
+            ws, _ = await connect(self.user)
+            await ws.send_json_to({"message": "hi"})
+            while (await ws.receive_json_from()).get("type") != "delta":
+                pass
+            self.assertEqual(await registry.drain(timeout=0.2), 1)
+            _, code = await self._frames_until_close(ws)
+        self.assertEqual(code, SERVICE_RESTART_CLOSE_CODE)
+        await ws.disconnect()
@@ -0,0 +1,123 @@
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import OperationalError
+from django.test import TestCase, TransactionTestCase
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils import timezone
+
+from chat.models import Conversation, ConversationShare, Message
+from chat.services.share_service import ViewCounter
+
+User = get_user_model()
+
+
+class SharedConversationViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # A counter of our own without its flusher thread, which would touch the DB outside the test
+        self.counter = ViewCounter(60)
+        for patcher in (mock.patch("chat.views.view_counter", self.counter), mock.patch.object(self.counter, "_run")):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user(username="alice", password="pass1234")
+        self.conv = Conversation.objects.create(user=self.user, title="Shared")
+        Message.objects.create(conversation=self.conv, sender=self.user, content="first")
+        self.share = ConversationShare.objects.create(conversation=self.conv, is_public=True)
+        self.url = reverse("chat-share", args=[self.share.share_token])
+
+    def test_snapshot_is_cached_and_conditional(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json()["messages"][0]["content"], "first")
+        with self.assertNumQueries(0):
+            again = self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(again.status_code, 304)
+
+    def test_message_write_invalidates_snapshot(self):
+        etag = self.client.get(self.url)["ETag"]
+        Message.objects.create(conversation=self.conv, sender=self.user, content="second")
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["messages"]), 2)
+
+    def test_private_or_expired_share_is_404(self):
+        self.share.expires_at = timezone.now() - timedelta(minutes=1)
+        self.share.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.share.expires_at = None
+        self.share.is_public = False
+        self.share.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_view_counts_are_batched(self):
+        for _ in range(5):
+            self.client.get(self.url)
+        self.share.refresh_from_db()
+        self.assertEqual(self.share.view_count, 0)
+        self.assertEqual(self.counter.pending(self.share.id), 5)
+        self.assertEqual(self.counter.flush(), 5)
+        self.share.refresh_from_db()
+        self.assertEqual(self.share.view_count, 5)
+
+
+class ViewCounterTests(TransactionTestCase):
+    def setUp(self):
+        user = User.objects.create_user(username="alice", password="pass1234")
+        self.share = ConversationShare.objects.create(conversation=Conversation.objects.create(user=user))
+
+    def test_counts_are_flushed_without_further_hits(self):
+        counter = ViewCounter(0.05)
+        self.addCleanup(counter.stop)
+        counter.hit(self.share.id)
+        counter.hit(self.share.id)
+        deadline = time.monotonic() + 2
+        while counter.pending(self.share.id) and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.share.refresh_from_db()
+        self.assertEqual(self.share.view_count, 2)
+
+    def test_failed_write_keeps_the_counts(self):
+        counter = ViewCounter(60)
+        self.addCleanup(counter.stop)
+        counter.hit(self.share.id)
+        with mock.patch.object(ConversationShare.objects, "filter", side_effect=OperationalError("locked")), \
+                self.assertRaises(OperationalError):
+            counter.flush()
+        counter.hit(self.share.id)
+        self.assertEqual(counter.pending(self.share.id), 2)
+        self.assertEqual(counter.flush(), 2)
+        self.share.refresh_from_db()
+        self.assertEqual(self.share.view_count, 2)
+
+    def test_flusher_survives_errors_and_is_restarted(self):
+        counter = ViewCounter(0.02)
+        self.addCleanup(counter.stop)
+        calls = []
+
+        def close_old_connections():
+            calls.append(None)
+            if len(calls) == 1:
+                raise RuntimeError("connection cleanup failed")
+
+        with mock.patch("chat.services.share_service.close_old_connections", close_old_connections):
+            counter.hit(self.share.id)
+            deadline = time.monotonic() + 2
+            while len(calls) < 3 and time.monotonic() < deadline:
+                time.sleep(0.02)
+            self.assertTrue(counter._flusher.is_alive())
+        self.assertEqual(counter.pending(self.share.id), 0)
+
+        # A flusher that died anyway is replaced on the next hit
+        dead = threading.Thread(target=lambda: None)
+        dead.start()
+        dead.join()
+        restarted = ViewCounter(60)
+        restarted._flusher = dead
+        with mock.patch.object(restarted, "_run"):
+            restarted.hit(self.share.id)
+        self.assertIsNot(restarted._flusher, dead)
@@ -0,0 +1,107 @@
+import io
+import os
+import tempfile
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from graphql_jwt.shortcuts import get_token
+
+from chat.consumers import ChatConsumer
+from chat.history_cache import history_cache
+from chat.models import Conversation
+from chat.testing import receive_reply, stub_provider
+from core.channels.jwt_auth import JWTAuthMiddleware
+from core.tracing import annotate, observe_spans, trace_span, traced
+
+User = get_user_model()
+
+
+@override_settings(CHAT_TRACING_SAMPLE_RATE=1.0, CHAT_TRACING_EXPORTER="file")
+class SpanTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "traces.jsonl")
+        self.enterContext(override_settings(CHAT_TRACING_FILE=self.path))
+
+    async def test_children_across_threads_and_tasks(self):
+        @traced("sync.child")
+        def in_thread():
+            annotate(thread=True)
+
+        spans = []
+        with observe_spans(spans.append):
+            with trace_span("root", kind="test") as root:
+                await sync_to_async(in_thread)()
+                with trace_span("async.child"):
+                    pass
+        self.assertEqual([span.name for span in spans], ["sync.child", "async.child", "root"])
+        self.assertEqual({span.trace_id for span in spans}, {root.trace_id})
+        self.assertEqual(spans[0].parent_id, root.span_id)
+        self.assertEqual(spans[0].attributes, {"thread": True})
+        self.assertEqual(root.attributes, {"kind": "test"})
+
+    def test_errors_are_recorded_and_raised(self):
+        spans = []
+        with observe_spans(spans.append), self.assertRaises(ValueError):
+            with trace_span("failing"):
+                raise ValueError("boom")
+        self.assertEqual(spans[0].status, "error")
+        self.assertEqual(spans[0].attributes["error"], "ValueError: boom")
+
+    def test_sampling_is_decided_at_the_root(self):
+        spans = []
+        with observe_spans(spans.append):
+            with override_settings(CHAT_TRACING_SAMPLE_RATE=0):
+                with trace_span("unsampled") as root:
+                    with override_settings(CHAT_TRACING_SAMPLE_RATE=1.0), trace_span("child") as child:
+                        pass
+        self.assertIsNone(root)
+        self.assertIsNone(child)
+        self.assertEqual(spans, [])
+
+    def test_file_exporter_and_report(self):
+        with trace_span("ws.receive"):
+            with trace_span("ai.response"):
+                pass
+        out = io.StringIO()
+        call_command("trace_report", self.path, "--root", "ws.receive", stdout=out)
+        report = out.getvalue()
+        self.assertIn("1 traces", report)
+        self.assertRegex(report, r"\n  ws\.receive .*\n    ai\.response ")
+
+
+@override_settings(CHAT_TRACING_SAMPLE_RATE=1.0)
+class SocketTracingTests(TransactionTestCase):
+    def setUp(self):
+        history_cache.clear()
+        self.user = User.objects.create_user(username="alice", password="pass1234")
+        User.objects.create_user(username="Z-Chatbot", password="pass1234")
+        self.conversation = Conversation.objects.create(user=self.user, title="first")
+
+    async def test_reply_is_one_trace_from_receive_to_persistence(self):
+        token = await sync_to_async(get_token)(self.user)
+        spans = []
+        with observe_spans(spans.append), stub_provider(), mock.patch("builtins.print"):
+            ws = WebsocketCommunicator(JWTAuthMiddleware(ChatConsumer.as_asgi()), f"/ws/chat/?token={token}")
+            await ws.connect()
+            await ws.receive_json_from()  # history
+            await ws.receive_json_from()  # Connected
+            await ws.send_json_to({"message": "hello", "conversation_id": str(self.conversation.id)})
+            await receive_reply(ws)
+            await ws.disconnect()
+        auth = next(span for span in spans if span.name == "ws.auth_middleware")
+        self.assertEqual(auth.attributes["user_id"], self.user.id)
+        receive = next(span for span in spans if span.name == "ws.receive")
+        trace = {span.name: span for span in spans if span.trace_id == receive.trace_id}
+        self.assertTrue({"ws.receive", "ws.reply", "ai.get_response", "ai.stream", "db.save_chat_message",
+                         "channel_layer.group_send"} <= set(trace), set(trace))
+        self.assertEqual(trace["ws.reply"].parent_id, receive.span_id)
+        self.assertEqual(trace["ai.stream"].parent_id, trace["ai.get_response"].span_id)
+        self.assertIn("first_token_ms", trace["ai.stream"].attributes)
+        self.assertEqual(trace["db.save_chat_message"].attributes["operation"], "ws:reply")
+        self.assertGreater(trace["db.save_chat_message"].attributes["db.queries"], 0)
@@ -0,0 +1,88 @@
+import datetime
+import unittest
+import uuid
+import zlib
+
+from asgiref.sync import sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TransactionTestCase
+from graphql_jwt.shortcuts import get_token
+
+from chat.consumers import ChatConsumer
+from chat.history_cache import history_cache
+from chat.models import Conversation, Message
+from chat.wire import DEFLATE_WBITS, JSON, MSGPACK, Deflater, FrameDecodeError, decode_frame, msgpack, negotiate
+
+User = get_user_model()
+
+
+@unittest.skipIf(MSGPACK is None, "msgpack is not installed")
+class WireFormatTests(SimpleTestCase):
+    header = {"type": "history", "conversation_id": None, "cursor": "abc:1"}
+    messages = [{"id": "1", "timestamp": datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)}]
+
+    def test_envelopes_match_encoding_the_whole_frame(self):
+        frame = dict(self.header, messages=self.messages)
+        for wire in (JSON, MSGPACK):
+            built = wire.envelope(self.header, "messages", wire.encode(self.messages))
+            self.assertEqual(wire.decode(built), wire.decode(wire.encode(frame)))
+        self.assertEqual(MSGPACK.decode(MSGPACK.encode({"id": uuid.UUID(int=1)}))["id"], str(uuid.UUID(int=1)))
+
+    def test_deflated_frames_share_one_context(self):
+        deflate = Deflater()
+        inflater = zlib.decompressobj(-DEFLATE_WBITS)
+        frames = [{"type": "delta", "id": "r", "delta": "the same words again "} for _ in range(3)]
+        sizes = []
+        for frame in frames:
+            payload = deflate(MSGPACK.encode(frame))
+            sizes.append(len(payload))
+            self.assertEqual(MSGPACK.decode(inflater.decompress(payload)), frame)
+        self.assertLess(sizes[-1], sizes[0] / 2)
+
+    def test_negotiation_and_decoding(self):
+        self.assertEqual(negotiate(["auth.token.x", "zchat.msgpack.deflate"])[1:], (MSGPACK, True))
+        self.assertEqual(negotiate(["zchat.json", "zchat.msgpack"])[:2], ("zchat.json", JSON))
+        self.assertEqual(negotiate([]), (None, JSON, False))
+        self.assertEqual(decode_frame('{"a":1}', None), {"a": 1})
+        self.assertEqual(decode_frame(None, msgpack.packb({"a": 1})), {"a": 1})
+        with self.assertRaises(FrameDecodeError):
+            decode_frame(None, b"\xc1")
+
+
+@unittest.skipIf(MSGPACK is None, "msgpack is not installed")
+class MsgpackConsumerTests(TransactionTestCase):
+    def setUp(self):
+        history_cache.clear()
+        self.user = User.objects.create_user(username="alice", password="pass1234")
+        conversation = Conversation.objects.create(user=self.user)
+        Message.objects.create(conversation=conversation, sender=self.user, content="hello " * 50)
+
+    async def test_binary_client_gets_deflated_msgpack_frames(self):
+        ws = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/", subprotocols=["zchat.msgpack.deflate"])
+        connected, subprotocol = await ws.connect()
+        self.assertEqual((connected, subprotocol), (True, "zchat.msgpack.deflate"))
+        inflater = zlib.decompressobj(-DEFLATE_WBITS)
+
+        async def receive():
+            return msgpack.unpackb(inflater.decompress(await ws.receive_from()))
+
+        self.assertEqual(await receive(), {"info": "Connected"})
+        await ws.send_to(bytes_data=msgpack.packb({"token": await sync_to_async(get_token)(self.user)}))
+        self.assertEqual((await receive())["code"], "AUTH_OK")
+        history = await receive()
+        self.assertEqual(history["messages"][0]["content"], "hello " * 50)
+
+        await ws.send_to(bytes_data=msgpack.packb({"type": "stats"}))
+        stats = await receive()
+        self.assertEqual((stats["protocol"], stats["frames_sent"]), ("zchat.msgpack.deflate", 3))
+        self.assertLess(stats["bytes_sent"], len(JSON.encode(history)))
+        await ws.send_to(text_data='{"type": "stats"}')  # text frames are still JSON
+        self.assertEqual((await receive())["frames_sent"], 4)
+        await ws.disconnect()
+
+    async def test_plain_clients_still_get_json_text(self):
+        ws = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
+        self.assertEqual(await ws.connect(), (True, None))
+        self.assertEqual(await ws.receive_json_from(), {"info": "Connected"})
+        await ws.disconnect()
@@ -0,0 +1,9 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('export/', views.export_conversations, name='chat-export'),
+    path('export/<uuid:conversation_id>/', views.export_conversations, name='chat-export-conversation'),
+    path('import/', views.import_conversations, name='chat-import'),
+    path('share/<uuid:share_token>/', views.shared_conversation, name='chat-share'),
+]
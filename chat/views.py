@@ -1,3 +1,72 @@
-from django.shortcuts import render
+import gzip
 
-# Create your views here.
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from chat.services.export_service import ExportError, build_export
+from chat.services.import_service import import_ndjson
+from chat.services.share_service import get_share_target, get_snapshot, view_counter
+from core.http.auth import jwt_required
+from core.http.streaming import stream_response
+
+
+@require_GET
+@jwt_required
+def export_conversations(request, conversation_id=None):
+    """Stream the user's conversations (or one conversation) as NDJSON, JSON or Markdown.
+
+    Query params: ``format`` (ndjson|json|markdown, default ndjson), ``gzip=1``.
+    """
+    fmt = request.GET.get('format', 'ndjson').lower()
+    gzip = request.GET.get('gzip', '').lower() in ('1', 'true', 'yes')
+    try:
+        chunks, content_type, filename = build_export(request.user, fmt, conversation_id=conversation_id, gzip=gzip)
+    except ExportError as e:
+        return JsonResponse({'error': str(e), 'code': e.code}, status=404 if e.code == 'NOT_FOUND' else 400)
+    return stream_response(request, chunks, content_type, filename)
+
+
+@csrf_exempt
+@require_POST
+@jwt_required
+def import_conversations(request):
+    """Import NDJSON into the user's account.
+
+    Accepts either a multipart upload (field ``file``) or the raw NDJSON request
+    body; gzip input is detected from ``Content-Encoding: gzip`` or a ``.gz``
+    filename. The body is read line by line, never loaded whole.
+    """
+    upload = request.FILES.get('file')
+    if upload is not None:
+        stream, is_gzip = upload, upload.name.endswith('.gz')
+    else:
+        stream, is_gzip = request, request.headers.get('Content-Encoding', '').lower() == 'gzip'
+    if is_gzip:
+        stream = gzip.GzipFile(fileobj=stream, mode='rb')
+    try:
+        result = import_ndjson(request.user, stream)
+    except (OSError, EOFError) as e:  # corrupt gzip stream
+        return JsonResponse({'error': f'Could not read upload: {e}', 'code': 'INVALID_IMPORT'}, status=400)
+    return JsonResponse(result.as_dict(), status=200)
+
+
+@require_GET
+def shared_conversation(request, share_token):
+    """Public, cacheable read of a shared conversation with ETag/Last-Modified support."""
+    target = get_share_target(share_token)
+    if target is None or target.is_expired:
+        raise Http404("Share not found")
+    snapshot = get_snapshot(target.conversation_id)
+    view_counter.hit(target.share_id)
+
+    last_modified = int(snapshot.last_modified.timestamp())
+    response = get_conditional_response(request, etag=snapshot.etag, last_modified=last_modified)
+    if response is None:
+        response = HttpResponse(snapshot.body, content_type='application/json')
+    response['ETag'] = snapshot.etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'public, max-age=60'
+    return response
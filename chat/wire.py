@@ -0,0 +1,109 @@
+"""Wire formats a WebSocket client can negotiate with ``Sec-WebSocket-Protocol``.
+
+- no subprotocol (or ``zchat.json``): JSON text frames, the default;
+- ``zchat.msgpack``: every frame is one MessagePack map in a binary frame;
+- ``zchat.msgpack.deflate``: as ``zchat.msgpack``, but server frames are
+  raw-deflated with a per-connection compression context and flushed with
+  ``Z_SYNC_FLUSH`` (like permessage-deflate with context takeover), so
+  repeated keys and texts across frames cost a few bytes. Decode them with
+  one long-lived inflater per connection (``wbits=-DEFLATE_WBITS``).
+
+Client frames are always plain JSON text or plain MessagePack. Values a frame
+holds natively (datetimes, UUIDs) are written as strings in every format.
+MessagePack needs the optional ``msgpack`` package; without it only JSON is
+offered. Transport-level permessage-deflate is up to the ASGI server (uvicorn
+negotiates it for JSON clients too); Daphne does not, hence the subprotocol.
+"""
+from __future__ import annotations
+
+import zlib
+
+from .jsoncodec import JSONDecodeError, dumps, encode_default, loads
+
+try:
+    import msgpack
+except ImportError:  # optional binary protocol
+    msgpack = None
+
+JSON_SUBPROTOCOL = "zchat.json"
+MSGPACK_SUBPROTOCOL = "zchat.msgpack"
+MSGPACK_DEFLATE_SUBPROTOCOL = "zchat.msgpack.deflate"
+# 4 KiB window and small memLevel keep each connection's compressor around 32 KiB
+DEFLATE_WBITS = 12
+_DEFLATE_MEM_LEVEL = 5
+
+
+class FrameDecodeError(ValueError):
+    pass
+
+
+class JsonWire:
+    name = "json"
+    binary = False
+
+    def encode(self, obj) -> str:
+        return dumps(obj)
+
+    def decode(self, data):
+        try:
+            return loads(data)
+        except JSONDecodeError as e:
+            raise FrameDecodeError(str(e)) from e
+
+    def envelope(self, header: dict, key: str, encoded_value: str) -> str:
+        """``header`` plus one more ``key`` whose value is already encoded."""
+        return f'{dumps(header)[:-1]},{dumps(key)}:{encoded_value}}}'
+
+
+class MsgpackWire:
+    name = "msgpack"
+    binary = True
+
+    def encode(self, obj) -> bytes:
+        return msgpack.packb(obj, default=encode_default)
+
+    def decode(self, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        try:
+            return msgpack.unpackb(data, raw=False)
+        except Exception as e:  # msgpack raises several unrelated types for bad input
+            raise FrameDecodeError(str(e)) from e
+
+    def envelope(self, header: dict, key: str, encoded_value: bytes) -> bytes:
+        if len(header) >= 15:
+            raise ValueError("envelope() only builds fixmaps (at most 15 keys)")
+        packed = self.encode(header)
+        # A fixmap header byte is 0x80 | size: bump the size and append the pre-encoded pair
+        return bytes((packed[0] + 1,)) + packed[1:] + self.encode(key) + encoded_value
+
+
+class Deflater:
+    """Per-connection compression context for ``zchat.msgpack.deflate``."""
+
+    def __init__(self, level: int = 6):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, -DEFLATE_WBITS, _DEFLATE_MEM_LEVEL)
+
+    def __call__(self, payload: bytes) -> bytes:
+        return self._compressor.compress(payload) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+JSON = JsonWire()
+MSGPACK = MsgpackWire() if msgpack is not None else None
+
+
+def decode_frame(text_data: str | None, bytes_data: bytes | None):
+    """Decode a client frame: text frames are JSON, binary frames MessagePack, whatever was negotiated."""
+    if text_data is not None or MSGPACK is None:
+        return JSON.decode(text_data if text_data is not None else bytes_data)
+    return MSGPACK.decode(bytes_data)
+
+
+def negotiate(requested: list[str]) -> tuple[str | None, JsonWire | MsgpackWire, bool]:
+    """Pick ``(subprotocol, wire, deflate)`` from the client's subprotocols, in the client's order of preference."""
+    for subprotocol in requested:
+        if subprotocol == JSON_SUBPROTOCOL:
+            return subprotocol, JSON, False
+        if MSGPACK is not None and subprotocol in (MSGPACK_SUBPROTOCOL, MSGPACK_DEFLATE_SUBPROTOCOL):
+            return subprotocol, MSGPACK, subprotocol == MSGPACK_DEFLATE_SUBPROTOCOL
+    return None, JSON, False
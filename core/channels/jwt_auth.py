@@ -8,14 +8,14 @@ Adds support for tokens passed as:
 """
 from __future__ import annotations
 import urllib.parse
-from typing import Callable, Awaitable
+from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
-from django.db import close_old_connections
 from graphql_jwt.settings import jwt_settings
-from graphql_jwt.utils import get_authorization_header
 from graphql_jwt.shortcuts import get_user_by_payload
 import jwt
 
+from core.tracing import annotate, trace_span
+
 User = get_user_model()
 
 
@@ -23,8 +23,8 @@ class JWTAuthMiddleware:
     def __init__(self, inner):
         self.inner = inner
 
-    def __call__(self, scope):
-        return JWTAuthMiddlewareInstance(scope, self.inner)
+    async def __call__(self, scope, receive, send):
+        return await JWTAuthMiddlewareInstance(scope, self.inner)(receive, send)
 
 
 class JWTAuthMiddlewareInstance:
@@ -33,15 +33,14 @@ class JWTAuthMiddlewareInstance:
         self.inner = inner
 
     async def __call__(self, receive, send):
-        # Ensure DB connections are usable
-        close_old_connections()
-        token = self._extract_token()
-        if token:
-            user = await self._get_user(token)
-            if user:
-                self.scope['user'] = user
-        inner = self.inner(self.scope)
-        return await inner(receive, send)
+        with trace_span('ws.auth_middleware'):
+            token = self._extract_token()
+            if token:
+                user = await self._get_user(token)
+                if user:
+                    self.scope['user'] = user
+            annotate(token=bool(token), user_id=getattr(self.scope.get('user'), 'id', None))
+        return await self.inner(self.scope, receive, send)
 
     def _extract_token(self) -> str | None:
         # 1. Query string
@@ -84,7 +83,9 @@ class JWTAuthMiddlewareInstance:
                 return sp.split('.', 2)[2]
         return None
 
-    async def _get_user(self, token: str):
+    @database_sync_to_async
+    def _get_user(self, token: str):
+        # database_sync_to_async also closes stale DB connections around the lookup
         try:
             payload = jwt.decode(token, jwt_settings.JWT_SECRET_KEY, algorithms=[jwt_settings.JWT_ALGORITHM])
             user = get_user_by_payload(payload)
@@ -0,0 +1,57 @@
+"""Channel layer profiles selected by ``CHAT_CHANNEL_LAYER``.
+
+- ``memory``: ``InMemoryChannelLayer``. Groups only reach consumers in the same
+  process, so this is for development and single-worker deployments.
+- ``redis-pubsub``: ``RedisPubSubChannelLayer``. Group sends are one Redis
+  ``PUBLISH`` that every worker with a member receives, and each worker keeps
+  its own group membership, so there is nothing to expire in Redis. Messages
+  for a worker that is not connected are lost, which suits live chat frames
+  (clients resume through the replay buffer). Recommended for production.
+- ``redis``: ``RedisChannelLayer``. Messages are queued in Redis lists with a
+  per-channel ``capacity`` and ``expiry``, and group membership is a sorted set
+  kept for ``group_expiry`` seconds. Use it when messages must survive a short
+  worker stall, at the cost of several round trips per group send.
+
+This module does not import Django so ``core.settings`` can use it.
+"""
+from __future__ import annotations
+
+PROFILES = ("memory", "redis-pubsub", "redis")
+
+
+def channel_layer_config(profile: str = "memory", url: str = "redis://localhost:6379/2", prefix: str = "zchat",
+                         capacity: int = 100, expiry: int = 60, group_expiry: int = 86400) -> dict:
+    """The ``CHANNEL_LAYERS['default']`` entry for ``profile``.
+
+    ``url`` may hold several comma-separated Redis URLs to shard channels and
+    groups across servers. ``capacity`` and ``expiry`` bound the per-channel
+    queues of the ``memory`` and ``redis`` layers; ``group_expiry`` must be
+    longer than the longest-lived socket or it silently drops out of its groups.
+    The ``redis-pubsub`` layer queues nothing and ignores all three.
+    """
+    if profile == "memory":
+        return {
+            "BACKEND": "channels.layers.InMemoryChannelLayer",
+            "CONFIG": {"capacity": capacity, "expiry": expiry, "group_expiry": group_expiry},
+        }
+    hosts = [host.strip() for host in url.split(",") if host.strip()]
+    if profile == "redis-pubsub":
+        return {
+            "BACKEND": "channels_redis.pubsub.RedisPubSubChannelLayer",
+            "CONFIG": {"hosts": hosts, "prefix": prefix},
+        }
+    if profile == "redis":
+        return {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {"hosts": hosts, "prefix": prefix, "capacity": capacity, "expiry": expiry,
+                       "group_expiry": group_expiry},
+        }
+    raise ValueError(f"Unknown CHAT_CHANNEL_LAYER '{profile}', expected one of {', '.join(PROFILES)}")
+
+
+def build_channel_layer(config: dict):
+    """Instantiate a layer from a ``CHANNEL_LAYERS`` entry without going through Django settings."""
+    from importlib import import_module
+
+    module, _, name = config["BACKEND"].rpartition(".")
+    return getattr(import_module(module), name)(**config.get("CONFIG", {}))
@@ -1,7 +1,11 @@
 from __future__ import annotations
+import inspect
+
 from graphql import GraphQLError
 
 from authentication.services.user_service import RegistrationError
+from chat.services.rate_limit_service import RateLimited
+from chat.services.reaction_service import ReactionError
 
 
 class DomainErrorMiddleware:
@@ -15,9 +19,33 @@ class DomainErrorMiddleware:
 
     def resolve(self, next, root, info, **args):  # type: ignore[override]
         try:
-            return next(root, info, **args)
-        except RegistrationError as exc:
-            raise GraphQLError(str(exc), extensions={"code": "REGISTRATION_ERROR"})
-        except Exception:
-            # Re-raise; let default formatting happen. Could log here.
-            raise
+            result = next(root, info, **args)
+        except Exception as exc:
+            translated = self.translate(exc)
+            if translated is exc:
+                raise
+            raise translated from exc
+        if inspect.isawaitable(result):
+            # Async resolvers raise when awaited, after this method has returned
+            return self._resolve_async(result)
+        return result
+
+    async def _resolve_async(self, result):
+        try:
+            return await result
+        except Exception as exc:
+            translated = self.translate(exc)
+            if translated is exc:
+                raise
+            raise translated from exc
+
+    @staticmethod
+    def translate(exc: Exception) -> Exception:
+        if isinstance(exc, RegistrationError):
+            return GraphQLError(str(exc), extensions={"code": "REGISTRATION_ERROR"})
+        if isinstance(exc, ReactionError):
+            return GraphQLError(str(exc), extensions={"code": exc.code})
+        if isinstance(exc, RateLimited):
+            return GraphQLError(str(exc), extensions={"code": exc.code, "retryAfter": exc.retry_after})
+        # Anything else keeps its default formatting. Could log here.
+        return exc
@@ -0,0 +1,15 @@
+from __future__ import annotations
+
+from core.queries import add_root_field
+
+
+class QueryProfileMiddleware:
+    """Name the tracked GraphQL operation after the root fields it resolves (see ``core.queries``).
+
+    Add this middleware class to GRAPHENE["MIDDLEWARE"] in settings.py.
+    """
+
+    def resolve(self, next, root, info, **args):  # type: ignore[override]
+        if info.path.prev is None:
+            add_root_field(info.field_name)
+        return next(root, info, **args)
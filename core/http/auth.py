@@ -0,0 +1,40 @@
+"""JWT authentication helpers for plain Django (non-GraphQL) HTTP views.
+
+Accepts the same credentials as the GraphQL endpoint:
+- Header: Authorization: JWT <token>
+- Query string: ?token=<token> (handy for download links)
+Falls back to the session user when one is logged in.
+"""
+from __future__ import annotations
+from functools import wraps
+
+from django.http import JsonResponse
+from graphql_jwt.shortcuts import get_user_by_token
+from graphql_jwt.utils import get_http_authorization
+
+
+def get_request_user(request):
+    """Return the authenticated, active user for ``request`` or ``None``."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user
+    token = get_http_authorization(request) or request.GET.get('token')
+    if not token:
+        return None
+    try:
+        user = get_user_by_token(token)
+    except Exception:
+        return None
+    return user if user is not None and user.is_active else None
+
+
+def jwt_required(view):
+    """Reject unauthenticated requests with a 401 JSON error; sets ``request.user`` otherwise."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        user = get_request_user(request)
+        if user is None:
+            return JsonResponse({'error': 'Not authenticated', 'code': 'UNAUTHENTICATED'}, status=401)
+        request.user = user
+        return view(request, *args, **kwargs)
+    return wrapper
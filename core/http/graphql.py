@@ -0,0 +1,24 @@
+"""GraphQL view that encodes responses with the fast JSON codec and counts each operation's queries."""
+from __future__ import annotations
+
+from graphene_django.views import GraphQLView as BaseGraphQLView
+
+from chat.jsoncodec import dumps
+from core.queries import profiling_enabled, track_queries
+
+
+class GraphQLView(BaseGraphQLView):
+    def execute_graphql_request(self, request, *args, **kwargs):
+        # Renamed after its root fields by QueryProfileMiddleware
+        with track_queries("graphql") as queries:
+            request.graphql_queries = queries
+            return super().execute_graphql_request(request, *args, **kwargs)
+
+    def json_encode(self, request, d, pretty=False):
+        queries = getattr(request, "graphql_queries", None)
+        if queries is not None and profiling_enabled() and isinstance(d, dict):
+            d.setdefault("extensions", {})["queries"] = queries.as_dict(statements=True)
+        if not (self.pretty or pretty) and not request.GET.get("pretty"):
+            return dumps(d)
+        # Pretty output is for humans in GraphiQL; the standard library's indentation is fine there
+        return super().json_encode(request, d, pretty=True)
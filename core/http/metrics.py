@@ -0,0 +1,29 @@
+"""``GET /metrics``: the Prometheus scrape endpoint.
+
+Off (404) unless ``CHAT_METRICS_ENABLED=true``, as it reveals traffic and model
+names. When enabling it, set ``CHAT_METRICS_TOKEN`` so scrapers must send
+``Authorization: Bearer <token>``, or restrict the path at the proxy.
+"""
+from __future__ import annotations
+
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.views.decorators.http import require_GET
+
+from core.metrics import CONTENT_TYPE, collect, render
+
+
+@require_GET
+def metrics_view(request):
+    if not getattr(settings, "CHAT_METRICS_ENABLED", False):
+        raise Http404()
+    token = getattr(settings, "CHAT_METRICS_TOKEN", "")
+    if token:
+        scheme, _, credentials = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(credentials.encode(), token.encode()):
+            response = HttpResponse("Unauthorized\n", status=401, content_type="text/plain")
+            response["WWW-Authenticate"] = "Bearer"
+            return response
+    return HttpResponse(render(collect()), content_type=CONTENT_TYPE)
@@ -0,0 +1,35 @@
+"""StreamingHttpResponse helpers that keep memory flat under both WSGI and ASGI.
+
+Under ASGI, Django materialises *synchronous* streaming iterators with
+``list()`` before sending them, which defeats streaming. ``stream_response``
+therefore hands ASGI requests an async iterator that pulls one chunk at a time
+from the sync generator on the thread-sensitive executor (so ORM cursors stay
+on one thread).
+"""
+from __future__ import annotations
+from typing import AsyncIterator, Iterator
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+_DONE = object()
+
+
+async def aiter_sync(iterator: Iterator[bytes]) -> AsyncIterator[bytes]:
+    pull = sync_to_async(next, thread_sensitive=True)
+    while True:
+        chunk = await pull(iterator, _DONE)
+        if chunk is _DONE:
+            return
+        yield chunk
+
+
+def stream_response(request, chunks: Iterator[bytes], content_type: str, filename: str | None = None) -> StreamingHttpResponse:
+    content = aiter_sync(chunks) if isinstance(request, ASGIRequest) else chunks
+    response = StreamingHttpResponse(content, content_type=content_type)
+    if filename:
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['X-Accel-Buffering'] = 'no'  # don't let a reverse proxy buffer the whole body
+    response['Cache-Control'] = 'no-store'
+    return response
@@ -0,0 +1,307 @@
+"""In-process metrics in the Prometheus text exposition format.
+
+A small registry of counters, gauges and histograms with labels. Updating a
+metric takes a lock and a dict lookup, so it is safe from the event loop and
+from ``sync_to_async`` threads alike and cheap enough for hot paths.
+Collectors registered with ``register_collector`` run when metrics are read
+and set gauges that are cheaper to sample than to track, such as queue depths.
+
+Each process keeps its own values. With ``CHAT_METRICS_DIR`` set (``manage.py
+serve`` sets it for its workers), ``start_exporter`` writes this process's
+snapshot to ``metrics-<pid>.json`` in that directory every few seconds and on
+exit, and ``collect`` merges the snapshots of every process: counters and
+histograms are summed, including those of workers that have exited, so they
+never go backwards; gauges of processes that are gone are dropped.
+"""
+from __future__ import annotations
+
+import atexit
+import bisect
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator
+
+from django.conf import settings
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds: from cache lookups to long provider replies
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+EXPORT_INTERVAL_SECONDS = 5.0
+FILE_PATTERN = "metrics-{pid}.json"
+
+_metrics: dict[str, "Metric"] = {}
+_collectors: list[Callable[[], None]] = []
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        if name in _metrics:
+            raise ValueError(f"Metric {name} is already registered")
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: dict[tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        _metrics[name] = self
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        try:
+            key = tuple(str(labels[name]) for name in self.labels)
+        except KeyError:
+            key = None
+        if key is None or len(labels) != len(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {tuple(labels)}")
+        return key
+
+    def samples(self) -> list:
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Histogram(Metric):
+    """Observations counted in ``buckets`` (upper bounds; ``+Inf`` is implied), with their sum."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            # Per-bucket counts (the last one is +Inf), then the sum; made cumulative when rendered
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[slot] += 1
+            state[-1] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observe the seconds the block takes, whether it raises or not."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return sum(state[:-1]) if state else 0
+
+    def samples(self) -> list:
+        with self._lock:
+            return [[list(key), list(state)] for key, state in self._values.items()]
+
+
+def register_collector(collector: Callable[[], None]) -> Callable[[], None]:
+    """Run ``collector`` every time metrics are read, before the values are taken; usable as a decorator."""
+    _collectors.append(collector)
+    return collector
+
+
+def get_metric(name: str) -> Metric:
+    return _metrics[name]
+
+
+def snapshot() -> dict:
+    """This process's metrics as a JSON-serializable dict, after running the collectors."""
+    for collector in list(_collectors):
+        try:
+            collector()
+        except Exception as e:
+            print(f"[METRICS] Collector {getattr(collector, '__name__', collector)} failed: {e}")
+    metrics = {}
+    for metric in list(_metrics.values()):
+        entry = {"type": metric.kind, "help": metric.documentation, "labels": list(metric.labels),
+                 "samples": metric.samples()}
+        if isinstance(metric, Histogram):
+            entry["buckets"] = list(metric.buckets)
+        metrics[metric.name] = entry
+    return {"pid": os.getpid(), "time": time.time(), "metrics": metrics}
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def merge(snapshots: list[dict], alive: Callable[[int], bool] = _alive) -> dict[str, dict]:
+    """Combine per-process snapshots: counters and histograms summed, gauges summed over live processes."""
+    merged: dict[str, dict] = {}
+    for snap in snapshots:
+        running = alive(snap["pid"])
+        for name, entry in snap["metrics"].items():
+            if entry["type"] == "gauge" and not running:
+                continue
+            target = merged.setdefault(name, {**entry, "samples": {}})
+            if entry.get("buckets") != target.get("buckets"):
+                continue  # bucket layout changed between deploys; the old snapshot cannot be added
+            samples = target["samples"]
+            for key, value in entry["samples"]:
+                key = tuple(key)
+                if isinstance(value, list):
+                    current = samples.get(key)
+                    samples[key] = value if current is None else [a + b for a, b in zip(current, value)]
+                else:
+                    samples[key] = samples.get(key, 0) + value
+    return merged
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        if value.is_integer():
+            return str(int(value))
+        return repr(value)
+    return str(value)
+
+
+def _labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def render(metrics: dict[str, dict]) -> str:
+    """Prometheus text format (0.0.4) for merged metrics, samples sorted by label values."""
+    lines = []
+    for name in sorted(metrics):
+        entry = metrics[name]
+        samples = entry["samples"]
+        if isinstance(samples, list):
+            samples = {tuple(key): value for key, value in samples}
+        lines.append(f"# HELP {name} {_escape_help(entry['help'])}")
+        lines.append(f"# TYPE {name} {entry['type']}")
+        for key in sorted(samples):
+            value = samples[key]
+            if entry["type"] != "histogram":
+                lines.append(f"{name}{_labels(entry['labels'], key)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip([*entry["buckets"], math.inf], value[:-1]):
+                cumulative += count
+                le = f'le="{_number(float(bound))}"'
+                lines.append(f"{name}_bucket{_labels(entry['labels'], key, le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(entry['labels'], key)} {_number(value[-1])}")
+            lines.append(f"{name}_count{_labels(entry['labels'], key)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def metrics_dir() -> str:
+    return getattr(settings, "CHAT_METRICS_DIR", "")
+
+
+def write_snapshot(directory: str) -> Path:
+    """Write this process's snapshot atomically, so readers never see a partial file."""
+    path = Path(directory) / FILE_PATTERN.format(pid=os.getpid())
+    temporary = path.with_suffix(".tmp")
+    temporary.write_text(json.dumps(snapshot()))
+    os.replace(temporary, path)
+    return path
+
+
+def read_snapshots(directory: str) -> list[dict]:
+    snapshots = []
+    for path in Path(directory).glob(FILE_PATTERN.format(pid="*")):
+        try:
+            snapshots.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue  # removed or replaced while listing
+    return snapshots
+
+
+def collect() -> dict[str, dict]:
+    """Metrics of this process, merged with every other process sharing ``CHAT_METRICS_DIR``."""
+    directory = metrics_dir()
+    if not directory:
+        return merge([snapshot()], alive=lambda pid: True)
+    write_snapshot(directory)  # so this process's numbers are current, not up to one interval old
+    return merge(read_snapshots(directory))
+
+
+_exporter: threading.Thread | None = None
+
+
+def start_exporter(directory: str | None = None, interval: float = EXPORT_INTERVAL_SECONDS) -> None:
+    """Write this process's snapshot to ``directory`` every ``interval`` seconds and at exit."""
+    global _exporter
+    directory = directory or metrics_dir()
+    if not directory or _exporter is not None:
+        return
+    os.makedirs(directory, exist_ok=True)
+
+    def export() -> None:
+        try:
+            write_snapshot(directory)
+        except Exception as e:
+            print(f"[METRICS] Could not write the metrics snapshot to {directory}: {e}")
+
+    def run() -> None:
+        while True:
+            time.sleep(interval)
+            export()
+
+    _exporter = threading.Thread(target=run, name="metrics-exporter", daemon=True)
+    _exporter.start()
+    atexit.register(export)
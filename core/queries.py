@@ -0,0 +1,214 @@
+"""Per-operation SQL query counting and query budgets.
+
+Every GraphQL request and every WebSocket event is run inside
+``track_queries(label)``. An execute wrapper installed on each database
+connection adds the statements it runs to the operation active in the current
+context, so queries made from ``sync_to_async`` threads count towards the
+operation that awaited them.
+
+Hot paths register a ceiling with ``query_budget`` (resolvers) or
+``register_budgets``. An operation over its budget is logged. Tests enforce
+the budgets with ``assert_query_budget``. With ``QUERY_PROFILING`` (on when
+``DEBUG``), every operation is logged, GraphQL responses carry
+``extensions.queries`` and the WebSocket ``stats`` frame reports per-event
+totals. The queries and query time of every operation are also exported as
+metrics (``chat_db_queries_total``, ``chat_db_query_seconds``).
+"""
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+from core.metrics import Counter, Histogram
+
+# Statements kept per operation for logs and assertion messages
+MAX_STATEMENTS = 50
+_TRANSACTION_SQL = ("BEGIN", "SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")
+
+DB_SECONDS = Histogram("chat_db_query_seconds", "SQL time per GraphQL operation or WebSocket event.", ("operation",),
+                       buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+DB_QUERIES = Counter("chat_db_queries_total", "SQL statements run per GraphQL operation or WebSocket event.",
+                     ("operation",))
+
+budgets: dict[str, int] = {}
+_current: ContextVar["QueryStats | None"] = ContextVar("query_stats", default=None)
+_observers: list[Callable[["QueryStats"], None]] = []
+_totals: dict[str, list] = {}  # label -> [operations, queries, seconds, max queries]
+_totals_lock = threading.Lock()
+
+
+class QueryStats:
+    """Queries run by one operation."""
+    __slots__ = ("label", "count", "seconds", "statements", "finished")
+
+    def __init__(self, label: str):
+        self.label = label
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: list[tuple[str, float]] = []
+        self.finished = False
+
+    @property
+    def budget(self) -> int | None:
+        return budget_for(self.label)
+
+    def as_dict(self, statements: bool = False) -> dict:
+        data = {"operation": self.label, "count": self.count, "ms": round(self.seconds * 1000, 3),
+                "budget": self.budget}
+        if statements:
+            data["statements"] = [{"sql": sql, "ms": round(ms, 3)} for sql, ms in self.statements]
+        return data
+
+
+def profiling_enabled() -> bool:
+    return getattr(settings, "QUERY_PROFILING", settings.DEBUG)
+
+
+def query_budget(label: str, limit: int):
+    """Decorator registering ``limit`` queries as the budget of ``label``; the function is unchanged."""
+    def decorate(func):
+        budgets[label] = limit
+        return func
+    return decorate
+
+
+def register_budgets(limits: dict[str, int]) -> None:
+    budgets.update(limits)
+
+
+def budget_for(label: str) -> int | None:
+    """The budget of ``label``; a GraphQL operation with several root fields gets the sum of theirs."""
+    if label in budgets:
+        return budgets[label]
+    prefix, _, fields = label.partition(":")
+    parts = [budgets.get(f"{prefix}:{field}") for field in fields.split("+")] if "+" in fields else [None]
+    return sum(parts) if None not in parts else None
+
+
+def current_queries() -> QueryStats | None:
+    return _current.get()
+
+
+def name_operation(label: str) -> None:
+    """Rename the operation in progress, once it is known what it is."""
+    stats = _current.get()
+    if stats is not None:
+        stats.label = label
+
+
+def add_root_field(field: str) -> None:
+    """Name a GraphQL operation after its root fields (``graphql:conversations+me``)."""
+    stats = _current.get()
+    if stats is None or not stats.label.startswith("graphql"):
+        return
+    fields = stats.label.partition(":")[2]
+    names = set(fields.split("+")) if fields else set()
+    if field not in names:
+        names.add(field)
+        stats.label = "graphql:" + "+".join(sorted(names))
+
+
+def _record(execute, sql, params, many, context):
+    stats = _current.get()
+    # Transaction control is not counted: whether atomic() begins or nests depends on the caller (tests nest)
+    if stats is None or stats.finished or sql.startswith(_TRANSACTION_SQL):
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        stats.count += 1
+        stats.seconds += elapsed
+        if len(stats.statements) < MAX_STATEMENTS:
+            stats.statements.append((sql, elapsed * 1000))
+
+
+def _install(sender, connection, **kwargs) -> None:
+    # The wrapper object outlives its connections; add the hook only once
+    if _record not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record)
+
+
+connection_created.connect(_install)
+
+
+@contextmanager
+def track_queries(label: str) -> Iterator[QueryStats]:
+    """Count the queries of the operation run inside the block (including awaited sync_to_async calls)."""
+    stats = QueryStats(label)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+        stats.finished = True
+        _finish(stats)
+
+
+def _finish(stats: QueryStats) -> None:
+    with _totals_lock:
+        totals = _totals.setdefault(stats.label, [0, 0, 0.0, 0])
+        totals[0] += 1
+        totals[1] += stats.count
+        totals[2] += stats.seconds
+        totals[3] = max(totals[3], stats.count)
+    DB_SECONDS.observe(stats.seconds, operation=stats.label)
+    DB_QUERIES.inc(stats.count, operation=stats.label)
+    budget = stats.budget
+    if budget is not None and stats.count > budget:
+        print(f"[QUERIES] {stats.label} ran {stats.count} queries, over its budget of {budget}: "
+              f"{[sql for sql, _ in stats.statements]}")
+    elif profiling_enabled() and stats.count:
+        print(f"[QUERIES] {stats.label}: {stats.count} queries in {stats.seconds * 1000:.1f} ms")
+    for observer in list(_observers):
+        observer(stats)
+
+
+def query_totals() -> dict[str, dict]:
+    """Per operation since start: operations, queries, query time and the most queries one operation ran."""
+    with _totals_lock:
+        return {label: {"operations": ops, "queries": queries, "ms": round(seconds * 1000, 3), "max": most}
+                for label, (ops, queries, seconds, most) in _totals.items()}
+
+
+@contextmanager
+def observe_queries(observer: Callable[[QueryStats], None]) -> Iterator[None]:
+    """Call ``observer`` with every operation that finishes inside the block, in any task or thread."""
+    _observers.append(observer)
+    try:
+        yield
+    finally:
+        _observers.remove(observer)
+
+
+@contextmanager
+def assert_query_budget(*labels: str, limit: int | None = None) -> Iterator[list[QueryStats]]:
+    """Fail if an operation finished inside the block ran more queries than allowed.
+
+    Only operations named in ``labels`` are checked (all of them without
+    labels), and each named one must have run. The ceiling is ``limit`` or the
+    operation's registered budget; an operation with neither fails too, so
+    every hot path has to declare one. Yields the list of finished operations.
+    """
+    finished: list[QueryStats] = []
+    with observe_queries(finished.append):
+        yield finished
+    checked = [stats for stats in finished if not labels or stats.label in labels]
+    missing = set(labels) - {stats.label for stats in checked}
+    if missing:
+        raise AssertionError(f"No operation named {', '.join(sorted(missing))} ran; "
+                             f"saw {[stats.label for stats in finished]}")
+    for stats in checked:
+        ceiling = limit if limit is not None else stats.budget
+        if ceiling is None:
+            raise AssertionError(f"{stats.label} has no query budget; register one with query_budget()")
+        if stats.count > ceiling:
+            statements = "\n".join(f"  {ms:7.2f} ms  {sql}" for sql, ms in stats.statements)
+            raise AssertionError(f"{stats.label} ran {stats.count} queries, budget is {ceiling}:\n{statements}")
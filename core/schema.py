@@ -4,10 +4,18 @@ import graphql_jwt
 from authentication.schema.mutations.register_user import RegisterUser
 from authentication.schema.queries.me import MeQuery
 from authentication.schema.queries.user_by_id import UserByIdQuery
-from chat.schema import ConversationListQuery, MessagesByConversationQuery, SendMessage
+from chat.schema import (
+    ConversationListQuery,
+    MessagesByConversationQuery,
+    ReactToMessage,
+    RemoveReaction,
+    SearchMessagesQuery,
+    SendMessage,
+)
+from core.queries import register_budgets
 
 
-class Query(MeQuery, UserByIdQuery, ConversationListQuery, MessagesByConversationQuery, graphene.ObjectType):
+class Query(MeQuery, UserByIdQuery, ConversationListQuery, MessagesByConversationQuery, SearchMessagesQuery, graphene.ObjectType):
     pass
 
 
@@ -17,6 +25,12 @@ class Mutation(graphene.ObjectType):
     refresh_token = graphql_jwt.Refresh.Field()
     register_user = RegisterUser.Field()
     send_message = SendMessage.Field()
+    react_to_message = ReactToMessage.Field()
+    remove_reaction = RemoveReaction.Field()
+
+
+# Query budgets of graphql_jwt's mutations (the others are declared on their resolvers)
+register_budgets({"graphql:tokenAuth": 2, "graphql:verifyToken": 0, "graphql:refreshToken": 1})
 
 
 schema: graphene.Schema = graphene.Schema(query=Query, mutation=Mutation)
\ No newline at end of file
@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 from datetime import timedelta
 
+from core.channels.layers import channel_layer_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 import os
@@ -171,16 +173,86 @@ CSRF_COOKIE_HTTPONLY = False
 
 ASGI_APPLICATION = "core.asgi.application"
 
+# Cache (shared snapshots, token lookups)
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "z-chatbot",
+    }
+}
+
+# Public share pages
+SHARE_CACHE_TIMEOUT = int(os.getenv("SHARE_CACHE_TIMEOUT", "3600"))  # seconds a snapshot stays cached
+SHARE_VIEW_FLUSH_INTERVAL = float(os.getenv("SHARE_VIEW_FLUSH_INTERVAL", "10"))  # seconds between view_count flushes
+
 # Channel layers configuration
+# Channel layer profile (see core/channels/layers.py): "memory" for one process,
+# "redis-pubsub" (recommended) or "redis" to fan out across workers and hosts
+CHAT_CHANNEL_LAYER = os.getenv("CHAT_CHANNEL_LAYER", "memory")
+CHAT_CHANNEL_REDIS_URL = os.getenv("CHAT_CHANNEL_REDIS_URL", "redis://localhost:6379/2")  # comma-separated to shard
+CHAT_CHANNEL_PREFIX = os.getenv("CHAT_CHANNEL_PREFIX", "zchat")
+CHAT_CHANNEL_CAPACITY = int(os.getenv("CHAT_CHANNEL_CAPACITY", "100"))  # queued messages per channel before drops
+CHAT_CHANNEL_EXPIRY = int(os.getenv("CHAT_CHANNEL_EXPIRY", "60"))  # seconds an undelivered message is kept
+CHAT_CHANNEL_GROUP_EXPIRY = int(os.getenv("CHAT_CHANNEL_GROUP_EXPIRY", "86400"))  # must exceed socket lifetime
+
 CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer'
-    }
+    'default': channel_layer_config(
+        CHAT_CHANNEL_LAYER, url=CHAT_CHANNEL_REDIS_URL, prefix=CHAT_CHANNEL_PREFIX, capacity=CHAT_CHANNEL_CAPACITY,
+        expiry=CHAT_CHANNEL_EXPIRY, group_expiry=CHAT_CHANNEL_GROUP_EXPIRY,
+    )
 }
 
+# WebSocket delivery
+CHAT_STREAM_RESPONSES = os.getenv("CHAT_STREAM_RESPONSES", "true").lower() == "true"  # send replies as delta frames
+CHAT_WS_QUEUE_HIGH_WATER = int(os.getenv("CHAT_WS_QUEUE_HIGH_WATER", str(256 * 1024)))  # bytes; above this deltas are dropped
+CHAT_WS_QUEUE_MAX_BYTES = int(os.getenv("CHAT_WS_QUEUE_MAX_BYTES", str(1024 * 1024)))  # bytes; above this the socket is closed
+CHAT_WS_QUEUE_STALL_SECONDS = float(os.getenv("CHAT_WS_QUEUE_STALL_SECONDS", "10"))  # max time above high water
+CHAT_WS_MAX_GENERATIONS = int(os.getenv("CHAT_WS_MAX_GENERATIONS", "3"))  # concurrent replies per socket
+CHAT_WS_MAX_SUBSCRIPTIONS = int(os.getenv("CHAT_WS_MAX_SUBSCRIPTIONS", "20"))  # conversations open per socket
+CHAT_REPLAY_MAX_EVENTS = int(os.getenv("CHAT_REPLAY_MAX_EVENTS", "500"))  # per user, for resuming sessions
+CHAT_REPLAY_TTL_SECONDS = float(os.getenv("CHAT_REPLAY_TTL_SECONDS", "300"))
+CHAT_REPLAY_MAX_USERS = int(os.getenv("CHAT_REPLAY_MAX_USERS", "10000"))
+CHAT_HISTORY_CACHE_SIZE = int(os.getenv("CHAT_HISTORY_CACHE_SIZE", "50"))  # recent messages cached per conversation
+CHAT_HISTORY_CACHE_MAX_USERS = int(os.getenv("CHAT_HISTORY_CACHE_MAX_USERS", "5000"))
+CHAT_HISTORY_CACHE_MAX_BYTES = int(os.getenv("CHAT_HISTORY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CHAT_HISTORY_CACHE_TTL_SECONDS = float(os.getenv("CHAT_HISTORY_CACHE_TTL_SECONDS", "300"))  # bounds staleness across workers
+# "auto" uses orjson when installed, else the standard library; "orjson" or "json" forces one
+CHAT_JSON_BACKEND = os.getenv("CHAT_JSON_BACKEND", "auto")
+# Connection liveness (0 disables a timeout); see chat/connections.py
+CHAT_WS_PING_INTERVAL_SECONDS = float(os.getenv("CHAT_WS_PING_INTERVAL_SECONDS", "25"))  # ping heartbeat clients after this silence
+CHAT_WS_PONG_TIMEOUT_SECONDS = float(os.getenv("CHAT_WS_PONG_TIMEOUT_SECONDS", "20"))  # then close them if still silent
+CHAT_WS_IDLE_TIMEOUT_SECONDS = float(os.getenv("CHAT_WS_IDLE_TIMEOUT_SECONDS", "1800"))  # close sockets without user activity
+CHAT_WS_AUTH_TIMEOUT_SECONDS = float(os.getenv("CHAT_WS_AUTH_TIMEOUT_SECONDS", "30"))  # close sockets that never authenticate
+CHAT_WS_ACTIVE_WINDOW_SECONDS = float(os.getenv("CHAT_WS_ACTIVE_WINDOW_SECONDS", "60"))  # "active" in gauges = activity within this
+CHAT_WS_REAP_INTERVAL_SECONDS = float(os.getenv("CHAT_WS_REAP_INTERVAL_SECONDS", "5"))
+CHAT_TYPING_INTERVAL_SECONDS = float(os.getenv("CHAT_TYPING_INTERVAL_SECONDS", "3"))  # max one typing broadcast per socket and conversation
+CHAT_TYPING_TTL_SECONDS = float(os.getenv("CHAT_TYPING_TTL_SECONDS", "6"))  # clients drop indicators not refreshed within this
+CHAT_PRESENCE_INTERVAL_SECONDS = float(os.getenv("CHAT_PRESENCE_INTERVAL_SECONDS", "5"))  # max one presence broadcast per socket
+CHAT_PRESENCE_TTL_SECONDS = float(os.getenv("CHAT_PRESENCE_TTL_SECONDS", "90"))  # presence entries expire unless refreshed
+
+# Rate limits per action: "<count>/<s|min|hour|day>" per User.Role and per client IP ("ip").
+# A bucket holds <count> tokens (the burst) and refills <count> per period; None or "" means unlimited.
+CHAT_RATE_LIMITS = {
+    "message": {  # chat messages over the socket and the sendMessage mutation (each costs a provider call)
+        "ADMIN": os.getenv("CHAT_RATE_LIMIT_ADMIN", "60/min"),
+        "USER": os.getenv("CHAT_RATE_LIMIT_USER", "20/min"),
+        "BOT": None,
+        "ip": os.getenv("CHAT_RATE_LIMIT_IP", "120/min"),
+    },
+}
+CHAT_RATE_LIMIT_BACKEND = os.getenv("CHAT_RATE_LIMIT_BACKEND", "memory")  # "memory" (per process) or "redis" (shared)
+CHAT_RATE_LIMIT_REDIS_URL = os.getenv("CHAT_RATE_LIMIT_REDIS_URL", "redis://localhost:6379/1")
+# Only enable behind a proxy that sets X-Forwarded-For; otherwise clients can pick their own IP
+CHAT_RATE_LIMIT_TRUST_X_FORWARDED_FOR = os.getenv("CHAT_RATE_LIMIT_TRUST_X_FORWARDED_FOR", "false").lower() == "true"
+
 # API VARIABLES
 Z_AI_MODEL = os.getenv("Z_AI_MODEL", "your_model_name")
 Z_AI_API_KEY = os.getenv("Z_AI_API_KEY", "your_api_key")
+# "zai" calls the provider; "stub" streams canned replies offline (load tests, development without a key)
+CHAT_AI_PROVIDER = os.getenv("CHAT_AI_PROVIDER", "zai")
+CHAT_STUB_TOKENS = int(os.getenv("CHAT_STUB_TOKENS", "40"))  # chunks per stub reply
+CHAT_STUB_FIRST_TOKEN_MS = float(os.getenv("CHAT_STUB_FIRST_TOKEN_MS", "300"))  # simulated provider latency
+CHAT_STUB_TOKEN_MS = float(os.getenv("CHAT_STUB_TOKEN_MS", "20"))  # delay between chunks
 
 # AI RESPONSE SETTINGS
 AI_SYSTEM_CONTENT = (
@@ -209,12 +281,38 @@ AI_SYSTEM_CONTENT = (
 
 AI_BOT_NAME = "Z-Chatbot"
 
+# SEMANTIC MEMORY SETTINGS
+CHAT_MEMORY_ENABLED = os.getenv("CHAT_MEMORY_ENABLED", "true").lower() == "true"
+CHAT_MEMORY_EMBEDDER = os.getenv("CHAT_MEMORY_EMBEDDER", "chat.services.memory_service.HashingEmbedder")
+CHAT_MEMORY_TOP_K = int(os.getenv("CHAT_MEMORY_TOP_K", "4"))
+CHAT_MEMORY_MIN_SCORE = float(os.getenv("CHAT_MEMORY_MIN_SCORE", "0.3"))
+CHAT_MEMORY_MAX_USERS = int(os.getenv("CHAT_MEMORY_MAX_USERS", "256"))  # per-user indexes kept in memory
+
+# MESSAGE STORAGE SETTINGS
+MESSAGE_COMPRESSION_THRESHOLD = int(os.getenv("MESSAGE_COMPRESSION_THRESHOLD", "1024"))  # chars; 0 disables compaction
+
+# QUERY PROFILING (core/queries.py): log every operation's query count and time and add extensions.queries to
+# GraphQL responses; operations over their query budget are logged either way
+QUERY_PROFILING = os.getenv("QUERY_PROFILING", str(DEBUG)).lower() == "true"
+
+# METRICS (core/metrics.py): Prometheus text at /metrics
+CHAT_METRICS_ENABLED = os.getenv("CHAT_METRICS_ENABLED", "false").lower() == "true"  # off: the page is public
+CHAT_METRICS_TOKEN = os.getenv("CHAT_METRICS_TOKEN", "")  # if set, scrapers must send "Authorization: Bearer <token>"
+# Processes sharing this directory report merged metrics; manage.py serve sets it for its workers
+CHAT_METRICS_DIR = os.getenv("CHAT_METRICS_DIR", "")
+
+# TRACING (core/tracing.py): spans around auth, socket events, provider calls, persistence and channel-layer sends
+CHAT_TRACING_SAMPLE_RATE = float(os.getenv("CHAT_TRACING_SAMPLE_RATE", "0"))  # fraction of operations traced; 0 is off
+CHAT_TRACING_EXPORTER = os.getenv("CHAT_TRACING_EXPORTER", "console")  # "console" ([TRACE] lines) or "file" (JSON lines)
+CHAT_TRACING_FILE = os.getenv("CHAT_TRACING_FILE", str(BASE_DIR / "traces.jsonl"))
+
 # Graphene settings
 GRAPHENE = {
     'SCHEMA': 'core.schema.schema',  # You will create this schema file later
     'MIDDLEWARE': [
         'graphql_jwt.middleware.JSONWebTokenMiddleware',
     'core.graphql.error_middleware.DomainErrorMiddleware',
+    'core.graphql.query_middleware.QueryProfileMiddleware',
     ],
 }
 
@@ -0,0 +1,182 @@
+"""Lightweight tracing: timed spans, nested per operation, exported as they finish.
+
+``trace_span(name)`` (or the ``traced(name)`` decorator) times a block. The span in
+progress is kept in a context variable, so spans opened in ``sync_to_async``
+threads and in tasks created inside a span become its children and share its
+trace id. Each span also records the SQL queries and query time the
+operation tracked by ``core.queries`` ran while it was open.
+
+Whether a trace is recorded is decided once, when its root span starts:
+``CHAT_TRACING_SAMPLE_RATE`` is the fraction of root spans traced (0, the
+default, turns tracing off and costs one context-variable lookup per span).
+Finished spans go to ``CHAT_TRACING_EXPORTER``: ``console`` prints one
+``[TRACE]`` line per span, ``file`` appends one JSON object per line to
+``CHAT_TRACING_FILE``, which ``manage.py trace_report`` summarizes.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable, Iterator
+
+from django.conf import settings
+
+from core.queries import current_queries
+
+_NOT_SAMPLED = object()  # the current trace is not being recorded
+_current: ContextVar["Span | object | None"] = ContextVar("trace_span", default=None)
+_observers: list[Callable[["Span"], None]] = []
+_file_lock = threading.Lock()
+_files: dict[str, object] = {}
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "started", "duration", "status", "attributes",
+                 "_begin", "_queries", "_query_count", "_query_seconds")
+
+    def __init__(self, name: str, parent: "Span | None" = None, attributes: dict | None = None):
+        self.trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.name = name
+        self.started = time.time()
+        self.duration = 0.0
+        self.status = "ok"
+        self.attributes = dict(attributes) if attributes else {}
+        self._begin = time.perf_counter()
+        self._queries = current_queries()
+        self._query_count = self._queries.count if self._queries is not None else 0
+        self._query_seconds = self._queries.seconds if self._queries is not None else 0.0
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def fail(self, error: BaseException) -> None:
+        self.status = "cancelled" if isinstance(error, asyncio.CancelledError) else "error"
+        if self.status == "error":
+            self.attributes["error"] = f"{type(error).__name__}: {error}"
+
+    def finish(self) -> None:
+        self.duration = time.perf_counter() - self._begin
+        queries = self._queries
+        if queries is not None and queries.count > self._query_count:
+            self.attributes["operation"] = queries.label
+            self.attributes["db.queries"] = queries.count - self._query_count
+            self.attributes["db.ms"] = round((queries.seconds - self._query_seconds) * 1000, 3)
+
+    def as_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self.started, 6),
+            "ms": round(self.duration * 1000, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+def sample_rate() -> float:
+    return float(getattr(settings, "CHAT_TRACING_SAMPLE_RATE", 0.0))
+
+
+def current_span() -> Span | None:
+    span = _current.get()
+    return span if isinstance(span, Span) else None
+
+
+def annotate(**attributes) -> None:
+    """Add attributes to the span in progress, if this trace is being recorded."""
+    span = _current.get()
+    if isinstance(span, Span):
+        span.attributes.update(attributes)
+
+
+@contextmanager
+def trace_span(name: str, **attributes) -> Iterator[Span | None]:
+    """Time the block as a span; yields ``None`` when the trace is not sampled."""
+    parent = _current.get()
+    if parent is _NOT_SAMPLED:
+        yield None
+        return
+    if parent is None:
+        rate = sample_rate()
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            token = _current.set(_NOT_SAMPLED)
+            try:
+                yield None
+            finally:
+                _current.reset(token)
+            return
+    span = Span(name, parent, attributes)
+    token = _current.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.fail(e)
+        raise
+    finally:
+        _current.reset(token)
+        span.finish()
+        _export(span)
+
+
+def traced(name: str):
+    """Decorator running a function (sync or async) inside ``trace_span(name)``."""
+    def decorate(func):
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with trace_span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with trace_span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def _export(span: Span) -> None:
+    for observer in list(_observers):
+        observer(span)
+    exporter = getattr(settings, "CHAT_TRACING_EXPORTER", "console")
+    try:
+        if exporter == "file":
+            _write(getattr(settings, "CHAT_TRACING_FILE", "traces.jsonl"), span)
+        else:
+            attributes = " ".join(f"{key}={value}" for key, value in span.attributes.items())
+            print(f"[TRACE] {span.trace_id[:16]} {span.name} {span.duration * 1000:.1f} ms {span.status}"
+                  f"{' ' + attributes if attributes else ''}")
+    except Exception as e:
+        print(f"[TRACE] Could not export span {span.name}: {e}")
+
+
+def _write(path: str, span: Span) -> None:
+    line = json.dumps(span.as_dict(), default=str) + "\n"
+    with _file_lock:
+        f = _files.get(path)
+        if f is None:
+            # Line-buffered: each span is one append, so workers sharing the file do not interleave lines
+            f = _files[path] = open(path, "a", buffering=1)
+        f.write(line)
+
+
+@contextmanager
+def observe_spans(observer: Callable[[Span], None]) -> Iterator[None]:
+    """Call ``observer`` with every span that finishes inside the block, in any task or thread."""
+    _observers.append(observer)
+    try:
+        yield
+    finally:
+        _observers.remove(observer)
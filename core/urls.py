@@ -16,11 +16,15 @@ Including another URLconf
 """
 
 from django.contrib import admin
-from django.urls import path
-from graphene_django.views import GraphQLView
+from django.urls import include, path
 from django.views.decorators.csrf import csrf_exempt
 
+from core.http.graphql import GraphQLView
+from core.http.metrics import metrics_view
+
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("api/chat/", include("chat.urls")),
     path(route="graphql/", view=csrf_exempt(GraphQLView.as_view(graphiql=True)), name="graphql"),
+    path("metrics", metrics_view, name="metrics"),
 ]